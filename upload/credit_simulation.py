@@ -0,0 +1,125 @@
+# credit_simulation.py - Monte Carlo prepayment and default simulation for the Credit Calculation page
+# Kept outside pages/ so the worker function can be imported by process pool workers.
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# --- Constants and Settings ---
+PATHS_PER_SHARD = 10000 # Shard size for small portfolios; it depends only on the inputs, so results do not depend on the number of CPU cores
+MAX_SHARD_PATH_LOANS = 4000000 # Upper bound for one shard's (paths, loans) event arrays; larger portfolios get fewer paths per shard
+MAX_BLOCK_ELEMENTS = 4000000 # Upper bound for one (paths, loans, periods) block in memory
+PARALLEL_MIN_ELEMENTS = 20000000 # Smaller simulations run inline, process start-up would dominate
+SIMULATION_METRICS = ['CASH RECEIVED', 'INTEREST INCOME', 'OUTSTANDING BALANCE']
+PERCENTILES = [5, 50, 95]
+
+
+def annual_to_period_probability(annual_rate_percent, periods_per_year):
+    """Converts an annual prepayment/default rate (%) into a per-period event probability."""
+    return 1 - (1 - annual_rate_percent / 100.0) ** (1.0 / periods_per_year)
+
+
+def simulate_loan_paths_shard(payment, interest, opening_balance, closing_balance, loan_periods,
+                              prepayment_probability, default_probability, recovery_rate, n_paths, seed_sequence):
+    """
+    Simulates n_paths paths of a loan portfolio and returns the cash received, interest income and
+    outstanding balance per path and period as float32 arrays of shape (n_paths, periods).
+    Schedule inputs are (loans, periods) arrays; loan_periods holds every loan's own number of periods.
+    Each loan meets at most one event: the waiting time until the first prepayment or default is drawn
+    from a geometric distribution. A prepaying loan repays its opening balance plus that period's interest;
+    a defaulting loan pays nothing that period and recovers recovery_rate of its opening balance.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    n_loans, n_periods = payment.shape
+    event_probability = prepayment_probability + default_probability
+
+    # Period of the first event of every (path, loan); loans without an event run to maturity
+    if event_probability > 0:
+        uniform = rng.random((n_paths, n_loans))
+        event_period = np.floor(np.log1p(-uniform) / np.log1p(-event_probability)).astype(np.int64)
+        is_prepayment = rng.random((n_paths, n_loans)) < prepayment_probability / event_probability
+    else:
+        event_period = np.full((n_paths, n_loans), n_periods, dtype=np.int64)
+        is_prepayment = np.zeros((n_paths, n_loans), dtype=bool)
+    event_period = np.minimum(event_period, loan_periods[np.newaxis, :])
+    has_event = event_period < loan_periods[np.newaxis, :]
+
+    cash_received = np.zeros((n_paths, n_periods))
+    interest_income = np.zeros((n_paths, n_periods))
+    outstanding_balance = np.zeros((n_paths, n_periods))
+
+    # Scheduled flows while the loan is alive (period < event period), in loan blocks to bound memory
+    period_index = np.arange(n_periods)
+    loans_per_block = max(1, MAX_BLOCK_ELEMENTS // max(1, n_paths * n_periods))
+    for start in range(0, n_loans, loans_per_block):
+        block = slice(start, start + loans_per_block)
+        alive = period_index[np.newaxis, np.newaxis, :] < event_period[:, block, np.newaxis]
+        cash_received += np.einsum('plt,lt->pt', alive, payment[block])
+        interest_income += np.einsum('plt,lt->pt', alive, interest[block])
+        outstanding_balance += np.einsum('plt,lt->pt', alive, closing_balance[block])
+
+    # Terminal flows in the event period
+    path_index, loan_index = np.nonzero(has_event)
+    event_at = event_period[path_index, loan_index]
+    event_opening = opening_balance[loan_index, event_at]
+    event_interest = interest[loan_index, event_at]
+    prepaid = is_prepayment[path_index, loan_index]
+    flat_index = path_index * n_periods + event_at
+    size = n_paths * n_periods
+    cash_received += np.bincount(flat_index, weights=np.where(prepaid, event_opening + event_interest, recovery_rate * event_opening),
+                                 minlength=size).reshape(n_paths, n_periods)
+    interest_income += np.bincount(flat_index, weights=np.where(prepaid, event_interest, 0.0),
+                                   minlength=size).reshape(n_paths, n_periods)
+
+    return (cash_received.astype(np.float32), interest_income.astype(np.float32), outstanding_balance.astype(np.float32))
+
+
+def simulate_loan_portfolio(payment, interest, closing_balance, annual_prepayment_rate_percent, annual_default_rate_percent,
+                            recovery_rate_percent, n_paths=100000, seed=42, periods_per_year=1, max_workers=None):
+    """
+    Runs the Monte Carlo simulation sharded over a process pool and returns a dictionary keyed by
+    SIMULATION_METRICS; each value is a (len(PERCENTILES), periods) array of P5/P50/P95 bands.
+    Shards use independent RNG streams spawned from `seed`, so a given seed always reproduces the same result.
+    A shard holds at most PATHS_PER_SHARD paths and at most MAX_SHARD_PATH_LOANS (path, loan) pairs, so the
+    memory of a worker stays bounded for large portfolios.
+    Schedule inputs are (loans, periods) arrays as produced by the Credit Calculation engines.
+    """
+    payment = np.atleast_2d(np.asarray(payment, dtype=float))
+    interest = np.atleast_2d(np.asarray(interest, dtype=float))
+    closing_balance = np.atleast_2d(np.asarray(closing_balance, dtype=float))
+
+    # Opening balance of every period = previous closing balance (+ the principal for the first period)
+    principal_paid = payment - interest
+    opening_balance = closing_balance + np.where(payment > 0, principal_paid, -interest)
+    loan_periods = payment.shape[1] - np.argmax(payment[:, ::-1] > 0, axis=1) # The last period always carries a payment
+
+    prepayment_probability = annual_to_period_probability(annual_prepayment_rate_percent, periods_per_year)
+    default_probability = annual_to_period_probability(annual_default_rate_percent, periods_per_year)
+    if prepayment_probability + default_probability > 1:
+        raise ValueError("Prepayment and default probabilities per period must not add up to more than 100%.")
+
+    paths_per_shard = max(1, min(PATHS_PER_SHARD, MAX_SHARD_PATH_LOANS // payment.shape[0]))
+    shard_sizes = [min(paths_per_shard, n_paths - start) for start in range(0, n_paths, paths_per_shard)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    shard_args = [(payment, interest, opening_balance, closing_balance, loan_periods, prepayment_probability,
+                   default_probability, recovery_rate_percent / 100.0, size, seq)
+                  for size, seq in zip(shard_sizes, seed_sequences)]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if n_paths * payment.size < PARALLEL_MIN_ELEMENTS:
+        max_workers = 1
+    max_workers = min(max_workers, len(shard_args))
+
+    if max_workers <= 1:
+        shard_results = [simulate_loan_paths_shard(*args) for args in shard_args]
+    else:
+        # 'spawn' avoids forking the multi-threaded Streamlit server
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            shard_results = list(executor.map(simulate_loan_paths_shard, *zip(*shard_args)))
+
+    bands = {}
+    for metric_idx, metric in enumerate(SIMULATION_METRICS):
+        all_paths = np.concatenate([result[metric_idx] for result in shard_results], axis=0)
+        bands[metric] = np.percentile(all_paths, PERCENTILES, axis=0, method='inverted_cdf') # Observed values, no interpolation
+    return bands
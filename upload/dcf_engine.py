@@ -0,0 +1,268 @@
+# dcf_engine.py - Vectorized DCF & credit engine and Monte Carlo payback simulation for the Growth Payback page
+# Kept outside pages/ so the simulation worker can be imported by process pool workers.
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# --- Constants and Settings ---
+PATHS_PER_SHARD = 10000 # Fixed shard size, so results do not depend on the number of CPU cores
+PARALLEL_MIN_ELEMENTS = 20000000 # Smaller simulations run inline, process start-up would dominate
+SIMULATION_METRICS = ['Discounted Cash Flow (DCF)', 'DCF Moves Next Year', 'Last Row Total']
+PERCENTILES = [5, 50, 95]
+# Distribution name -> parameter names, in the order they are passed
+DISTRIBUTIONS = {
+    "Fixed": ["Value"],
+    "Normal": ["Mean", "Standard Deviation"],
+    "Uniform": ["Low", "High"],
+    "Triangular": ["Low", "Mode", "High"]
+}
+
+
+# --- Calculation Logic (Murat's Confirmed Excel Formulas) ---
+def calculate_loan_refunds(initial_credit, annual_loan_payment, loan_term_years, grace_period_years, total_simulation_years):
+    """
+    Walks the credit balance year by year and returns two 1-D arrays: the 'Loan Refund Payment' and the
+    'Total Credit' of every projection year. The loan does not depend on the growth or discount rate,
+    so this runs once and is shared by every scenario of a grid.
+    """
+    loan_refund_payments = np.zeros(total_simulation_years)
+    total_credits = np.zeros(total_simulation_years)
+    current_credit_balance = initial_credit # Credit is entered as negative (debt)
+
+    for i in range(total_simulation_years):
+        # 3. Loan Refund Payment Calculation
+        loan_refund_payment_this_year = 0
+        if i >= grace_period_years and current_credit_balance < -0.01:
+            loan_refund_payment_this_year = min(annual_loan_payment, abs(current_credit_balance))
+            
+            if i >= (grace_period_years + loan_term_years):
+                if abs(current_credit_balance) <= 0.01:
+                    loan_refund_payment_this_year = 0
+                else:
+                    loan_refund_payment_this_year = abs(current_credit_balance)
+
+        loan_refund_payments[i] = loan_refund_payment_this_year
+
+        # 4. Total Credit Calculation
+        if i == 0:
+            total_credits[i] = initial_credit
+        else:
+            current_credit_balance += loan_refund_payment_this_year
+            
+            if current_credit_balance > 0 and loan_refund_payment_this_year > 0:
+                current_credit_balance = 0 
+
+            total_credits[i] = current_credit_balance
+            
+            if abs(total_credits[i]) < 0.01 and loan_refund_payment_this_year > 0:
+                total_credits[i] = 0
+
+    return loan_refund_payments, total_credits
+
+
+def calculate_dcf_grid(growth_rates, discount_rates, initial_dcf,
+                       initial_credit, annual_loan_payment, loan_term_years, grace_period_years,
+                       start_year, total_simulation_years):
+    """
+    NumPy engine computing every item of FINANCIAL_ITEMS_ORDER for many scenarios in one call.
+    growth_rates, discount_rates (decimals) and initial_dcf are broadcast against each other, e.g.
+    growth[:, np.newaxis] and discount[np.newaxis, :] give a full (growth, discount) grid.
+    Returns a dictionary with 'YEAR' (1-D) and one array per financial item shaped like the
+    broadcast scenarios plus a trailing year axis.
+    Years are stepped with the same operations, in the same order, as the original per-scenario loop,
+    so the results match it exactly.
+    """
+    growth_rates, discount_rates, initial_dcf = np.broadcast_arrays(
+        np.asarray(growth_rates, dtype=float), np.asarray(discount_rates, dtype=float), np.asarray(initial_dcf, dtype=float))
+    scenario_shape = growth_rates.shape
+    year_shape = scenario_shape + (total_simulation_years,)
+
+    # 1. Discounted Cash Flow (DCF) and 2. DCF Moves Next Year (running total)
+    dcf = np.empty(year_shape)
+    dcf_moves_next_year = np.empty(year_shape)
+    current_dcf_value = initial_dcf
+    prev_dcf_moves_next_year_value = np.zeros(scenario_shape)
+    for i in range(total_simulation_years):
+        if i > 0:
+            current_dcf_value = current_dcf_value * (1 + growth_rates) / (1 + discount_rates)
+        dcf[..., i] = current_dcf_value
+        prev_dcf_moves_next_year_value = prev_dcf_moves_next_year_value + current_dcf_value
+        dcf_moves_next_year[..., i] = prev_dcf_moves_next_year_value
+
+    # 3. Loan Refund Payment and 4. Total Credit are the same for every scenario
+    loan_refund_payments, total_credits = calculate_loan_refunds(
+        initial_credit, annual_loan_payment, loan_term_years, grace_period_years, total_simulation_years)
+
+    # 5. Subtotal = DCF Moves Next Year, 6. Working Capital (placeholder), 7. Amount After Working Capital, 8. Last Row
+    working_capital = np.zeros(year_shape)
+    amount_after_working_capital = dcf_moves_next_year - working_capital
+
+    return {
+        'YEAR': start_year + np.arange(total_simulation_years),
+        'Discounted Cash Flow (DCF)': dcf,
+        'DCF Moves Next Year': dcf_moves_next_year,
+        'Total Credit': np.broadcast_to(total_credits, year_shape),
+        'Subtotal': dcf_moves_next_year,
+        'Working Capital': working_capital,
+        'Amount After Working Capital': amount_after_working_capital,
+        'Loan Refund Payment': np.broadcast_to(loan_refund_payments, year_shape),
+        'Last Row Total': amount_after_working_capital - loan_refund_payments
+    }
+
+
+def calculate_first_crossing(values, threshold, start_year):
+    """
+    For every scenario (last axis = years), the first projection year in which values reach threshold,
+    and the interpolated fractional year at which they cross it: linear between the last year below the
+    threshold and the first year at or above it (the start year itself if the first year already reaches it).
+    Returns (crossing_years, fractional_crossing_years), both NaN where the threshold is never reached.
+    """
+    reached = values >= threshold
+    ever_reached = reached.any(axis=-1)
+    first_idx = np.argmax(reached, axis=-1)
+
+    current = np.take_along_axis(values, first_idx[..., np.newaxis], axis=-1)[..., 0]
+    previous = np.take_along_axis(values, np.maximum(first_idx - 1, 0)[..., np.newaxis], axis=-1)[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(first_idx > 0, (threshold - previous) / (current - previous), 1.0) # 1.0: reached in the first year
+
+    crossing_years = np.where(ever_reached, start_year + first_idx, np.nan)
+    fractional_crossing_years = np.where(ever_reached, start_year + first_idx - 1 + fraction, np.nan)
+    return crossing_years, fractional_crossing_years
+
+
+def calculate_payback_years(dcf_moves_next_year, initial_credit, start_year):
+    """
+    Payback year of every scenario: the first projection year in which the cumulative DCF
+    ('DCF Moves Next Year', last axis = years) covers the initial credit. NaN where it never does.
+    """
+    return calculate_first_crossing(dcf_moves_next_year, abs(min(initial_credit, 0)), start_year)[0]
+
+
+def calculate_breakeven_years(last_row_totals, start_year):
+    """
+    Breakeven of every scenario: the first projection year in which 'Last Row Total' (last axis = years)
+    is zero or above, and the interpolated fractional breakeven year. See calculate_first_crossing.
+    """
+    return calculate_first_crossing(last_row_totals, 0.0, start_year)
+
+
+def solve_breakeven_growth_rates(discount_rates, initial_dcf, initial_credit, annual_loan_payment, loan_term_years,
+                                 grace_period_years, start_year, total_simulation_years,
+                                 min_growth_rate=-0.9999, max_growth_rate=10.0, iterations=100):
+    """
+    For every discount rate (decimal), the minimum growth rate (decimal) at which the cumulative DCF covers
+    the initial credit within the projection, i.e. calculate_payback_years of calculate_dcf_grid finds a year.
+    The cumulative DCF grows with the growth rate, so all discount rates are bisected at once on
+    [min_growth_rate, max_growth_rate]. Returns min_growth_rate where even that growth rate pays back,
+    and NaN where max_growth_rate does not.
+    """
+    discount_rates = np.asarray(discount_rates, dtype=float)
+
+    def paid_back(growth_rates):
+        grid = calculate_dcf_grid(growth_rates, discount_rates, initial_dcf, initial_credit, annual_loan_payment,
+                                  loan_term_years, grace_period_years, start_year, total_simulation_years)
+        return ~np.isnan(calculate_payback_years(grid['DCF Moves Next Year'], initial_credit, start_year))
+
+    low = np.full(discount_rates.shape, float(min_growth_rate))
+    high = np.full(discount_rates.shape, float(max_growth_rate))
+    paid_back_at_low = paid_back(low)
+    solvable = paid_back(high)
+
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        middle_paid_back = paid_back(middle)
+        low = np.where(middle_paid_back, low, middle)
+        high = np.where(middle_paid_back, middle, high)
+        if np.all(high - low <= 1e-12 * np.maximum(1.0, np.abs(high))):
+            break
+    # high always pays back, so it is the smallest growth rate found that covers the credit
+    return np.where(paid_back_at_low, min_growth_rate, np.where(solvable, high, np.nan))
+
+
+def sample_distribution(rng, distribution, params, size):
+    """Draws `size` values from one of DISTRIBUTIONS with its parameters in DISTRIBUTIONS order."""
+    if distribution == "Fixed":
+        return np.full(size, float(params[0]))
+    if distribution == "Normal":
+        return rng.normal(params[0], params[1], size)
+    if distribution == "Uniform":
+        return rng.uniform(params[0], params[1], size)
+    if distribution == "Triangular":
+        low, mode, high = params
+        if low == high:
+            return np.full(size, float(low))
+        return rng.triangular(low, mode, high, size)
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def simulate_dcf_paths_shard(growth_spec, discount_spec, initial_dcf_spec, initial_credit, annual_loan_payment,
+                             loan_term_years, grace_period_years, start_year, total_simulation_years, n_paths, seed_sequence):
+    """
+    Simulates n_paths paths: each path draws one growth rate (%), one discount rate (%) and one initial DCF
+    from its (distribution, params) spec and runs calculate_dcf_grid on all paths at once.
+    Rates are floored at -99.99% so that (1 + rate) stays positive.
+    Returns the SIMULATION_METRICS as float32 (n_paths, years) arrays and the payback year of every path.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    growth_rates = np.maximum(sample_distribution(rng, *growth_spec, n_paths), -99.99) / 100.0
+    discount_rates = np.maximum(sample_distribution(rng, *discount_spec, n_paths), -99.99) / 100.0
+    initial_dcf = sample_distribution(rng, *initial_dcf_spec, n_paths)
+
+    grid = calculate_dcf_grid(growth_rates, discount_rates, initial_dcf,
+                              initial_credit, annual_loan_payment, loan_term_years, grace_period_years,
+                              start_year, total_simulation_years)
+    metrics = tuple(grid[metric].astype(np.float32) for metric in SIMULATION_METRICS)
+    payback_years = calculate_payback_years(grid['DCF Moves Next Year'], initial_credit, start_year)
+    return metrics, payback_years
+
+
+def simulate_dcf_payback(growth_spec, discount_spec, initial_dcf_spec, initial_credit, annual_loan_payment,
+                         loan_term_years, grace_period_years, start_year, total_simulation_years,
+                         n_paths=100000, seed=42, max_workers=None):
+    """
+    Runs the Monte Carlo payback simulation sharded over a process pool. Returns a dictionary with:
+      'YEAR'                  projection years
+      'paths'                 number of simulated paths
+      'bands'                 SIMULATION_METRICS -> (len(PERCENTILES), years) array of P5/P50/P95 per year
+      'payback_counts'        number of paths paying back in each projection year
+      'never_covered_probability'
+                              share of paths whose cumulative DCF never covers the credit
+    Shards use independent RNG streams spawned from `seed`, so a given seed always reproduces the same result.
+    Specs are (distribution, params) tuples, see DISTRIBUTIONS.
+    """
+    shard_sizes = [min(PATHS_PER_SHARD, n_paths - start) for start in range(0, n_paths, PATHS_PER_SHARD)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    shard_args = [(growth_spec, discount_spec, initial_dcf_spec, initial_credit, annual_loan_payment,
+                   loan_term_years, grace_period_years, start_year, total_simulation_years, size, seq)
+                  for size, seq in zip(shard_sizes, seed_sequences)]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if n_paths * total_simulation_years < PARALLEL_MIN_ELEMENTS:
+        max_workers = 1
+    max_workers = min(max_workers, len(shard_args))
+
+    if max_workers <= 1:
+        shard_results = [simulate_dcf_paths_shard(*args) for args in shard_args]
+    else:
+        # 'spawn' avoids forking the multi-threaded Streamlit server
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            shard_results = list(executor.map(simulate_dcf_paths_shard, *zip(*shard_args)))
+
+    bands = {}
+    for metric_idx, metric in enumerate(SIMULATION_METRICS):
+        all_paths = np.concatenate([result[0][metric_idx] for result in shard_results], axis=0)
+        bands[metric] = np.percentile(all_paths, PERCENTILES, axis=0, method='inverted_cdf') # Observed values, no interpolation
+
+    payback_years = np.concatenate([result[1] for result in shard_results])
+    covered = ~np.isnan(payback_years)
+    years = start_year + np.arange(total_simulation_years)
+    return {
+        'YEAR': years,
+        'paths': n_paths,
+        'bands': bands,
+        'payback_counts': np.bincount((payback_years[covered] - start_year).astype(int), minlength=total_simulation_years),
+        'never_covered_probability': float(1 - covered.mean())
+    }
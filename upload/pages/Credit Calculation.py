@@ -9,13 +9,23 @@ import streamlit as st
 import pandas as pd
 import io
 import math
+import os
+import functools
+import datetime
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from credit_simulation import simulate_loan_portfolio, SIMULATION_METRICS, PERCENTILES
+from schedule_cache import ScheduleCache
 from docx import Document
-from docx.shared import Inches, Pt
+from docx.shared import Inches, Pt, Emu
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from openpyxl import Workbook
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from xml.sax.saxutils import escape as xml_escape
 from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font, Border, Side, PatternFill
-from openpyxl.styles.numbers import BUILTIN_FORMATS
+import xlsxwriter
 
 # --- Constants and Settings ---
 CURRENCY_SYMBOLS = {
@@ -25,6 +35,37 @@ CURRENCY_SYMBOLS = {
     "£": "GBP"
 }
 CURRENCY_NAMES = {v: k for k, v in CURRENCY_SYMBOLS.items()}
+SCHEDULE_COLUMNS = ['YEAR', 'PRINCIPAL PAYMENT', 'INTEREST', 'P+I', 'PAYMENT', 'REMAINING BALANCE']
+
+# Payment periods per year for each supported repayment frequency
+PAYMENT_FREQUENCIES = {
+    "Annual": 1,
+    "Semi-Annual": 2,
+    "Quarterly": 4,
+    "Monthly": 12
+}
+
+# Metrics of the interest rate x term sensitivity grid
+SENSITIVITY_METRICS = ['PAYMENT', 'TOTAL AMOUNT PAID', 'TOTAL INTEREST']
+
+# Loan solver (goal seek): parameters that can be solved for and targets they can be solved from
+SOLVER_PARAMETERS = ['INTEREST RATE (%)', 'TOTAL LOAN TERM (YEARS)', 'PRINCIPAL']
+SOLVER_TARGETS = ['ANNUAL PAYMENT', 'TOTAL AMOUNT PAID']
+
+# Cross-session schedule cache (overridable through environment variables)
+SCHEDULE_CACHE_MAX_ENTRIES = int(os.getenv('SCHEDULE_CACHE_MAX_ENTRIES', 256))
+SCHEDULE_CACHE_TTL_SECONDS = int(os.getenv('SCHEDULE_CACHE_TTL_SECONDS', 3600))
+
+# Word export: table style of the schedule table and paragraph styles (font size, bold, alignment) of its cells
+DOCX_TABLE_STYLE = 'Table Grid'
+DOCX_PARAGRAPH_STYLES = {
+    'Schedule Header': (10, True, 'center'),
+    'Schedule Period': (9, False, 'center'),
+    'Schedule Amount': (9, False, 'right')
+}
+
+# Columns expected in an uploaded loan portfolio file (LOAN ID is optional)
+PORTFOLIO_INPUT_COLUMNS = ['PRINCIPAL', 'INTEREST RATE (%)', 'GRACE PERIOD (YEARS)', 'TOTAL LOAN TERM (YEARS)']
 
 # --- Helper function for number formatting (for display in Streamlit) ---
 def format_number(number, is_year=False, include_currency=True, currency_symbol="₺", is_percentage=False):
@@ -56,188 +97,596 @@ def format_number(number, is_year=False, include_currency=True, currency_symbol=
 
 
 # --- Main calculation function ---
-def calculate_loan_repayment_schedule(principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years):
+def annuity_payment(capitalized_principal, period_rate, periods):
+    """
+    Regular payment that repays capitalized_principal over `periods` payment periods at period_rate,
+    broadcast over array inputs (periods may be fractional). The discount factor is computed as
+    -expm1(-n * log1p(r)) so small rates keep full precision; a zero rate repays the principal in equal parts.
+    Every annuity formula of this page goes through here; the balance with n periods still due is
+    payment / annuity_payment(1.0, rate, n).
+    """
+    period_rate = np.asarray(period_rate, dtype=float)
+    zero_rate = period_rate == 0
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        payment = capitalized_principal * period_rate / -np.expm1(np.log1p(period_rate) * -periods)
+        if np.count_nonzero(zero_rate):
+            payment = np.where(zero_rate, capitalized_principal / periods, payment)
+    return payment if payment.ndim else float(payment)
+
+
+@functools.lru_cache(maxsize=64)
+def schedule_periods(total_periods, periods_per_year, start_year):
+    """
+    Period grid shared by every schedule of the same length, frequency and start year: the period offsets,
+    the datetime64[M] start of every period and its calendar year. Cached, so the arrays are read-only.
+    """
+    period_offsets = np.arange(total_periods)
+    periods = np.datetime64(f"{start_year}-01", 'M') + period_offsets * (12 // periods_per_year)
+    years = start_year + period_offsets // periods_per_year
+    for values in (period_offsets, periods, years):
+        values.flags.writeable = False
+    return period_offsets, periods, years
+
+
+def calculate_loan_portfolio_schedules(principal_amounts, annual_interest_rates_percent, grace_periods_years, total_loan_terms_years, start_year=None, periods_per_year=1):
+    """
+    NumPy engine computing the repayment schedules of many loans in one pass.
+    Returns a dictionary keyed like SCHEDULE_COLUMNS, plus 'PERIOD' holding the datetime64[M] start of every
+    payment period: 'PERIOD' and 'YEAR' are 1-D and every other column is a (loans, periods) array,
+    zero-padded after each loan's own term. Scalar inputs describe a single loan and give 1-D columns.
+    The annual rate is split evenly over periods_per_year payment periods; grace periods and terms stay in years.
+    Grace-period accrual and annuity balances use closed-form compounding instead of a per-period loop;
+    the final period settles the remaining balance and balances under 0.01 are snapped to zero.
+    """
+    if start_year is None:
+        start_year = datetime.date.today().year
+
+    def loan_column(values, dtype):
+        # Loans run down the first axis and periods along the last; a single loan stays a scalar
+        values = np.asarray(values, dtype=dtype)
+        return values.reshape(-1, 1) if values.ndim else values[()]
+
+    principal = loan_column(principal_amounts, float)
+    rate = loan_column(annual_interest_rates_percent, float) / (100.0 * periods_per_year)
+    grace_periods = loan_column(grace_periods_years, int) * periods_per_year
+    total_periods = loan_column(total_loan_terms_years, int) * periods_per_year
+    repayment_periods = total_periods - grace_periods
+
+    if np.count_nonzero(repayment_periods <= 0):
+        raise ValueError("Total loan term must be greater than the grace period for every loan.")
+
+    period_offsets, periods, years = schedule_periods(int(total_periods.max()), periods_per_year, start_year)
+    remaining_periods = total_periods - period_offsets
+    in_grace = remaining_periods > repayment_periods
+
+    # Grace Period: interest is capitalized every period, balance after k periods = P * (1 + r)^k;
+    # the last column holds the capitalized principal the annuity is computed on
+    compounded_balance = principal * (1.0 + rate) ** np.minimum(period_offsets, grace_periods)
+
+    # Repayment Period: opening balance = present value of the payments still due, i.e. the capitalized principal
+    # scaled by annuity_payment(n) / annuity_payment(payments still due). During grace all n payments are
+    # still due (ratio 1); after the term none are (ratio 0).
+    payment_factor = annuity_payment(1.0, rate, np.minimum(np.maximum(remaining_periods, 0), repayment_periods))
+    period_payment = compounded_balance[..., -1:] * payment_factor[..., :1]
+    opening_balance = compounded_balance * (payment_factor[..., :1] / payment_factor)
+
+    interest = opening_balance * rate
+    balance_with_interest = opening_balance + interest
+    # A payment never exceeds what is owed, so the last period pays off whatever is left
+    payment = np.minimum(period_payment, balance_with_interest)
+    payment[in_grace] = 0.0
+    principal_payment = payment - interest
+    principal_payment[in_grace] = 0.0
+    remaining_balance = balance_with_interest - payment
+    remaining_balance[np.abs(remaining_balance) < 0.01] = 0.0
+
+    return {
+        'PERIOD': periods,
+        'YEAR': years,
+        'PRINCIPAL PAYMENT': principal_payment,
+        'INTEREST': interest,
+        'P+I': principal_payment + interest,
+        'PAYMENT': payment,
+        'REMAINING BALANCE': remaining_balance
+    }
+
+
+def calculate_loan_schedule_arrays(principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years, start_year=None, periods_per_year=1):
+    """
+    Single-loan call of calculate_loan_portfolio_schedules, behind calculate_loan_repayment_schedule.
+    Returns the schedule as a dictionary of 1-D column arrays (keyed like SCHEDULE_COLUMNS, plus 'PERIOD')
+    and the total amount paid, or (None, 0.0) when the repayment period is not positive.
+    """
+    if int(total_loan_term_years) <= int(grace_period_years):
+        return None, 0.0
+
+    schedule_columns = calculate_loan_portfolio_schedules(principal_amount, annual_interest_rate_percent, grace_period_years,
+                                                          total_loan_term_years, start_year, periods_per_year)
+    return schedule_columns, float(schedule_columns['PAYMENT'].sum())
+
+
+def balance_at(period, principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years, periods_per_year=1):
+    """
+    Closed-form remaining balance after `period` payment periods, without building the schedule.
+    balance_at(0) is the principal and balance_at(k) equals the k-th 'REMAINING BALANCE' of the schedule.
+    `period` may be a scalar or an array of periods.
+    """
+    period_interest_rate_decimal = annual_interest_rate_percent / 100.0 / periods_per_year
+    grace_periods = int(grace_period_years) * periods_per_year
+    repayment_periods = (int(total_loan_term_years) - int(grace_period_years)) * periods_per_year
+    period = np.clip(np.asarray(period), 0, grace_periods + repayment_periods)
+
+    growth = 1.0 + period_interest_rate_decimal
+    capitalized_principal = principal_amount * growth ** grace_periods
+    repayment_step = np.maximum(period - grace_periods, 0)
+
+    with np.errstate(divide='ignore'):
+        repayment_balance = annuity_payment(capitalized_principal, period_interest_rate_decimal, repayment_periods) / \
+                            annuity_payment(1.0, period_interest_rate_decimal, repayment_periods - repayment_step)
+
+    balance = np.where(period <= grace_periods, principal_amount * growth ** np.minimum(period, grace_periods), repayment_balance)
+    return balance if balance.ndim else float(balance)
+
+
+def interest_between(first_period, last_period, principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years, periods_per_year=1):
     """
-    Calculates the loan repayment schedule, including automatically computed annual payments.
-    Returns the schedule data as a list of dictionaries and the total amount paid.
+    Closed-form total interest charged in periods first_period+1 .. last_period (i.e. between the two balance points),
+    without building the schedule. Grace-period interest is the capitalized growth of the balance;
+    repayment interest is the payments made minus the principal they retired.
+    """
+    period_interest_rate_decimal = annual_interest_rate_percent / 100.0 / periods_per_year
+    grace_periods = int(grace_period_years) * periods_per_year
+    repayment_periods = (int(total_loan_term_years) - int(grace_period_years)) * periods_per_year
+    total_periods = grace_periods + repayment_periods
+    first_period = np.clip(np.asarray(first_period), 0, total_periods)
+    last_period = np.clip(np.asarray(last_period), first_period, total_periods)
+
+    def balance(p):
+        return balance_at(p, principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years, periods_per_year)
+
+    period_payment = annuity_payment(balance(grace_periods), period_interest_rate_decimal, repayment_periods)
+
+    grace_end = np.minimum(last_period, grace_periods)
+    grace_interest = np.where(first_period < grace_periods, balance(grace_end) - balance(np.minimum(first_period, grace_periods)), 0.0)
+
+    repayment_start = np.maximum(first_period, grace_periods)
+    repayment_end = np.maximum(last_period, grace_periods)
+    repayment_interest = period_payment * (repayment_end - repayment_start) - (balance(repayment_start) - balance(repayment_end))
+
+    total_interest = grace_interest + repayment_interest
+    return total_interest if np.ndim(total_interest) else float(total_interest)
+
+
+@st.cache_resource
+def get_schedule_cache(max_entries=SCHEDULE_CACHE_MAX_ENTRIES, ttl_seconds=SCHEDULE_CACHE_TTL_SECONDS):
+    """Returns the ScheduleCache shared by every session and rerun of the app."""
+    return ScheduleCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+def calculate_loan_repayment_schedule(principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years, periods_per_year=1, start_year=None):
+    """
+    Calculates the loan repayment schedule, including automatically computed payments.
+    Returns the schedule as a dictionary of column arrays keyed like SCHEDULE_COLUMNS (ready for pd.DataFrame)
+    and the total amount paid. Non-annual schedules also carry a 'PERIOD' column (datetime64[M] period starts).
+    Results are memoized in the shared schedule cache, keyed on the normalized inputs and the start year.
+    The cache holds the column arrays themselves, so they are read-only; every call gets its own dictionary.
     """
     if not all(isinstance(val, (int, float)) for val in [principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years]):
-        return [], 0.0
-
-    annual_interest_rate_decimal = annual_interest_rate_percent / 100.0
-    schedule_data = []
-    current_balance = principal_amount
-    start_year = pd.to_datetime('today').year
-
-    # Grace Period Calculation
-    for year_offset in range(grace_period_years):
-        current_year = start_year + year_offset
-        interest_accrued = current_balance * annual_interest_rate_decimal
-        current_balance += interest_accrued
-        schedule_data.append({
-            'YEAR': current_year,
-            'PRINCIPAL PAYMENT': 0.0,
-            'INTEREST': interest_accrued,
-            'P+I': interest_accrued,
-            'PAYMENT': 0.0,
-            'REMAINING BALANCE': current_balance
-        })
-
-    # Repayment Period Calculation
-    repayment_start_year = start_year + grace_period_years
-    repayment_period_years = total_loan_term_years - grace_period_years
-
-    if repayment_period_years <= 0:
+        return {}, 0.0
+
+    if start_year is None:
+        start_year = datetime.date.today().year
+
+    # Normalize so that e.g. 18 and 18.0 or 3.5 and 3.50000000001 share an entry
+    cache_key = (round(float(principal_amount), 2), round(float(annual_interest_rate_percent), 8),
+                 int(grace_period_years), int(total_loan_term_years), int(periods_per_year), int(start_year))
+    schedule_cache = get_schedule_cache()
+    cached = schedule_cache.get(cache_key)
+    if cached is not None:
+        schedule_data, total_amount_paid = cached
+        return dict(schedule_data), total_amount_paid
+
+    schedule_columns, total_amount_paid = calculate_loan_schedule_arrays(
+        principal_amount, annual_interest_rate_percent, grace_period_years, total_loan_term_years,
+        start_year=start_year, periods_per_year=periods_per_year
+    )
+
+    if schedule_columns is None:
         st.error("Total loan term must be greater than the grace period. Please check the values.")
-        return [], 0.0
+        return {}, 0.0
 
-    pmt_principal_for_repayment = current_balance
-    
-    if annual_interest_rate_decimal == 0:
-        annual_payment = pmt_principal_for_repayment / repayment_period_years
+    schedule_data = {col: schedule_columns[col] for col in (SCHEDULE_COLUMNS if periods_per_year == 1 else ['PERIOD'] + SCHEDULE_COLUMNS)}
+    for values in schedule_data.values():
+        values.flags.writeable = False
+    schedule_cache.put(cache_key, (schedule_data, total_amount_paid))
+    return dict(schedule_data), total_amount_paid
+
+def calculate_floating_rate_schedules(principal_amount, rate_paths_percent, grace_period_years, total_loan_term_years, spread_percent=0.0, start_year=None, periods_per_year=1):
+    """
+    Computes floating-rate repayment schedules for many benchmark rate paths at once.
+    rate_paths_percent is a (paths, periods) array of annual benchmark rates; spread_percent is added on top.
+    The payment is re-amortized over the remaining repayment periods at every period (a rate reset),
+    so each period retires a fraction of the balance that depends only on that period's rate and the
+    periods left, and balances follow a cumulative product along the path.
+    Returns a dictionary keyed like SCHEDULE_COLUMNS (plus 'PERIOD'); 'PERIOD' and 'YEAR' are 1-D,
+    every other column is a (paths, periods) array.
+    """
+    if start_year is None:
+        start_year = datetime.date.today().year
+
+    grace_periods = int(grace_period_years) * periods_per_year
+    repayment_periods = (int(total_loan_term_years) - int(grace_period_years)) * periods_per_year
+    total_periods = grace_periods + repayment_periods
+    if repayment_periods <= 0:
+        raise ValueError("Total loan term must be greater than the grace period.")
+
+    rate_paths = np.atleast_2d(np.asarray(rate_paths_percent, dtype=float))[:, :total_periods]
+    if rate_paths.shape[1] < total_periods:
+        raise ValueError(f"The rate paths cover {rate_paths.shape[1]} periods but the loan has {total_periods}.")
+    period_rate = (rate_paths + spread_percent) / 100.0 / periods_per_year
+
+    # Balance factor of every period: grace periods capitalize interest,
+    # repayment periods pay the annuity computed on the remaining balance and remaining periods
+    remaining_periods = np.maximum(total_periods - np.arange(total_periods), 1)[np.newaxis, :]
+    payment_factor = annuity_payment(1.0, period_rate, remaining_periods)
+    in_grace = np.arange(total_periods)[np.newaxis, :] < grace_periods
+    balance_factor = np.where(in_grace, 1 + period_rate, 1 + period_rate - payment_factor)
+    balance_factor[:, -1] = 0.0 # Last period pays off whatever is left
+
+    closing_balances = principal_amount * np.cumprod(balance_factor, axis=1)
+    opening_balances = np.concatenate((np.full((len(period_rate), 1), float(principal_amount)), closing_balances[:, :-1]), axis=1)
+    closing_balances[np.abs(closing_balances) < 0.01] = 0.0
+
+    interest = opening_balances * period_rate
+    payment = np.where(in_grace, 0.0, opening_balances * payment_factor)
+    payment[:, -1] = opening_balances[:, -1] + interest[:, -1]
+    principal_payment = np.where(in_grace, 0.0, payment - interest)
+
+    periods = np.arange(np.datetime64(f"{start_year}-01", 'M'),
+                        np.datetime64(f"{start_year}-01", 'M') + total_periods * (12 // periods_per_year),
+                        np.timedelta64(12 // periods_per_year, 'M'))
+    return {
+        'PERIOD': periods,
+        'YEAR': periods.astype('datetime64[Y]').astype(int) + 1970,
+        'PRINCIPAL PAYMENT': principal_payment,
+        'INTEREST': interest,
+        'P+I': principal_payment + interest,
+        'PAYMENT': payment,
+        'REMAINING BALANCE': closing_balances
+    }
+
+
+def load_rate_paths(uploaded_file, total_periods):
+    """
+    Reads a rate curve file: the first column is the period number (1 = first payment period) at which a rate
+    takes effect, every further column is one benchmark rate path in percent.
+    Rates are carried forward until the next reset and the last rate holds to the end of the loan.
+    Returns the path names and a (paths, total_periods) array.
+    """
+    if uploaded_file.name.lower().endswith('.csv'):
+        raw_df = pd.read_csv(uploaded_file)
     else:
-        annual_payment = (pmt_principal_for_repayment * annual_interest_rate_decimal) / \
-                         (1 - (1 + annual_interest_rate_decimal)**(-repayment_period_years))
-    
-    total_amount_paid = 0.0
-
-    for i in range(repayment_period_years):
-        current_year = repayment_start_year + i
-        interest_for_this_year = current_balance * annual_interest_rate_decimal
-        
-        if i == repayment_period_years - 1:
-            payment_this_year = current_balance + interest_for_this_year
-            principal_payment_this_year = current_balance
-            current_balance = 0.0
+        raw_df = pd.read_excel(uploaded_file)
+
+    if raw_df.shape[1] < 2:
+        raise ValueError("The rate file needs a period column and at least one rate column.")
+
+    rates_df = raw_df.apply(pd.to_numeric, errors='coerce').dropna(subset=[raw_df.columns[0]])
+    rates_df = rates_df.set_index(rates_df.columns[0])
+    rates_df.index = rates_df.index.astype(int)
+    rates_df = rates_df[~rates_df.index.duplicated(keep='last')].sort_index()
+    rates_df = rates_df.reindex(rates_df.index.union(np.arange(1, total_periods + 1))).ffill().bfill().loc[1:total_periods]
+    if rates_df.isna().any().any():
+        raise ValueError("Every rate column needs at least one numeric value.")
+    return [str(col) for col in rates_df.columns], rates_df.to_numpy().T
+
+
+def calculate_rate_term_grid(principal_amount, annual_interest_rates_percent, total_loan_terms_years, grace_period_years, periods_per_year=1):
+    """
+    Computes the regular payment, total amount paid and total interest for every (interest rate, loan term) pair
+    in one broadcasted calculation. Returns a dictionary keyed by SENSITIVITY_METRICS of (rates, terms) arrays.
+    Grace-period interest is capitalized as in calculate_loan_repayment_schedule; terms that do not exceed
+    the grace period are NaN. The final payment of an annuity equals the regular payment, so total paid = n * payment.
+    """
+    period_rate = np.asarray(annual_interest_rates_percent, dtype=float).reshape(-1, 1) / 100.0 / periods_per_year
+    terms = np.asarray(total_loan_terms_years, dtype=int).reshape(1, -1)
+    grace_periods = int(grace_period_years) * periods_per_year
+    repayment_periods = (terms - int(grace_period_years)) * periods_per_year
+    valid = repayment_periods > 0
+    repayment_periods = np.where(valid, repayment_periods, 1)
+
+    capitalized_principal = principal_amount * (1 + period_rate) ** grace_periods
+    payment = np.where(valid, annuity_payment(capitalized_principal, period_rate, repayment_periods), np.nan)
+    total_amount_paid = payment * repayment_periods
+    return {
+        'PAYMENT': payment,
+        'TOTAL AMOUNT PAID': total_amount_paid,
+        'TOTAL INTEREST': total_amount_paid - principal_amount
+    }
+
+
+def calculate_loan_targets(principal_amount, annual_interest_rate_percent, grace_period_years, repayment_years, periods_per_year=1):
+    """
+    Annual payment and total amount paid of an annuity loan, broadcast over array inputs.
+    Grace-period interest is capitalized as in calculate_loan_repayment_schedule. repayment_years may be
+    fractional (the solver treats the term as continuous); it must be positive.
+    Returns the tuple (annual_payment, total_amount_paid).
+    """
+    period_rate = np.asarray(annual_interest_rate_percent, dtype=float) / 100.0 / periods_per_year
+    repayment_periods = np.asarray(repayment_years, dtype=float) * periods_per_year
+    capitalized_principal = np.asarray(principal_amount, dtype=float) * (1 + period_rate) ** (np.asarray(grace_period_years, dtype=int) * periods_per_year)
+    payment = annuity_payment(capitalized_principal, period_rate, repayment_periods)
+    return payment * periods_per_year, payment * repayment_periods
+
+
+def solve_increasing(func, targets, low, high, max_high, iterations=200):
+    """
+    Vectorized bisection for func(x) = targets where func is increasing in x.
+    The upper bracket is doubled until it reaches the target (at most up to max_high), then every element
+    is bisected at once. Elements whose target lies outside [func(low), func(max_high)] are NaN, and so are
+    elements where func is flat over the bracket (e.g. total amount paid against the term at 0% interest),
+    since any x would do.
+    """
+    targets = np.asarray(targets, dtype=float)
+    low = np.broadcast_to(np.asarray(low, dtype=float), targets.shape).copy()
+    high = np.broadcast_to(np.asarray(high, dtype=float), targets.shape).copy()
+    while True:
+        below = func(high) < targets
+        if not np.any(below & (high < max_high)):
+            break
+        high = np.where(below, np.minimum(high * 2, max_high), high)
+    low_value, high_value = func(low), func(high)
+    solvable = (low_value <= targets) & (high_value >= targets) & ~np.isclose(high_value, low_value, rtol=1e-12, atol=0.0)
+
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        too_low = func(middle) < targets
+        low = np.where(too_low, middle, low)
+        high = np.where(too_low, high, middle)
+        if np.all(high - low <= 1e-12 * np.maximum(1.0, np.abs(high))):
+            break
+    return np.where(solvable, (low + high) / 2, np.nan)
+
+
+def solve_loan_parameter(solve_for, target_type, targets, principal_amount, annual_interest_rate_percent,
+                         grace_period_years, total_loan_term_years, periods_per_year=1):
+    """
+    Goal seek: finds the value of `solve_for` ('INTEREST RATE (%)', 'TOTAL LOAN TERM (YEARS)' or 'PRINCIPAL')
+    at which the loan's `target_type` ('ANNUAL PAYMENT' or 'TOTAL AMOUNT PAID') equals each of `targets`.
+    The other parameters are held fixed (the value passed for the solved parameter is ignored).
+    The principal has a closed form; rate and term are found by vectorized bisection, so thousands of
+    targets are solved in one call. The term is solved as a continuous number of years including grace.
+    Targets without a solution give NaN.
+    """
+    targets = np.asarray(targets, dtype=float)
+    target_index = SOLVER_TARGETS.index(target_type)
+    repayment_years = total_loan_term_years - grace_period_years
+
+    def target_value(principal=principal_amount, rate=annual_interest_rate_percent, years=repayment_years):
+        return calculate_loan_targets(principal, rate, grace_period_years, years, periods_per_year)[target_index]
+
+    if solve_for == 'PRINCIPAL':
+        # Payments scale linearly with the principal
+        return targets / target_value(principal=1.0)
+
+    if solve_for == 'INTEREST RATE (%)':
+        return solve_increasing(lambda rate: target_value(rate=rate), targets, low=0.0, high=10.0, max_high=1000.0)
+
+    if solve_for == 'TOTAL LOAN TERM (YEARS)':
+        min_years = 1.0 / periods_per_year # At least one payment period
+        if target_type == 'ANNUAL PAYMENT':
+            # The payment falls as the term grows: solve the negated equation
+            repayment = solve_increasing(lambda years: -target_value(years=years), -targets,
+                                         low=min_years, high=10.0, max_high=1000.0)
         else:
-            payment_this_year = annual_payment
-            principal_payment_this_year = payment_this_year - interest_for_this_year
-            current_balance -= principal_payment_this_year
-        
-        if abs(current_balance) < 0.01:
-            current_balance = 0.0
-            
-        principal_plus_interest = principal_payment_this_year + interest_for_this_year
-        total_amount_paid += payment_this_year
-
-        schedule_data.append({
-            'YEAR': current_year,
-            'PRINCIPAL PAYMENT': principal_payment_this_year,
-            'INTEREST': interest_for_this_year,
-            'P+I': principal_plus_interest,
-            'PAYMENT': payment_this_year,
-            'REMAINING BALANCE': current_balance
-        })
-    
-    return schedule_data, total_amount_paid
+            repayment = solve_increasing(lambda years: target_value(years=years), targets,
+                                         low=min_years, high=10.0, max_high=1000.0)
+        return grace_period_years + repayment
+
+    raise ValueError(f"Unknown parameter to solve for: {solve_for}")
+
+# --- Loan Portfolio Batch Mode ---
+def load_loan_portfolio(uploaded_file):
+    """
+    Reads a CSV or XLSX loan list into a DataFrame with LOAN ID and PORTFOLIO_INPUT_COLUMNS.
+    Returns the valid loans and the number of rows skipped because of missing or invalid values;
+    grace periods and loan terms must be whole numbers of years.
+    """
+    if uploaded_file.name.lower().endswith('.csv'):
+        raw_df = pd.read_csv(uploaded_file)
+    else:
+        raw_df = pd.read_excel(uploaded_file)
+
+    raw_df.columns = [str(col).strip().upper() for col in raw_df.columns]
+    missing_columns = [col for col in PORTFOLIO_INPUT_COLUMNS if col not in raw_df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+
+    loans_df = raw_df[PORTFOLIO_INPUT_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    if 'LOAN ID' in raw_df.columns:
+        loans_df.insert(0, 'LOAN ID', raw_df['LOAN ID'].astype(str))
+    else:
+        loans_df.insert(0, 'LOAN ID', [f"Loan {i+1}" for i in range(len(raw_df))])
+
+    valid = loans_df[PORTFOLIO_INPUT_COLUMNS].notna().all(axis=1) & \
+            (loans_df['PRINCIPAL'] > 0) & \
+            (loans_df['INTEREST RATE (%)'] >= 0) & \
+            (loans_df['GRACE PERIOD (YEARS)'] >= 0) & \
+            (loans_df['GRACE PERIOD (YEARS)'] % 1 == 0) & \
+            (loans_df['TOTAL LOAN TERM (YEARS)'] % 1 == 0) & \
+            (loans_df['TOTAL LOAN TERM (YEARS)'] > loans_df['GRACE PERIOD (YEARS)'])
+    loans_df = loans_df[valid].reset_index(drop=True)
+    loans_df['GRACE PERIOD (YEARS)'] = loans_df['GRACE PERIOD (YEARS)'].astype(int)
+    loans_df['TOTAL LOAN TERM (YEARS)'] = loans_df['TOTAL LOAN TERM (YEARS)'].astype(int)
+    return loans_df, int((~valid).sum())
+
+
+def calculate_loan_portfolio_ladder(loans_df, start_year=None):
+    """
+    Computes every loan of the portfolio in one pass.
+    Returns the consolidated year-by-year cash-flow ladder and the per-loan totals as DataFrames.
+    """
+    schedule_columns = calculate_loan_portfolio_schedules(
+        loans_df['PRINCIPAL'].to_numpy(),
+        loans_df['INTEREST RATE (%)'].to_numpy(),
+        loans_df['GRACE PERIOD (YEARS)'].to_numpy(),
+        loans_df['TOTAL LOAN TERM (YEARS)'].to_numpy(),
+        start_year
+    )
+
+    ladder_df = pd.DataFrame({
+        col: schedule_columns[col] if col == 'YEAR' else schedule_columns[col].sum(axis=0)
+        for col in SCHEDULE_COLUMNS
+    })
+
+    loan_totals_df = loans_df.copy()
+    loan_totals_df['TOTAL PRINCIPAL PAID'] = schedule_columns['PRINCIPAL PAYMENT'].sum(axis=1)
+    loan_totals_df['TOTAL INTEREST'] = schedule_columns['INTEREST'].sum(axis=1)
+    loan_totals_df['TOTAL AMOUNT PAID'] = schedule_columns['PAYMENT'].sum(axis=1)
+    return ladder_df, loan_totals_df
+
+
+def create_sensitivity_excel_report(grid, interest_rates, loan_terms):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for metric in SENSITIVITY_METRICS:
+            metric_df = pd.DataFrame(grid[metric], index=interest_rates, columns=loan_terms)
+            metric_df.index.name = 'RATE (%) / TERM (YEARS)'
+            metric_df.to_excel(writer, sheet_name=metric.title())
+    output.seek(0)
+    return output.getvalue()
+
+
+def create_portfolio_excel_report(ladder_df, loan_totals_df):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        ladder_df.to_excel(writer, sheet_name='Cash-Flow Ladder', index=False)
+        loan_totals_df.to_excel(writer, sheet_name='Loan Totals', index=False)
+        for sheet_name, df in (('Cash-Flow Ladder', ladder_df), ('Loan Totals', loan_totals_df)):
+            worksheet = writer.sheets[sheet_name]
+            for col_idx, col_name in enumerate(df.columns, 1):
+                worksheet.column_dimensions[get_column_letter(col_idx)].width = max(len(col_name), 16) + 2
+    output.seek(0)
+    return output.getvalue()
 
 # --- Report Generation Functions ---
 
 def create_excel_xlsx_report(schedule_data, total_payment, principal_amount, interest_rate, grace_period, total_loan_term, currency_symbol):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Loan Repayment Schedule" # Excel sheet title English
+    """
+    Streams the repayment schedule to an .xlsx file with xlsxwriter in constant_memory mode:
+    every row is flushed to disk once written, so memory stays flat for 100k+ row schedules.
+    Column widths are taken from each column's longest text (the extremes, for numeric columns)
+    instead of a second pass over every cell.
+    """
+    output = io.BytesIO()
+    wb = xlsxwriter.Workbook(output, {'constant_memory': True})
+    ws = wb.add_worksheet("Loan Repayment Schedule") # Excel sheet title English
 
     # Define styles
-    header_font = Font(bold=True, size=10)
-    data_font = Font(size=9)
-    right_aligned = Alignment(horizontal='right')
-    center_aligned = Alignment(horizontal='center')
-    thin_border = Border(left=Side(style='thin'), 
-                         right=Side(style='thin'), 
-                         top=Side(style='thin'), 
-                         bottom=Side(style='thin'))
-    
-    # Custom number format for currency (e.g., #,##0.00 "₺")
-    currency_excel_format = f'#,##0.00 "{currency_symbol}"'
-    
-    # Add general information
-    ws.append(["--- LOAN REPAYMENT SCHEDULE ---"]) # Title English
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=6)
-    ws['A1'].alignment = center_aligned
-    ws['A1'].font = header_font
+    currency_excel_format = f'#,##0.00 "{currency_symbol}"' # Custom number format for currency (e.g., #,##0.00 "₺")
+    title_format = wb.add_format({'bold': True, 'font_size': 10, 'align': 'center'})
+    description_format = wb.add_format({'font_size': 9, 'align': 'center'})
+    principal_format = wb.add_format({'num_format': currency_excel_format})
+    rate_format = wb.add_format({'align': 'right'})
+    header_format = wb.add_format({'bold': True, 'font_size': 10, 'align': 'center', 'border': 1})
+    period_format = wb.add_format({'font_size': 9, 'align': 'center', 'border': 1, 'num_format': '0'})
+    amount_format = wb.add_format({'font_size': 9, 'align': 'right', 'border': 1, 'num_format': currency_excel_format})
+    total_label_format = wb.add_format({'bold': True, 'font_size': 10, 'align': 'right'})
+    total_amount_format = wb.add_format({'bold': True, 'font_size': 10, 'align': 'right', 'num_format': currency_excel_format})
 
+    # Table headers (non-annual schedules are labelled by PERIOD instead of YEAR)
+    period_column = 'PERIOD' if 'PERIOD' in schedule_data else 'YEAR'
+    headers = [period_column, 'PRINCIPAL PAYMENT', 'INTEREST', 'P+I', 'PAYMENT', 'REMAINING BALANCE'] # Headers English
+    schedule_df = pd.DataFrame(schedule_data, columns=headers)
+    if period_column == 'PERIOD':
+        schedule_df['PERIOD'] = schedule_df['PERIOD'].dt.strftime('%Y-%m')
+
+    # Add general information
+    ws.merge_range(0, 0, 0, 5, "--- LOAN REPAYMENT SCHEDULE ---", title_format) # Title English
     repayment_period_years = total_loan_term - grace_period
-    ws.append([f"{grace_period} YEARS GRACE; {repayment_period_years} YEARS PAYMENT; TOTAL {total_loan_term} YEARS LOAN TERM"]) # Description English
-    ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=6)
-    ws['A2'].alignment = center_aligned
-    ws['A2'].font = data_font
-
-    ws.append([]) # Blank row
-    ws.append(["Loan Principal:", principal_amount]) # Label English
-    ws.cell(row=4, column=2).number_format = currency_excel_format
-    
-    # Interest rate row and alignment
-    ws.append(["Annual Interest Rate:", f"%{interest_rate:.1f}"]) # Format updated and label English
-    ws.cell(row=ws.max_row, column=2).alignment = right_aligned # Right align
-    ws.append([]) # Blank row
+    ws.merge_range(1, 0, 1, 5, f"{grace_period} YEARS GRACE; {repayment_period_years} YEARS PAYMENT; TOTAL {total_loan_term} YEARS LOAN TERM", description_format) # Description English
+    ws.write_string(3, 0, "Loan Principal:") # Label English
+    ws.write_number(3, 1, principal_amount, principal_format)
+    ws.write_string(4, 0, "Annual Interest Rate:") # Label English
+    ws.write_string(4, 1, f"%{interest_rate:.1f}", rate_format) # Format updated
 
     # Add table headers
-    headers = ['YEAR', 'PRINCIPAL PAYMENT', 'INTEREST', 'P+I', 'PAYMENT', 'REMAINING BALANCE'] # Headers English
-    ws.append(headers)
-
-    for col_idx, header_text in enumerate(headers, 1):
-        cell = ws.cell(row=ws.max_row, column=col_idx)
-        cell.font = header_font
-        cell.alignment = center_aligned
-        cell.border = thin_border
+    ws.write_row(6, 0, headers, header_format)
 
     # Add data rows
-    for row_data in schedule_data:
-        row_values = [
-            row_data['YEAR'],
-            row_data['PRINCIPAL PAYMENT'],
-            row_data['INTEREST'],
-            row_data['P+I'],
-            row_data['PAYMENT'],
-            row_data['REMAINING BALANCE']
-        ]
-        ws.append(row_values)
-        
-        # Apply formatting to data rows
-        for col_idx in range(1, len(headers) + 1):
-            cell = ws.cell(row=ws.max_row, column=col_idx)
-            cell.font = data_font
-            cell.border = thin_border
-            if col_idx == 1: # YEAR column
-                cell.alignment = center_aligned
-                cell.number_format = BUILTIN_FORMATS[1] # Integer format
-            else: # Numeric columns
-                cell.alignment = right_aligned
-                cell.number_format = currency_excel_format # Apply custom currency format
-
-    ws.append([]) # Blank row
-    ws.append(["Total Amount Paid:", "", "", "", "", total_payment]) # Label English
-    ws.merge_cells(start_row=ws.max_row, start_column=1, end_row=ws.max_row, end_column=5)
-    ws.cell(row=ws.max_row, column=1).alignment = right_aligned
-    ws.cell(row=ws.max_row, column=6).number_format = currency_excel_format
-    ws.cell(row=ws.max_row, column=6).alignment = right_aligned
-    ws.cell(row=ws.max_row, column=1).font = header_font
-    ws.cell(row=ws.max_row, column=6).font = header_font
-
-
-    # Adjust column widths automatically
-    for col_idx in range(1, ws.max_column + 1):
-        max_length = 0
-        for row_idx in range(1, ws.max_row + 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            if cell.value is not None:
-                cell_value_str = str(cell.value)
-                if len(cell_value_str) > max_length:
-                    max_length = len(cell_value_str)
-        
-        column_letter = get_column_letter(col_idx)
-        adjusted_width = (max_length + 2) * 1.2 # Add some padding
-        if adjusted_width > 0:
-            ws.column_dimensions[column_letter].width = adjusted_width
+    row_idx = 7
+    for period_value, *amounts in zip(*(schedule_df[col].tolist() for col in headers)):
+        ws.write(row_idx, 0, period_value, period_format)
+        ws.write_row(row_idx, 1, amounts, amount_format)
+        row_idx += 1
 
-    output = io.BytesIO()
-    wb.save(output)
+    row_idx += 1 # Blank row
+    ws.merge_range(row_idx, 0, row_idx, 4, "Total Amount Paid:", total_label_format) # Label English
+    ws.write_number(row_idx, 5, total_payment, total_amount_format)
+
+    # Adjust column widths from the longest text of every column (merged title rows are not counted)
+    def currency_text_length(value):
+        return len(f"{value:,.2f} {currency_symbol}")
+
+    column_lengths = [max(len(period_column), len("Annual Interest Rate:"),
+                          int(schedule_df[period_column].astype(str).str.len().max()) if not schedule_df.empty else 0)]
+    for col in headers[1:]:
+        candidates = [len(col)]
+        if not schedule_df.empty:
+            candidates += [currency_text_length(schedule_df[col].max()), currency_text_length(schedule_df[col].min())]
+        column_lengths.append(max(candidates))
+    column_lengths[1] = max(column_lengths[1], currency_text_length(principal_amount))
+    column_lengths[5] = max(column_lengths[5], currency_text_length(total_payment))
+    for col_idx, max_length in enumerate(column_lengths):
+        ws.set_column(col_idx, col_idx, (max_length + 2) * 1.2) # Add some padding
+
+    wb.close()
     output.seek(0)
     return output.getvalue()
 
-def create_word_docx_report(schedule_data, total_payment, principal_amount, interest_rate, grace_period, total_loan_term, currency_symbol):
+def create_schedule_docx_template():
+    """
+    Creates the Word document template for the repayment schedule: the schedule table uses the
+    DOCX_TABLE_STYLE table style and its cells use the paragraph styles in DOCX_PARAGRAPH_STYLES,
+    so fonts and alignment are set once per document instead of once per cell and run.
+    """
     document = Document()
+    document.styles[DOCX_TABLE_STYLE] # Raises KeyError early if the default template lacks the table style
+    alignments = {'center': WD_ALIGN_PARAGRAPH.CENTER, 'right': WD_ALIGN_PARAGRAPH.RIGHT}
+    for style_name, (font_size, bold, alignment) in DOCX_PARAGRAPH_STYLES.items():
+        style = document.styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = document.styles['Normal']
+        style.font.size = Pt(font_size)
+        style.font.bold = bold
+        style.paragraph_format.alignment = alignments[alignment]
+        style.paragraph_format.space_after = Pt(0)
+    return document
+
+def build_docx_table_xml(table_style_id, paragraph_style_ids, header_row, body_rows, column_width):
+    """
+    Builds the WordprocessingML of a whole table in one string, which is parsed once instead of
+    creating every row, cell and run through python-docx objects.
+    paragraph_style_ids holds the header style id followed by one style id per column;
+    column_width is in twentieths of a point (dxa).
+    """
+    cell_properties = f'<w:tcPr><w:tcW w:type="dxa" w:w="{column_width}"/></w:tcPr>'
+
+    def row_xml(values, style_ids):
+        cells = ''.join(f'<w:tc>{cell_properties}<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+                        f'<w:r><w:t xml:space="preserve">{xml_escape(str(value))}</w:t></w:r></w:p></w:tc>'
+                        for value, style_id in zip(values, style_ids))
+        return f'<w:tr>{cells}</w:tr>'
+
+    header_style_ids = [paragraph_style_ids[0]] * len(header_row)
+    column_style_ids = paragraph_style_ids[1:]
+    grid = ''.join(f'<w:gridCol w:w="{column_width}"/>' for _ in header_row)
+    rows = [row_xml(header_row, header_style_ids)] + [row_xml(values, column_style_ids) for values in body_rows]
+    return (f'<w:tbl {nsdecls("w")}><w:tblPr><w:tblStyle w:val="{table_style_id}"/><w:tblW w:type="auto" w:w="0"/>'
+            f'<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" w:noHBand="0" w:noVBand="1"/>'
+            f'</w:tblPr><w:tblGrid>{grid}</w:tblGrid>{"".join(rows)}</w:tbl>')
+
+def create_word_docx_report(schedule_data, total_payment, principal_amount, interest_rate, grace_period, total_loan_term, currency_symbol):
+    document = create_schedule_docx_template()
 
     document.add_heading('Loan Repayment Schedule', level=1) # Heading English
     
@@ -245,37 +694,23 @@ def create_word_docx_report(schedule_data, total_payment, principal_amount, inte
     document.add_paragraph(f"{grace_period} Years Grace, {repayment_period_years} Years Payment, Total {total_loan_term} Years Loan Term") # Description English
     document.add_paragraph(f"Loan Principal: {format_number(principal_amount, currency_symbol=currency_symbol)}") # Label English
     document.add_paragraph(f"Annual Interest Rate: {format_number(interest_rate, is_percentage=True)}") # Label English and percentage format used
-    document.add_paragraph("\n")
+    spacer = document.add_paragraph("\n")
 
-    headers = ['YEAR', 'PRINCIPAL PAYMENT', 'INTEREST', 'P+I', 'PAYMENT', 'REMAINING BALANCE'] # Headers English
-    table = document.add_table(rows=1, cols=len(headers))
-    table.style = 'Table Grid'
-
-    hdr_cells = table.rows[0].cells
-    for i, header_text in enumerate(headers):
-        hdr_cells[i].text = header_text
-        hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        hdr_cells[i].paragraphs[0].runs[0].font.bold = True
-        hdr_cells[i].paragraphs[0].runs[0].font.size = Pt(10)
-
-    for row in schedule_data:
-        row_cells = table.add_row().cells
-        row_cells[0].text = format_number(row['YEAR'], is_year=True)
-        row_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        row_cells[1].text = format_number(row['PRINCIPAL PAYMENT'], currency_symbol=currency_symbol)
-        row_cells[2].text = format_number(row['INTEREST'], currency_symbol=currency_symbol)
-        row_cells[3].text = format_number(row['P+I'], currency_symbol)
-        row_cells[4].text = format_number(row['PAYMENT'], currency_symbol=currency_symbol)
-        row_cells[5].text = format_number(row['REMAINING BALANCE'], currency_symbol=currency_symbol)
-
-        for j in range(1, len(headers)):
-            row_cells[j].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        for cell in row_cells:
-            for paragraph in cell.paragraphs:
-                for run in paragraph.runs:
-                    run.font.size = Pt(9)
+    period_column = 'PERIOD' if 'PERIOD' in schedule_data else 'YEAR'
+    headers = [period_column, 'PRINCIPAL PAYMENT', 'INTEREST', 'P+I', 'PAYMENT', 'REMAINING BALANCE'] # Headers English
+    period_labels = (schedule_data['PERIOD'].astype(str).tolist() if period_column == 'PERIOD' else
+                     [format_number(year, is_year=True) for year in schedule_data['YEAR'].tolist()])
+    body_rows = [[period_label] + [format_number(amount, currency_symbol=currency_symbol) for amount in amounts]
+                 for period_label, *amounts in zip(period_labels, *(schedule_data[col].tolist() for col in headers[1:]))]
+
+    section = document.sections[0]
+    column_width = int(Emu(section.page_width - section.left_margin - section.right_margin).pt * 20 / len(headers))
+    style_ids = [document.styles[name].style_id for name in DOCX_PARAGRAPH_STYLES]
+    header_style_id, period_style_id, amount_style_id = style_ids
+    table_xml = build_docx_table_xml(document.styles[DOCX_TABLE_STYLE].style_id,
+                                     [header_style_id, period_style_id] + [amount_style_id] * (len(headers) - 1),
+                                     headers, body_rows, column_width)
+    spacer._p.addnext(parse_xml(table_xml))
     
     document.add_paragraph("\n")
     document.add_paragraph(f"Total Amount Paid: {format_number(total_payment, currency_symbol=currency_symbol)}") # Label English
@@ -294,7 +729,7 @@ st.markdown("Enter loan parameters and view the repayment schedule and total amo
 
 # --- Session State Initialization ---
 if 'schedule_data' not in st.session_state:
-    st.session_state.schedule_data = []
+    st.session_state.schedule_data = {}
 if 'total_payment' not in st.session_state:
     st.session_state.total_payment = 0.0
 if 'show_results' not in st.session_state:
@@ -309,6 +744,20 @@ if 'total_loan_term' not in st.session_state:
     st.session_state.total_loan_term = 18
 if 'selected_currency_symbol' not in st.session_state:
     st.session_state.selected_currency_symbol = "₺"
+if 'payment_frequency' not in st.session_state:
+    st.session_state.payment_frequency = "Annual"
+if 'sensitivity_grid' not in st.session_state:
+    st.session_state.sensitivity_grid = None
+if 'floating_rate_results' not in st.session_state:
+    st.session_state.floating_rate_results = None
+if 'simulation_results' not in st.session_state:
+    st.session_state.simulation_results = None
+if 'solver_results' not in st.session_state:
+    st.session_state.solver_results = None
+if 'portfolio_ladder_df' not in st.session_state:
+    st.session_state.portfolio_ladder_df = None
+if 'portfolio_loans_df' not in st.session_state:
+    st.session_state.portfolio_loans_df = None
 
 
 # --- Input Section ---
@@ -356,6 +805,14 @@ with col2:
         index=list(CURRENCY_SYMBOLS.keys()).index(st.session_state.selected_currency_symbol) if st.session_state.selected_currency_symbol in CURRENCY_SYMBOLS else 0,
         key="currency_select"
     )
+    st.session_state.payment_frequency = st.selectbox(
+        "Payment Frequency:", # Label English
+        options=list(PAYMENT_FREQUENCIES.keys()),
+        index=list(PAYMENT_FREQUENCIES.keys()).index(st.session_state.payment_frequency),
+        key="frequency_select"
+    )
+
+periods_per_year = PAYMENT_FREQUENCIES[st.session_state.payment_frequency]
 
 # --- Calculate Button ---
 if st.button("Calculate and Show Results", key="calculate_btn"): # Button English
@@ -370,13 +827,18 @@ if st.button("Calculate and Show Results", key="calculate_btn"): # Button Englis
             st.session_state.principal_amount,
             st.session_state.interest_rate,
             st.session_state.grace_period,
-            st.session_state.total_loan_term
+            st.session_state.total_loan_term,
+            periods_per_year
         )
         if st.session_state.schedule_data:
             st.session_state.show_results = True
         else:
             st.session_state.show_results = False
 
+cache_stats = get_schedule_cache().stats()
+st.caption(f"Schedule cache (shared by all users): {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+           f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']}/{cache_stats['max_entries']} entries, "
+           f"entries expire after {cache_stats['ttl_seconds']} s") # Caption English
 
 # --- Display Results (controlled by session_state) ---
 if st.session_state.show_results:
@@ -386,6 +848,7 @@ if st.session_state.show_results:
     st.subheader(f"{st.session_state.grace_period} YEARS GRACE, {repayment_period_years_display} YEARS PAYMENT, TOTAL {st.session_state.total_loan_term} YEARS LOAN TERM") # Subheader English
     st.write(f"**Loan Principal:** {format_number(st.session_state.principal_amount, currency_symbol=st.session_state.selected_currency_symbol)}") # Label English
     st.write(f"**Annual Interest Rate:** {format_number(st.session_state.interest_rate, is_percentage=True)}") # Label English and percentage format used
+    st.write(f"**Payment Frequency:** {st.session_state.payment_frequency}") # Label English
     st.markdown("---")
 
     # Display schedule as a DataFrame
@@ -405,12 +868,27 @@ if st.session_state.show_results:
     for col in display_df.columns:
         if col == 'YEAR':
             display_df[col] = display_df[col].apply(lambda x: format_number(x, is_year=True))
+        elif col == 'PERIOD':
+            display_df[col] = display_df[col].dt.strftime('%Y-%m')
         else:
             display_df[col] = display_df[col].apply(lambda x: format_number(x, currency_symbol=st.session_state.selected_currency_symbol))
 
     st.dataframe(display_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True)
     st.markdown("---")
     st.subheader(f"Total Amount Paid: {format_number(st.session_state.total_payment, currency_symbol=st.session_state.selected_currency_symbol)}") # Label English
+
+    # --- Balance and Interest Lookup (closed form, no schedule needed) ---
+    with st.expander("Balance and Interest Lookup"):
+        total_periods = st.session_state.total_loan_term * periods_per_year
+        col_lookup1, col_lookup2 = st.columns(2)
+        with col_lookup1:
+            lookup_from_period = st.number_input("From Period:", min_value=0, max_value=total_periods, value=0, step=1, key="lookup_from_period")
+        with col_lookup2:
+            lookup_to_period = st.number_input("To Period:", min_value=0, max_value=total_periods, value=min(periods_per_year, total_periods), step=1, key="lookup_to_period")
+        loan_args = (st.session_state.principal_amount, st.session_state.interest_rate,
+                     st.session_state.grace_period, st.session_state.total_loan_term, periods_per_year)
+        st.write(f"**Balance after Period {lookup_to_period}:** {format_number(balance_at(lookup_to_period, *loan_args), currency_symbol=st.session_state.selected_currency_symbol)}")
+        st.write(f"**Interest between Periods {lookup_from_period} and {lookup_to_period}:** {format_number(interest_between(lookup_from_period, lookup_to_period, *loan_args), currency_symbol=st.session_state.selected_currency_symbol)}")
     st.markdown("---")
 
     # --- Download Buttons ---
@@ -452,4 +930,287 @@ if st.session_state.show_results:
             file_name="loan_repayment_schedule.docx", # File name English
             mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             key="download_word_docx_btn"
-        )
\ No newline at end of file
+        )
+
+
+# --- Loan Portfolio Batch Mode ---
+st.markdown("---")
+st.header("Loan Portfolio Batch Mode") # Header English
+st.markdown(f"Upload a CSV or Excel file with the columns **{', '.join(PORTFOLIO_INPUT_COLUMNS)}** (optionally **LOAN ID**). "
+            "All loans are calculated in one pass and consolidated into a year-by-year cash-flow ladder.")
+
+portfolio_file = st.file_uploader("Loan Portfolio File:", type=["csv", "xlsx"], key="portfolio_file_uploader")
+
+if st.button("Calculate Portfolio", key="calculate_portfolio_btn"):
+    if portfolio_file is None:
+        st.error("Please upload a loan portfolio file first.")
+    else:
+        try:
+            loans_df, skipped_rows = load_loan_portfolio(portfolio_file)
+            if skipped_rows:
+                st.warning(f"{skipped_rows} row(s) were skipped because of missing or invalid values (grace periods and loan terms must be whole years).")
+            if loans_df.empty:
+                st.error("The file does not contain any valid loans.")
+                st.session_state.portfolio_ladder_df = None
+            else:
+                st.session_state.portfolio_ladder_df, st.session_state.portfolio_loans_df = calculate_loan_portfolio_ladder(loans_df)
+        except Exception as e:
+            st.error(f"Could not read the loan portfolio file: {e}")
+            st.session_state.portfolio_ladder_df = None
+
+if st.session_state.portfolio_ladder_df is not None:
+    ladder_df = st.session_state.portfolio_ladder_df
+    loan_totals_df = st.session_state.portfolio_loans_df
+    currency_symbol = st.session_state.selected_currency_symbol
+
+    st.subheader(f"Consolidated Cash-Flow Ladder ({len(loan_totals_df)} Loans)")
+    ladder_display_df = ladder_df.copy()
+    ladder_display_df['YEAR'] = ladder_display_df['YEAR'].apply(lambda x: format_number(x, is_year=True))
+    for col in SCHEDULE_COLUMNS[1:]:
+        ladder_display_df[col] = ladder_display_df[col].apply(lambda x: format_number(x, currency_symbol=currency_symbol))
+    st.dataframe(ladder_display_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True)
+
+    st.subheader(f"Portfolio Total Amount Paid: {format_number(ladder_df['PAYMENT'].sum(), currency_symbol=currency_symbol)}")
+
+    st.subheader("Per-Loan Totals")
+    st.dataframe(loan_totals_df, use_container_width=True, hide_index=True)
+
+    st.download_button(
+        label="Download Portfolio as Excel (.xlsx)",
+        data=create_portfolio_excel_report(ladder_df, loan_totals_df),
+        file_name="loan_portfolio_ladder.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key="download_portfolio_excel_btn"
+    )
+
+
+# --- Interest Rate x Term Sensitivity Grid ---
+st.markdown("---")
+st.header("Interest Rate × Term Sensitivity") # Header English
+st.markdown("Computes the payment, total amount paid and total interest for every rate and term combination, "
+            "using the principal, grace period and payment frequency entered above.")
+
+col_grid1, col_grid2 = st.columns(2)
+with col_grid1:
+    grid_rate_start = st.number_input("Rate From (%):", min_value=0.0, max_value=100.0, value=0.0, step=0.25, key="grid_rate_start")
+    grid_rate_stop = st.number_input("Rate To (%):", min_value=0.0, max_value=100.0, value=60.0, step=0.25, key="grid_rate_stop")
+    grid_rate_step = st.number_input("Rate Step (%):", min_value=0.01, max_value=10.0, value=0.25, step=0.05, key="grid_rate_step")
+with col_grid2:
+    grid_term_start = st.number_input("Term From (Years):", min_value=1, max_value=100, value=1, step=1, key="grid_term_start")
+    grid_term_stop = st.number_input("Term To (Years):", min_value=1, max_value=100, value=30, step=1, key="grid_term_stop")
+    grid_metric = st.selectbox("Heatmap Metric:", options=SENSITIVITY_METRICS, key="grid_metric_select")
+
+if st.button("Calculate Sensitivity Grid", key="calculate_grid_btn"):
+    if grid_rate_stop < grid_rate_start or grid_term_stop < grid_term_start:
+        st.error("The end of each range must not be less than its start.")
+    else:
+        grid_interest_rates = np.round(np.arange(grid_rate_start, grid_rate_stop + grid_rate_step / 2, grid_rate_step), 4)
+        grid_loan_terms = np.arange(grid_term_start, grid_term_stop + 1)
+        st.session_state.sensitivity_grid = (
+            calculate_rate_term_grid(st.session_state.principal_amount, grid_interest_rates, grid_loan_terms,
+                                     st.session_state.grace_period, periods_per_year),
+            grid_interest_rates,
+            grid_loan_terms
+        )
+
+if st.session_state.sensitivity_grid is not None:
+    sensitivity_grid, grid_interest_rates, grid_loan_terms = st.session_state.sensitivity_grid
+    metric_df = pd.DataFrame(sensitivity_grid[grid_metric], index=grid_interest_rates, columns=grid_loan_terms)
+    metric_df.index.name = 'Rate (%)'
+    metric_df.columns.name = 'Term (Years)'
+
+    fig, ax = plt.subplots(figsize=(14, max(4, min(len(grid_interest_rates) * 0.12, 30))))
+    sns.heatmap(metric_df, cmap="viridis", ax=ax, cbar_kws={'label': f"{grid_metric} ({st.session_state.selected_currency_symbol})"})
+    ax.set_title(f"{grid_metric} by Interest Rate and Loan Term ({st.session_state.grace_period} Years Grace)")
+    plt.tight_layout()
+    st.pyplot(fig)
+    plt.close(fig)
+
+    st.dataframe(metric_df.style.format("{:,.2f}", na_rep=""), use_container_width=True)
+    st.download_button(
+        label="Download Sensitivity Grid as Excel (.xlsx)",
+        data=create_sensitivity_excel_report(sensitivity_grid, grid_interest_rates, grid_loan_terms),
+        file_name="loan_sensitivity_grid.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key="download_grid_excel_btn"
+    )
+
+
+# --- Floating-Rate Schedules ---
+st.markdown("---")
+st.header("Floating-Rate Schedules") # Header English
+st.markdown("Upload a rate curve whose first column is the period number at which a rate takes effect "
+            "and whose other columns are benchmark rate paths (%). The payment is re-amortized at every reset, "
+            "using the principal, grace period, term and payment frequency entered above.")
+
+col_float1, col_float2 = st.columns(2)
+with col_float1:
+    rate_path_file = st.file_uploader("Rate Curve File:", type=["csv", "xlsx"], key="rate_path_file_uploader")
+with col_float2:
+    floating_spread = st.number_input("Spread over Benchmark (%):", min_value=-100.0, max_value=100.0, value=0.0, step=0.1, format="%.2f", key="floating_spread_input")
+
+if st.button("Calculate Floating-Rate Schedules", key="calculate_floating_btn"):
+    if rate_path_file is None:
+        st.error("Please upload a rate curve file first.")
+    elif st.session_state.grace_period >= st.session_state.total_loan_term:
+        st.error("Grace period must be less than the total loan term.")
+    else:
+        try:
+            path_names, rate_paths = load_rate_paths(rate_path_file, st.session_state.total_loan_term * periods_per_year)
+            st.session_state.floating_rate_results = (
+                path_names,
+                calculate_floating_rate_schedules(st.session_state.principal_amount, rate_paths, st.session_state.grace_period,
+                                                  st.session_state.total_loan_term, floating_spread, periods_per_year=periods_per_year)
+            )
+        except Exception as e:
+            st.error(f"Could not calculate the floating-rate schedules: {e}")
+            st.session_state.floating_rate_results = None
+
+if st.session_state.floating_rate_results is not None:
+    path_names, floating_columns = st.session_state.floating_rate_results
+    currency_symbol = st.session_state.selected_currency_symbol
+
+    st.subheader(f"Totals per Rate Path ({len(path_names)} Paths)")
+    path_totals_df = pd.DataFrame({
+        'RATE PATH': path_names,
+        'TOTAL INTEREST': floating_columns['INTEREST'].sum(axis=1),
+        'TOTAL AMOUNT PAID': floating_columns['PAYMENT'].sum(axis=1),
+        'MAX PAYMENT': floating_columns['PAYMENT'].max(axis=1)
+    })
+    st.dataframe(path_totals_df.style.format({col: "{:,.2f}" for col in path_totals_df.columns[1:]}), use_container_width=True, hide_index=True)
+
+    selected_path = st.selectbox("Show Schedule for Rate Path:", options=path_names, key="floating_path_select")
+    path_idx = path_names.index(selected_path)
+    floating_df = pd.DataFrame({
+        col: floating_columns[col] if col == 'YEAR' else floating_columns[col][path_idx]
+        for col in SCHEDULE_COLUMNS
+    })
+    floating_df.insert(0, 'PERIOD', floating_columns['PERIOD'].astype(str))
+    for col in SCHEDULE_COLUMNS[1:]:
+        floating_df[col] = floating_df[col].apply(lambda x: format_number(x, currency_symbol=currency_symbol))
+    st.dataframe(floating_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True, hide_index=True)
+
+
+# --- Monte Carlo Prepayment and Default Simulation ---
+st.markdown("---")
+st.header("Monte Carlo Prepayment & Default Simulation") # Header English
+st.markdown("Samples prepayment and default events per period on top of the repayment schedule and reports "
+            "P5/P50/P95 bands. Paths are sharded across CPU cores with seeded, reproducible random streams.")
+
+simulation_sources = ["Current Loan"] + (["Uploaded Portfolio"] if st.session_state.portfolio_loans_df is not None else [])
+col_sim1, col_sim2, col_sim3 = st.columns(3)
+with col_sim1:
+    simulation_source = st.selectbox("Simulate:", options=simulation_sources, key="simulation_source_select")
+    simulation_paths = st.number_input("Number of Paths:", min_value=1000, max_value=1000000, value=100000, step=10000, key="simulation_paths_input")
+with col_sim2:
+    prepayment_rate = st.number_input("Annual Prepayment Rate (%):", min_value=0.0, max_value=100.0, value=5.0, step=0.5, key="prepayment_rate_input")
+    default_rate = st.number_input("Annual Default Rate (%):", min_value=0.0, max_value=100.0, value=2.0, step=0.5, key="default_rate_input")
+with col_sim3:
+    recovery_rate = st.number_input("Recovery Rate on Default (%):", min_value=0.0, max_value=100.0, value=40.0, step=5.0, key="recovery_rate_input")
+    simulation_seed = st.number_input("Random Seed:", min_value=0, value=42, step=1, key="simulation_seed_input")
+
+if st.button("Run Simulation", key="run_simulation_btn"):
+    try:
+        if simulation_source == "Uploaded Portfolio":
+            loans_df = st.session_state.portfolio_loans_df
+            simulation_columns = calculate_loan_portfolio_schedules(
+                loans_df['PRINCIPAL'].to_numpy(), loans_df['INTEREST RATE (%)'].to_numpy(),
+                loans_df['GRACE PERIOD (YEARS)'].to_numpy(), loans_df['TOTAL LOAN TERM (YEARS)'].to_numpy()
+            )
+            simulation_periods_per_year = 1
+            period_labels = simulation_columns['YEAR'].astype(str)
+        else:
+            simulation_columns, _ = calculate_loan_schedule_arrays(
+                st.session_state.principal_amount, st.session_state.interest_rate, st.session_state.grace_period,
+                st.session_state.total_loan_term, periods_per_year=periods_per_year
+            )
+            if simulation_columns is None:
+                raise ValueError("Grace period must be less than the total loan term.")
+            simulation_periods_per_year = periods_per_year
+            period_labels = simulation_columns['PERIOD'].astype(str) if periods_per_year > 1 else simulation_columns['YEAR'].astype(str)
+
+        with st.spinner("Running simulation..."):
+            simulation_bands = simulate_loan_portfolio(
+                simulation_columns['PAYMENT'], simulation_columns['INTEREST'], simulation_columns['REMAINING BALANCE'],
+                prepayment_rate, default_rate, recovery_rate,
+                n_paths=int(simulation_paths), seed=int(simulation_seed), periods_per_year=simulation_periods_per_year
+            )
+        st.session_state.simulation_results = (period_labels, simulation_bands)
+    except Exception as e:
+        st.error(f"Could not run the simulation: {e}")
+        st.session_state.simulation_results = None
+
+if st.session_state.simulation_results is not None:
+    period_labels, simulation_bands = st.session_state.simulation_results
+    currency_symbol = st.session_state.selected_currency_symbol
+
+    bands_df = pd.DataFrame({'PERIOD': period_labels})
+    for metric in SIMULATION_METRICS:
+        for pct_idx, pct in enumerate(PERCENTILES):
+            bands_df[f"{metric} P{pct}"] = simulation_bands[metric][pct_idx]
+
+    fig, axes = plt.subplots(1, len(SIMULATION_METRICS), figsize=(16, 4.5))
+    for ax, metric in zip(axes, SIMULATION_METRICS):
+        low, median, high = simulation_bands[metric]
+        ax.fill_between(range(len(period_labels)), low, high, alpha=0.3, label=f"P{PERCENTILES[0]}-P{PERCENTILES[-1]}")
+        ax.plot(range(len(period_labels)), median, marker='o', label=f"P{PERCENTILES[1]}")
+        ax.set_title(metric.title())
+        ax.set_xlabel("Period")
+        ax.set_ylabel(currency_symbol)
+        ax.legend()
+    plt.tight_layout()
+    st.pyplot(fig)
+    plt.close(fig)
+
+    st.dataframe(bands_df.style.format({col: "{:,.2f}" for col in bands_df.columns[1:]}), use_container_width=True, hide_index=True)
+
+
+# --- Loan Solver (Goal Seek) ---
+st.markdown("---")
+st.header("Loan Solver (Goal Seek)") # Header English
+st.markdown("Solves for the interest rate, the loan term or the affordable principal that produces a target annual payment "
+            "or total amount paid. The other parameters are taken from the Loan Parameters above; several targets can be "
+            "entered at once, separated by commas or new lines.")
+
+col_solve1, col_solve2 = st.columns(2)
+with col_solve1:
+    solve_for = st.selectbox("Solve For:", options=SOLVER_PARAMETERS, key="solve_for_select")
+    solver_target_type = st.selectbox("Target:", options=SOLVER_TARGETS, key="solver_target_select")
+with col_solve2:
+    solver_targets_text = st.text_area("Target Values:", value="50000000, 60000000, 75000000", key="solver_targets_input")
+
+if st.button("Solve", key="run_solver_btn"):
+    try:
+        solver_targets = np.array([float(value) for value in solver_targets_text.replace("\n", ",").split(",") if value.strip()])
+        if solver_targets.size == 0 or np.any(solver_targets <= 0):
+            raise ValueError("Enter at least one positive target value.")
+        if solve_for != 'TOTAL LOAN TERM (YEARS)' and st.session_state.grace_period >= st.session_state.total_loan_term:
+            raise ValueError("Grace period must be less than the total loan term.")
+        if solve_for == 'TOTAL LOAN TERM (YEARS)' and solver_target_type == 'TOTAL AMOUNT PAID' and st.session_state.interest_rate == 0:
+            raise ValueError("At a 0% interest rate the total amount paid equals the principal for every term.")
+        solved_values = solve_loan_parameter(
+            solve_for, solver_target_type, solver_targets,
+            st.session_state.principal_amount, st.session_state.interest_rate,
+            st.session_state.grace_period, st.session_state.total_loan_term, periods_per_year
+        )
+        st.session_state.solver_results = pd.DataFrame({solver_target_type: solver_targets, solve_for: solved_values})
+    except ValueError as e:
+        st.error(f"Could not solve: {e}")
+        st.session_state.solver_results = None
+
+if st.session_state.solver_results is not None:
+    solver_df = st.session_state.solver_results
+    target_column, solved_column = solver_df.columns
+    currency_symbol = st.session_state.selected_currency_symbol
+    unsolved_count = int(solver_df[solved_column].isna().sum())
+    if unsolved_count:
+        st.warning(f"{unsolved_count} target(s) cannot be reached with the other parameters held fixed.")
+
+    solver_display_df = pd.DataFrame({
+        target_column: solver_df[target_column].apply(lambda x: format_number(x, currency_symbol=currency_symbol)),
+        solved_column: solver_df[solved_column].apply(
+            lambda x: format_number(x, currency_symbol=currency_symbol) if solved_column == 'PRINCIPAL'
+            else ('' if pd.isna(x) else f"{x:,.4f}")
+        )
+    })
+    st.dataframe(solver_display_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True, hide_index=True)
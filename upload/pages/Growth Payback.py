@@ -8,19 +8,30 @@ if not st.session_state.get('logged_in', False):
     st.stop() # Sayfanın geri kalan kodunu çalıştırmayı durdur
 import streamlit as st
 import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
 import json
+import hashlib
 import os
 import io # In-memory file operations
-from openpyxl.utils import get_column_letter # For Excel column width
-from openpyxl.styles import Alignment, Font, Border, Side, PatternFill # For Excel alignment, font, border, fill
-from openpyxl import Workbook # For creating Excel files
-from openpyxl.worksheet.table import Table, TableStyleInfo # For Excel table
+import xlsxwriter # For streaming large Excel files
 from docx import Document # For creating Word files
 from docx.shared import Inches, Pt # For Word, Point (font size)
 from docx.enum.text import WD_ALIGN_PARAGRAPH # For Word text alignment
+from dcf_engine import (calculate_dcf_grid, calculate_payback_years, calculate_breakeven_years, solve_breakeven_growth_rates, simulate_dcf_payback,
+                        DISTRIBUTIONS, SIMULATION_METRICS, PERCENTILES) # Vectorized DCF engine and Monte Carlo simulation
+from report_jobs import ReportJobQueue # Background report builder pool shared by all sessions
 
 # --- Constants and Settings ---
-NUMBER_OF_DISCOUNT_RATES_PER_GROWTH = 3 
+MAX_POINTS_PER_AXIS = 5000 # Growth and discount rate range inputs
+MAX_RESULT_STORE_BYTES = 256 * 2**20 # Float64 (scenario, year, item) result block kept per session
+MAX_GRID_BLOCK_ELEMENTS = 4000000 # Upper bound for one (scenarios, years) block while sweeping a grid
+MAX_SUMMARY_ROWS = 1000 # Rows of the sorted scenario summary sent to the browser
+MAX_DETAILED_REPORT_SCENARIOS = 50 # Word report and per-scenario Excel sheets are only offered up to this many scenarios
+MAX_LONG_FORMAT_ROWS = 1048575 # Excel sheet row limit, minus the header row
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2)) # Report builder threads shared by all sessions
+REPORT_CACHE_MAX_FILES = int(os.getenv('REPORT_CACHE_MAX_FILES', 16)) # Finished report files kept for download
+REPORT_POLL_SECONDS = 1.0 # Progress refresh interval while a report is being built
 SAVE_FILE_NAME = "dcf_streamlit_inputs.json"
 CURRENCIES = ["TL", "USD", "EUR", "GBP"]
 CURRENCY_SYMBOLS = {
@@ -43,119 +54,144 @@ FINANCIAL_ITEMS_ORDER = [
 ]
 
 # --- Excel Report Function (Modified for DCF Data) ---
-def create_excel_report(all_scenario_results, currency_symbol):
+def create_excel_report(result_store, scenario_indices, currency_symbol, include_pivot_sheets=False, progress_callback=None):
+    """
+    Writes the selected scenarios as one long-format table on the "Projections" sheet: one row per
+    (scenario, year, financial item) with the scenario's growth and discount rate, Excel number formats
+    and an auto-filter. With include_pivot_sheets, every scenario also gets its own sheet in the
+    per-scenario layout (inputs block plus item x year table).
+    Rows are streamed with xlsxwriter in constant_memory mode and column widths are derived from the
+    value ranges instead of scanning the cells, so the export time grows linearly with the data.
+    progress_callback, when given, is called with the finished fraction after every scenario.
+    """
     try:
         output = io.BytesIO()
-        wb = Workbook()
-
-        if 'Sheet' in wb.sheetnames:
-            wb.remove(wb['Sheet'])
-
-        border_thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-
-        for scenario_idx, scenario_res in enumerate(all_scenario_results):
-            growth_r = scenario_res['growth_rate']
-            discount_r = scenario_res['discount_rate']
-            data = scenario_res['data']
-            
-            sheet_name = f"Scenario {scenario_idx+1}"
-            ws = wb.create_sheet(sheet_name, index=scenario_idx)
-
-            # Scenario Title
-            ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(data) + 1)
-            cell_title = ws.cell(row=1, column=1, value=f"Scenario {scenario_idx+1}: Growth Rate {growth_r:.0f}% / Discount Rate (WACC) {discount_r:.0f}%")
-            cell_title.font = Font(bold=True, size=14)
-            cell_title.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Input Parameters Section
-            ws.cell(row=3, column=1, value="General Inputs:").font = Font(bold=True)
-            ws.cell(row=4, column=1, value="Projection Start Year:").font = Font(bold=True)
-            ws.cell(row=4, column=2, value=scenario_res['start_year'])
-            ws.cell(row=5, column=1, value="Total Projection Years:").font = Font(bold=True)
-            ws.cell(row=5, column=2, value=scenario_res['total_simulation_years'])
-            ws.cell(row=6, column=1, value="Currency:").font = Font(bold=True)
-            ws.cell(row=6, column=2, value=scenario_res['selected_currency'])
-            if scenario_res['selected_currency'] != "TL":
-                ws.cell(row=7, column=1, value="Exchange Rate:").font = Font(bold=True)
-                ws.cell(row=7, column=2, value=f"1 {scenario_res['selected_currency']} = {scenario_res['exchange_rate']:.2f} TL")
-            
-            ws.cell(row=9, column=1, value="Financial Inputs:").font = Font(bold=True)
-            ws.cell(row=10, column=1, value="Initial Discounted Cash Flow (DCF):").font = Font(bold=True)
-            ws.cell(row=10, column=2, value=scenario_res['initial_dcf']).number_format = f'{currency_symbol} #,##0.00'
-            ws.cell(row=11, column=1, value="Initial Credit Amount:").font = Font(bold=True)
-            ws.cell(row=11, column=2, value=scenario_res['initial_credit']).number_format = f'{currency_symbol} #,##0.00'
-            ws.cell(row=12, column=1, value="Annual Loan Payment:").font = Font(bold=True)
-            ws.cell(row=12, column=2, value=scenario_res['annual_loan_payment']).number_format = f'{currency_symbol} #,##0.00'
-            ws.cell(row=13, column=1, value="Loan Term (Years):").font = Font(bold=True)
-            ws.cell(row=13, column=2, value=scenario_res['loan_term_years'])
-            ws.cell(row=14, column=1, value="Grace Period (Years):").font = Font(bold=True)
-            ws.cell(row=14, column=2, value=scenario_res['grace_period_years'])
-
-            current_row = 16 # Start of the main data table
-
-            years_list = sorted(list(data.keys()))
-            
-            # Header Row
-            ws.cell(row=current_row, column=1, value="Financial Item").font = Font(bold=True, color="FFFFFF")
-            ws.cell(row=current_row, column=1).fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            ws.cell(row=current_row, column=1).alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-            ws.cell(row=current_row, column=1).border = border_thin
-
-            for col_idx, year_val in enumerate(years_list, 2):
-                cell = ws.cell(row=current_row, column=col_idx, value=year_val)
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border_thin
-            
-            # Data Rows
-            for row_num, item_name in enumerate(FINANCIAL_ITEMS_ORDER, current_row + 1):
-                ws.cell(row=row_num, column=1, value=item_name).font = Font(bold=True)
-                ws.cell(row=row_num, column=1).alignment = Alignment(horizontal='left', vertical='center')
-                ws.cell(row=row_num, column=1).border = border_thin
-
-                for col_idx, year_val in enumerate(years_list, 2): # Start from column 2
-                    value = data[year_val].get(item_name, 0)
-                    cell = ws.cell(row=row_num, column=col_idx, value=value)
-                    cell.alignment = Alignment(horizontal='right', vertical='center')
-                    cell.border = border_thin
-
-                    # Apply number formatting
-                    if item_name in ['Discounted Cash Flow (DCF)', 'DCF Moves Next Year', 'Total Credit',
-                                    'Subtotal', 'Amount After Working Capital', 'Loan Refund Payment', 'Last Row Total']:
-                        cell.number_format = f'{currency_symbol} #,##0.00'
-                    else:
-                        cell.number_format = '#,##0.00' # Default for others
-
-            # Adjust column widths
-            for col_idx in range(1, len(years_list) + 2): # +2 for "Financial Item" column and 1-based indexing
-                max_length = 0
-                for r_idx in range(1, ws.max_row + 1):
-                    cell_value = ws.cell(row=r_idx, column=col_idx).value
-                    if cell_value is not None:
-                        # Account for currency symbols and formatting in length calculation
-                        if isinstance(cell_value, (int, float)):
-                            if ws.cell(row=r_idx, column=col_idx).number_format == f'{currency_symbol} #,##0.00':
-                                formatted_str = f"{cell_value:,.2f} {currency_symbol}"
-                            else:
-                                formatted_str = f"{cell_value:,.2f}"
-                        else:
-                            formatted_str = str(cell_value)
-                        
-                        max_length = max(max_length, len(formatted_str))
-                adjusted_width = (max_length + 2) * 1.2 # Add padding
-                ws.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
-
-        wb.save(output)
+        wb = xlsxwriter.Workbook(output, {'constant_memory': True, 'nan_inf_to_errors': True})
+
+        currency_items = ['Discounted Cash Flow (DCF)', 'DCF Moves Next Year', 'Total Credit',
+                          'Subtotal', 'Amount After Working Capital', 'Loan Refund Payment', 'Last Row Total']
+        header_format = wb.add_format({'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#4472C4', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
+        rate_format = wb.add_format({'num_format': '0.00##'})
+        currency_format = wb.add_format({'num_format': f'{currency_symbol} #,##0.00'})
+        number_format = wb.add_format({'num_format': '#,##0.00'})
+        item_formats = [currency_format if item in currency_items else number_format for item in FINANCIAL_ITEMS_ORDER]
+
+        scenario_indices = list(scenario_indices)
+        scenario_res = result_store['inputs']
+        years_list = result_store['years'].tolist()
+        growth_rates = result_store['parameters']['Growth Rate (%)'].to_numpy()
+        discount_rates = result_store['parameters']['Discount Rate (WACC) (%)'].to_numpy()
+        selected_values = result_store['values'][scenario_indices] # (scenario, year, item)
+        total_steps = max(1, len(scenario_indices) * (2 if include_pivot_sheets else 1))
+
+        # Widest formatted value, from the value range of the selection rather than from every cell
+        max_abs_value = float(np.abs(selected_values).max()) if selected_values.size else 0.0
+        value_width = len(f"{-max_abs_value:,.2f} {currency_symbol}") + 2
+        item_width = max(len(item) for item in FINANCIAL_ITEMS_ORDER) + 2
+
+        # --- Long-format sheet: one row per (scenario, year, item) ---
+        ws = wb.add_worksheet("Projections")
+        long_headers = ["Scenario No", "Growth Rate (%)", "Discount Rate (WACC) (%)", "Year", "Financial Item", "Value"]
+        ws.write_row(0, 0, long_headers, header_format)
+        ws.set_column(0, 0, 12)
+        ws.set_column(1, 1, 17)
+        ws.set_column(2, 2, 26)
+        ws.set_column(3, 3, 8)
+        ws.set_column(4, 4, item_width)
+        ws.set_column(5, 5, max(value_width, len(long_headers[5]) + 2))
+        ws.freeze_panes(1, 0)
+
+        row_num = 1
+        for step, (scenario_idx, scenario_values) in enumerate(zip(scenario_indices, selected_values.tolist()), 1):
+            growth_r = float(growth_rates[scenario_idx])
+            discount_r = float(discount_rates[scenario_idx])
+            for year_val, year_values in zip(years_list, scenario_values):
+                for item_name, value, value_format in zip(FINANCIAL_ITEMS_ORDER, year_values, item_formats):
+                    ws.write_number(row_num, 0, scenario_idx + 1)
+                    ws.write_number(row_num, 1, growth_r, rate_format)
+                    ws.write_number(row_num, 2, discount_r, rate_format)
+                    ws.write_number(row_num, 3, year_val)
+                    ws.write_string(row_num, 4, item_name)
+                    ws.write_number(row_num, 5, value, value_format)
+                    row_num += 1
+            if progress_callback:
+                progress_callback(step / total_steps)
+        ws.autofilter(0, 0, max(row_num - 1, 1), len(long_headers) - 1)
+
+        # --- Optional pivot view: the per-scenario layout, one sheet per scenario ---
+        if include_pivot_sheets:
+            title_format = wb.add_format({'bold': True, 'font_size': 14, 'align': 'center', 'valign': 'vcenter'})
+            bold_format = wb.add_format({'bold': True})
+            input_currency_format = wb.add_format({'num_format': f'{currency_symbol} #,##0.00'})
+            item_name_format = wb.add_format({'bold': True, 'border': 1, 'align': 'left', 'valign': 'vcenter'})
+            item_header_format = wb.add_format({'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#4472C4', 'border': 1,
+                                                'align': 'left', 'valign': 'vcenter', 'text_wrap': True})
+            table_formats = [wb.add_format({'num_format': value_format.num_format, 'border': 1, 'align': 'right', 'valign': 'vcenter'})
+                             for value_format in item_formats]
+
+            for step, (scenario_idx, scenario_values) in enumerate(zip(scenario_indices, selected_values), len(scenario_indices) + 1):
+                growth_r = float(growth_rates[scenario_idx])
+                discount_r = float(discount_rates[scenario_idx])
+                ws = wb.add_worksheet(f"Scenario {scenario_idx+1}")
+
+                # Scenario Title
+                ws.merge_range(0, 0, 0, len(years_list), f"Scenario {scenario_idx+1}: Growth Rate {growth_r:g}% / Discount Rate (WACC) {discount_r:g}%", title_format)
+
+                # Input Parameters Section
+                ws.write_string(2, 0, "General Inputs:", bold_format)
+                ws.write_string(3, 0, "Projection Start Year:", bold_format)
+                ws.write_number(3, 1, scenario_res['start_year'])
+                ws.write_string(4, 0, "Total Projection Years:", bold_format)
+                ws.write_number(4, 1, scenario_res['total_simulation_years'])
+                ws.write_string(5, 0, "Currency:", bold_format)
+                ws.write_string(5, 1, scenario_res['selected_currency'])
+                if scenario_res['selected_currency'] != "TL":
+                    ws.write_string(6, 0, "Exchange Rate:", bold_format)
+                    ws.write_string(6, 1, f"1 {scenario_res['selected_currency']} = {scenario_res['exchange_rate']:.2f} TL")
+
+                ws.write_string(8, 0, "Financial Inputs:", bold_format)
+                ws.write_string(9, 0, "Initial Discounted Cash Flow (DCF):", bold_format)
+                ws.write_number(9, 1, scenario_res['initial_dcf'], input_currency_format)
+                ws.write_string(10, 0, "Initial Credit Amount:", bold_format)
+                ws.write_number(10, 1, scenario_res['initial_credit'], input_currency_format)
+                ws.write_string(11, 0, "Annual Loan Payment:", bold_format)
+                ws.write_number(11, 1, scenario_res['annual_loan_payment'], input_currency_format)
+                ws.write_string(12, 0, "Loan Term (Years):", bold_format)
+                ws.write_number(12, 1, scenario_res['loan_term_years'])
+                ws.write_string(13, 0, "Grace Period (Years):", bold_format)
+                ws.write_number(13, 1, scenario_res['grace_period_years'])
+
+                current_row = 15 # Start of the main data table (0-based)
+
+                # Header Row
+                ws.write_string(current_row, 0, "Financial Item", item_header_format)
+                ws.write_row(current_row, 1, years_list, header_format)
+
+                # Data Rows
+                for item_idx, item_name in enumerate(FINANCIAL_ITEMS_ORDER):
+                    row_num = current_row + 1 + item_idx
+                    ws.write_string(row_num, 0, item_name, item_name_format)
+                    ws.write_row(row_num, 1, scenario_values[:, item_idx].tolist(), table_formats[item_idx])
+
+                # Column widths from each year's widest value, plus the labels of the first two columns
+                year_widths = [len(f"{-value:,.2f} {currency_symbol}") + 2 for value in np.abs(scenario_values).max(axis=1).tolist()]
+                input_width = len(f"{max(abs(scenario_res['initial_dcf']), abs(scenario_res['initial_credit']), abs(scenario_res['annual_loan_payment'])):,.2f} {currency_symbol}") + 3
+                ws.set_column(0, 0, max(item_width, len("Initial Discounted Cash Flow (DCF):") + 2))
+                ws.set_column(1, 1, max(year_widths[0], input_width))
+                for col_idx, width in enumerate(year_widths[1:], 2):
+                    ws.set_column(col_idx, col_idx, width)
+                if progress_callback:
+                    progress_callback(step / total_steps)
+
+        wb.close()
         output.seek(0)
         return output.getvalue()
     except Exception as e:
-        st.error(f"An error occurred while creating the Excel report: {e}")
-        st.exception(e) # Show full traceback in Streamlit debug area
-        return None # Return empty bytes on error
+        # Runs on a report worker thread, so the error is raised for the page to show instead of calling st.error here
+        raise RuntimeError(f"An error occurred while creating the Excel report: {e}") from e
 
 # --- Word Report Function (Modified for DCF Data) ---
-def create_word_report(all_scenario_results, currency_symbol):
+def create_word_report(result_store, scenario_indices, currency_symbol, progress_callback=None):
     try:
         output = io.BytesIO()
         document = Document()
@@ -164,12 +200,16 @@ def create_word_report(all_scenario_results, currency_symbol):
         document.add_paragraph(f"Report Date: {pd.to_datetime('today').strftime('%Y-%m-%d %H:%M')}")
         document.add_paragraph("\n")
 
-        for scenario_idx, scenario_res in enumerate(all_scenario_results):
-            growth_r = scenario_res['growth_rate']
-            discount_r = scenario_res['discount_rate']
-            data = scenario_res['data']
+        scenario_res = result_store['inputs']
+        years_list = result_store['years'].tolist()
+
+        scenario_indices = list(scenario_indices)
+        for step, scenario_idx in enumerate(scenario_indices, 1):
+            growth_r = result_store['parameters']['Growth Rate (%)'].iat[scenario_idx]
+            discount_r = result_store['parameters']['Discount Rate (WACC) (%)'].iat[scenario_idx]
+            data = result_store['values'][scenario_idx] # (year, item)
 
-            document.add_heading(f"Scenario {scenario_idx+1}: Growth Rate {growth_r:.0f}% / Discount Rate (WACC) {discount_r:.0f}%", level=2)
+            document.add_heading(f"Scenario {scenario_idx+1}: Growth Rate {growth_r:g}% / Discount Rate (WACC) {discount_r:g}%", level=2)
             
             # Add Input Parameters to Word
             document.add_paragraph("General Inputs:")
@@ -187,7 +227,6 @@ def create_word_report(all_scenario_results, currency_symbol):
             document.add_paragraph(f"• Grace Period (Years): {scenario_res['grace_period_years']}")
             document.add_paragraph("\n")
 
-            years_list = sorted(list(data.keys()))
             num_rows = len(FINANCIAL_ITEMS_ORDER) + 1 # Items + Header
             num_cols = len(years_list) + 1 # Years + Item column
 
@@ -216,9 +255,8 @@ def create_word_report(all_scenario_results, currency_symbol):
                 row_cells[0].paragraphs[0].runs[0].font.bold = True
                 row_cells[0].paragraphs[0].runs[0].font.size = Pt(9)
 
-                for j, year in enumerate(years_list):
+                for j, value in enumerate(data[:, i].tolist()):
                     cell = row_cells[j + 1]
-                    value = data[year].get(item_name, 0)
                     display_val = ""
                     
                     if pd.isna(value) or value == '':
@@ -235,102 +273,349 @@ def create_word_report(all_scenario_results, currency_symbol):
                     cell.paragraphs[0].runs[0].font.size = Pt(9)
             
             document.add_page_break() # New page for each scenario
+            if progress_callback:
+                progress_callback(step / len(scenario_indices))
 
         document.save(output)
         output.seek(0)
         return output.getvalue()
     except Exception as e:
-        st.error(f"An error occurred while creating the Word report: {e}")
-        st.exception(e) # Show full traceback in Streamlit debug area
-        return None # Return empty bytes on error
+        # Runs on a report worker thread, so the error is raised for the page to show instead of calling st.error here
+        raise RuntimeError(f"An error occurred while creating the Word report: {e}") from e
 
 
-# --- Calculation Logic (Murat's Confirmed Excel Formulas) ---
-def calculate_dcf_and_credit(growth_rate, discount_rate, initial_dcf,
-                             initial_credit, annual_loan_payment, loan_term_years, grace_period_years,
-                             start_year, total_simulation_years):
+# --- Calculation Logic (Murat's Confirmed Excel Formulas, engine in dcf_engine.py) ---
+def calculate_scaled_inputs(inputs):
     """
-    Performs DCF and Credit calculations based on provided parameters.
-    Returns a dictionary containing calculated data for each year.
-    All formulas are now aligned with Murat's Excel logic.
+    Returns (initial_dcf, initial_credit, annual_loan_payment) of the saved inputs converted to TL
+    when another currency with an exchange rate is selected. Calculations are done in TL base.
     """
-    results = {}
-    current_dcf_value = initial_dcf 
-    current_credit_balance = initial_credit # Credit is entered as negative (debt)
-
-    prev_dcf_moves_next_year_value = 0 # Initial value for the first year's calculation of DCF Moves Next Year
-
-    for i in range(total_simulation_years):
-        year = start_year + i
-        year_data = {}
-
-        # 1. Discounted Cash Flow (DCF) Calculation
-        if i == 0: # First year
-            current_dcf_value_this_year = initial_dcf
-        else: # Subsequent years
-            current_dcf_value_this_year = current_dcf_value * (1 + growth_rate) / (1 + discount_rate)
-        
-        year_data['Discounted Cash Flow (DCF)'] = current_dcf_value_this_year
-        current_dcf_value = current_dcf_value_this_year # Update for next iteration's DCF calculation
-
-
-        # 2. DCF Moves Next Year Calculation
-        # Formula: Previous Year's DCF Moves Next Year (or Subtotal) + Current Year's Discounted Cash Flow (DCF)
-        year_data['DCF Moves Next Year'] = prev_dcf_moves_next_year_value + year_data['Discounted Cash Flow (DCF)']
-        
-
-        # 3. Loan Refund Payment Calculation
-        loan_refund_payment_this_year = 0
-        if i >= grace_period_years and current_credit_balance < -0.01:
-            loan_refund_payment_this_year = min(annual_loan_payment, abs(current_credit_balance))
-            
-            if i >= (grace_period_years + loan_term_years):
-                if abs(current_credit_balance) <= 0.01:
-                    loan_refund_payment_this_year = 0
-                else:
-                    loan_refund_payment_this_year = abs(current_credit_balance)
-                
-        year_data['Loan Refund Payment'] = loan_refund_payment_this_year
-
-        # 4. Total Credit Calculation
-        if i == 0:
-            year_data['Total Credit'] = initial_credit
-        else:
-            current_credit_balance += year_data['Loan Refund Payment']
-            
-            if current_credit_balance > 0 and year_data['Loan Refund Payment'] > 0:
-                current_credit_balance = 0 
+    calculated_initial_dcf = inputs["initial_dcf"]
+    calculated_initial_credit = inputs["initial_credit"]
+    calculated_annual_loan_payment = inputs["annual_loan_payment"]
 
-            year_data['Total Credit'] = current_credit_balance
-            
-            if abs(year_data['Total Credit']) < 0.01 and year_data['Loan Refund Payment'] > 0:
-                year_data['Total Credit'] = 0
+    if inputs["selected_currency"] != "TL" and inputs["exchange_rate"] > 0:
+        calculated_initial_dcf *= inputs["exchange_rate"]
+        calculated_initial_credit *= inputs["exchange_rate"]
+        calculated_annual_loan_payment *= inputs["exchange_rate"]
+    return calculated_initial_dcf, calculated_initial_credit, calculated_annual_loan_payment
 
 
-        # 5. Subtotal Calculation (CONFIRMED: Subtotal = DCF Moves Next Year)
-        year_data['Subtotal'] = year_data['DCF Moves Next Year']
-        
-        prev_dcf_moves_next_year_value = year_data['DCF Moves Next Year']
+def result_store_size(num_scenarios, total_simulation_years):
+    """Size in bytes of the float64 (scenario, year, item) block of a result store."""
+    return num_scenarios * total_simulation_years * len(FINANCIAL_ITEMS_ORDER) * 8
 
 
-        # 6. Working Capital (Placeholder)
-        year_data['Working Capital'] = 0
+def mix_bits(values):
+    """SplitMix64 finalizer: scrambles uint64 values so that nearby inputs give unrelated fingerprints."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
 
-        # 7. Amount After Working Capital
-        year_data['Amount After Working Capital'] = year_data['Subtotal'] - year_data['Working Capital']
 
-        # 8. Last Row (Amount After Working Capital - Loan Refund Payment)
-        year_data['Last Row Total'] = year_data['Amount After Working Capital'] - year_data['Loan Refund Payment']
+def scenario_fingerprints(scenario_growth_rates, scenario_discount_rates, inputs):
+    """
+    64-bit fingerprint of every scenario's calculation inputs: its growth and discount rate plus the
+    shared inputs that affect the projection (TL-based amounts, loan term, grace period and years).
+    Equal fingerprints mean the scenario's results can be reused as they are.
+    """
+    shared_inputs = json.dumps([*calculate_scaled_inputs(inputs), inputs["loan_term_years"], inputs["grace_period_years"],
+                                inputs["start_year"], inputs["total_simulation_years"]])
+    shared_hash = np.uint64(int.from_bytes(hashlib.blake2b(shared_inputs.encode('utf-8'), digest_size=8).digest(), 'little'))
+    growth_bits = (np.asarray(scenario_growth_rates, dtype=float) + 0.0).view(np.uint64) # + 0.0 turns -0.0 into 0.0
+    discount_bits = (np.asarray(scenario_discount_rates, dtype=float) + 0.0).view(np.uint64)
+    return mix_bits(mix_bits(shared_hash ^ growth_bits) ^ discount_bits)
+
 
-        results[year] = year_data
+def calculate_result_store(growth_rates_percent, discount_rates_percent, inputs, previous_store=None):
+    """
+    Runs the full (growth, discount) grid and returns the columnar result store, a dictionary with:
+      'values'          float64 block shaped (scenario, year, item), items in FINANCIAL_ITEMS_ORDER order
+      'parameters'      DataFrame with the growth and discount rate (%) of every scenario
+      'years'           1-D array of projection years
+      'growth_rates', 'discount_rates'
+                        the grid axes; scenario = growth index * len(discount_rates) + discount index
+      'inputs'          the input parameters the grid was computed with
+      'fingerprints'    scenario_fingerprints of every scenario
+      'reused'          True for scenarios copied from previous_store instead of recomputed
+    plus the views added by attach_result_views.
+    Scenarios whose fingerprint is found in previous_store are copied from it; only new or changed
+    scenarios are calculated, in slices, without an intermediate copy of the whole grid.
+    """
+    growth_rates_percent = np.asarray(growth_rates_percent, dtype=float)
+    discount_rates_percent = np.asarray(discount_rates_percent, dtype=float)
+    calculated_initial_dcf, calculated_initial_credit, calculated_annual_loan_payment = calculate_scaled_inputs(inputs)
+    total_simulation_years = inputs["total_simulation_years"]
+
+    scenario_growth_rates = np.repeat(growth_rates_percent, discount_rates_percent.size)
+    scenario_discount_rates = np.tile(discount_rates_percent, growth_rates_percent.size)
+    fingerprints = scenario_fingerprints(scenario_growth_rates, scenario_discount_rates, inputs)
+    values = np.empty((fingerprints.size, total_simulation_years, len(FINANCIAL_ITEMS_ORDER)))
+
+    # Reuse scenarios with an unchanged fingerprint (same shape of years guaranteed by the fingerprint)
+    reused = np.zeros(fingerprints.size, dtype=bool)
+    if previous_store is not None and previous_store['fingerprints'].size:
+        previous_order = np.argsort(previous_store['fingerprints'])
+        sorted_fingerprints = previous_store['fingerprints'][previous_order]
+        positions = np.minimum(np.searchsorted(sorted_fingerprints, fingerprints), sorted_fingerprints.size - 1)
+        reused = sorted_fingerprints[positions] == fingerprints
+        values[reused] = previous_store['values'][previous_order[positions[reused]]]
+
+    to_compute = np.flatnonzero(~reused)
+    scenarios_per_block = max(1, MAX_GRID_BLOCK_ELEMENTS // max(1, total_simulation_years))
+    for start in range(0, to_compute.size, scenarios_per_block):
+        block = to_compute[start:start + scenarios_per_block]
+        grid = calculate_dcf_grid(
+            growth_rates=scenario_growth_rates[block] / 100.0,       # Convert to decimal
+            discount_rates=scenario_discount_rates[block] / 100.0,   # Convert to decimal
+            initial_dcf=calculated_initial_dcf,
+            initial_credit=calculated_initial_credit,
+            annual_loan_payment=calculated_annual_loan_payment,
+            loan_term_years=inputs["loan_term_years"],
+            grace_period_years=inputs["grace_period_years"],
+            start_year=inputs["start_year"],
+            total_simulation_years=total_simulation_years
+        )
+        for item_idx, item in enumerate(FINANCIAL_ITEMS_ORDER):
+            values[block, :, item_idx] = grid[item]
+
+    return attach_result_views({
+        'values': values,
+        'parameters': pd.DataFrame({
+            'Growth Rate (%)': scenario_growth_rates,
+            'Discount Rate (WACC) (%)': scenario_discount_rates
+        }),
+        'years': inputs["start_year"] + np.arange(total_simulation_years),
+        'growth_rates': growth_rates_percent,
+        'discount_rates': discount_rates_percent,
+        'inputs': inputs,
+        'fingerprints': fingerprints,
+        'reused': reused
+    })
+
+
+def store_item(result_store, item):
+    """(scenario, year) view of one financial item of the result store."""
+    return result_store['values'][:, :, FINANCIAL_ITEMS_ORDER.index(item)]
+
+
+def store_grid(result_store, scenario_values):
+    """Reshapes one value per scenario into the (growth, discount) grid of the result store."""
+    return np.asarray(scenario_values).reshape(result_store['growth_rates'].size, result_store['discount_rates'].size)
+
+
+def store_payback_years(result_store):
+    """Payback year of every scenario of the result store (see calculate_payback_years)."""
+    calculated_initial_credit = calculate_scaled_inputs(result_store['inputs'])[1]
+    return calculate_payback_years(store_item(result_store, 'DCF Moves Next Year'), calculated_initial_credit,
+                                   result_store['inputs']["start_year"])
+
+
+def store_summary(result_store):
+    """
+    Summary table with one row per scenario of the result store: growth and discount rate, final-year
+    'Last Row Total', payback year, breakeven year and interpolated fractional breakeven year.
+    """
+    breakeven_years, fractional_breakeven_years = calculate_breakeven_years(store_item(result_store, 'Last Row Total'),
+                                                                            result_store['inputs']["start_year"])
+    summary_df = result_store['parameters'].copy()
+    summary_df.insert(0, 'Scenario No', np.arange(1, len(summary_df) + 1))
+    summary_df['Last Year Last Row Total'] = store_item(result_store, 'Last Row Total')[:, -1]
+    summary_df['Payback Year'] = store_payback_years(result_store)
+    summary_df['Breakeven Year'] = breakeven_years
+    summary_df['Fractional Breakeven Year'] = fractional_breakeven_years
+    return summary_df
+
+
+def store_frontier(result_store):
+    """Breakeven growth rate (%) for every discount rate of the result store (see solve_breakeven_growth_rates)."""
+    calculated_initial_dcf, calculated_initial_credit, calculated_annual_loan_payment = calculate_scaled_inputs(result_store['inputs'])
+    return solve_breakeven_growth_rates(
+        result_store['discount_rates'] / 100.0, calculated_initial_dcf, calculated_initial_credit, calculated_annual_loan_payment,
+        result_store['inputs']["loan_term_years"], result_store['inputs']["grace_period_years"], result_store['inputs']["start_year"],
+        result_store['inputs']["total_simulation_years"]
+    ) * 100.0
+
+
+def attach_result_views(result_store):
+    """
+    Adds the views the page displays and exports to a result store, once per calculation, so a rerun
+    only slices them:
+      'frame'           DataFrame indexed by 'Scenario No' with (Year, Financial Item) columns; it shares
+                        memory with 'values', so frame.loc[n].unstack('Year') is scenario n's item x year table
+      'summary'         store_summary table
+      'summary_orders'  row orders of the summary per (sort column, ascending), filled as they are requested
+      'frontier'        store_frontier breakeven growth rates
+      'charts'          PNG images of the result charts, drawn on first display
+    Returns the result store.
+    """
+    num_scenarios, total_simulation_years, _ = result_store['values'].shape
+    result_store['frame'] = pd.DataFrame(
+        result_store['values'].reshape(num_scenarios, total_simulation_years * len(FINANCIAL_ITEMS_ORDER)),
+        index=pd.RangeIndex(1, num_scenarios + 1, name='Scenario No'),
+        columns=pd.MultiIndex.from_product([result_store['years'].tolist(), FINANCIAL_ITEMS_ORDER], names=['Year', 'Financial Item']),
+        copy=False
+    )
+    result_store['summary'] = store_summary(result_store)
+    result_store['summary_orders'] = {}
+    result_store['frontier'] = store_frontier(result_store)
+    result_store['charts'] = {}
+    return result_store
+
+
+def figure_png(fig):
+    """Renders a matplotlib figure to PNG bytes (as st.pyplot does) and closes it."""
+    output = io.BytesIO()
+    fig.savefig(output, format='png', bbox_inches='tight', dpi=200)
+    plt.close(fig)
+    return output.getvalue()
+
+
+def store_summary_order(result_store, sort_column, ascending):
+    """Row positions of the result store's summary sorted by sort_column (NaN last), cached per sort."""
+    key = (sort_column, ascending)
+    if key not in result_store['summary_orders']:
+        sorted_summary = result_store['summary'][sort_column].reset_index(drop=True).sort_values(ascending=ascending, na_position='last', kind='stable')
+        result_store['summary_orders'][key] = sorted_summary.index.to_numpy()
+    return result_store['summary_orders'][key]
+
+
+def save_result_store(result_store):
+    """Serializes the result store to .npz bytes (arrays as stored, the inputs as a JSON string)."""
+    output = io.BytesIO()
+    np.savez_compressed(
+        output,
+        values=result_store['values'],
+        scenario_growth_rates=result_store['parameters']['Growth Rate (%)'].to_numpy(),
+        scenario_discount_rates=result_store['parameters']['Discount Rate (WACC) (%)'].to_numpy(),
+        years=result_store['years'],
+        growth_rates=result_store['growth_rates'],
+        discount_rates=result_store['discount_rates'],
+        items=np.array(FINANCIAL_ITEMS_ORDER),
+        inputs=np.array(json.dumps(result_store['inputs']))
+    )
+    output.seek(0)
+    return output.getvalue()
+
+
+def load_result_store(uploaded_file):
+    """Reads a result store written by save_result_store. Raises ValueError if the items do not match this version."""
+    with np.load(uploaded_file, allow_pickle=False) as npz:
+        if npz['items'].tolist() != FINANCIAL_ITEMS_ORDER:
+            raise ValueError("The file was saved with different financial items.")
+        inputs = json.loads(str(npz['inputs']))
+        return attach_result_views({
+            'values': npz['values'],
+            'parameters': pd.DataFrame({
+                'Growth Rate (%)': npz['scenario_growth_rates'],
+                'Discount Rate (WACC) (%)': npz['scenario_discount_rates']
+            }),
+            'years': npz['years'],
+            'growth_rates': npz['growth_rates'],
+            'discount_rates': npz['discount_rates'],
+            'inputs': inputs,
+            'fingerprints': scenario_fingerprints(npz['scenario_growth_rates'], npz['scenario_discount_rates'], inputs),
+            'reused': np.zeros(npz['values'].shape[0], dtype=bool)
+        })
+
+
+def build_rate_range(start, stop, step):
+    """
+    Returns the rates start, start + step, ... up to and including stop (within rounding) as a 1-D array.
+    Raises ValueError for a non-positive step, a stop below start or more than MAX_POINTS_PER_AXIS points.
+    """
+    if step <= 0:
+        raise ValueError("Step must be greater than zero.")
+    if stop < start:
+        raise ValueError("Stop must not be below start.")
+    num_points = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if num_points > MAX_POINTS_PER_AXIS:
+        raise ValueError(f"A range can have at most {MAX_POINTS_PER_AXIS} points ({num_points} requested).")
+    return np.round(start + step * np.arange(num_points), 10)
+
+
+def create_grid_summary_excel_report(result_store, currency_symbol):
+    """
+    Writes the final 'Last Row Total' and payback year matrices (growth rows x discount columns) to two sheets.
+    Rows are streamed with xlsxwriter in constant_memory mode, so large grids do not build a workbook in memory.
+    """
+    output = io.BytesIO()
+    wb = xlsxwriter.Workbook(output, {'constant_memory': True, 'nan_inf_to_errors': True})
+    header_format = wb.add_format({'bold': True, 'align': 'center'})
+    sheet_specs = [
+        (f"Last Row Total ({currency_symbol})", store_grid(result_store, store_item(result_store, 'Last Row Total')[:, -1]),
+         wb.add_format({'num_format': f'{currency_symbol} #,##0.00'})),
+        ("Payback Year", store_grid(result_store, result_store['summary']['Payback Year'].to_numpy()), wb.add_format({'num_format': '0'}))
+    ]
+    for sheet_name, values, value_format in sheet_specs:
+        ws = wb.add_worksheet(sheet_name[:31])
+        ws.write_string(0, 0, "Growth Rate (%) \\ WACC (%)", header_format)
+        ws.write_row(0, 1, result_store['discount_rates'].tolist(), header_format)
+        for row_idx, (growth_rate_val, row_values) in enumerate(zip(result_store['growth_rates'].tolist(), values.tolist()), 1):
+            ws.write_number(row_idx, 0, growth_rate_val, header_format)
+            ws.write_row(row_idx, 1, [None if np.isnan(v) else v for v in row_values], value_format)
+        ws.set_column(0, 0, 26)
+        ws.set_column(1, len(result_store['discount_rates']), 18)
+    wb.close()
+    output.seek(0)
+    return output.getvalue()
+
+
+# --- Background Report Jobs ---
+@st.cache_resource
+def get_report_job_queue(max_workers=REPORT_WORKERS, max_results=REPORT_CACHE_MAX_FILES):
+    """Returns the ReportJobQueue shared by every session and rerun of the app."""
+    return ReportJobQueue(max_workers=max_workers, max_results=max_results)
+
+
+def report_fingerprint(result_store, scenario_indices, report_name, **options):
+    """
+    Fingerprint of a report's inputs: report name and options, the saved inputs, and the numbers and
+    scenario_fingerprints of the included scenarios. Equal fingerprints give the same file.
+    """
+    scenario_indices = np.asarray(list(scenario_indices), dtype=np.int64)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([report_name, options, result_store['inputs']], sort_keys=True, default=str).encode('utf-8'))
+    digest.update(scenario_indices.tobytes())
+    digest.update(result_store['fingerprints'][scenario_indices].tobytes())
+    return digest.hexdigest()
+
+
+def show_report_job(fingerprint, label, file_name, mime, key, polling=False):
+    """
+    Shows the state of the report job with this fingerprint: a progress bar while it is queued or running,
+    the download button once the file is ready, or the error if it failed. With polling (inside a fragment
+    that reruns every REPORT_POLL_SECONDS), the whole page is rerun once the job has finished.
+    """
+    job = get_report_job_queue().get(fingerprint)
+    if job is None:
+        return
+    if polling and job['status'] not in ('queued', 'running'):
+        st.rerun() # Stops the polling fragment and shows the finished job
+    if job['status'] == 'queued':
+        st.progress(0.0, text=f"{label}: waiting for a free report worker...")
+    elif job['status'] == 'running':
+        st.progress(job['progress'], text=f"{label}: {job['progress']:.0%} built")
+    elif job['status'] == 'done':
+        st.download_button(label=f"Download {label}", data=job['result'], file_name=file_name, mime=mime, key=key)
+    else:
+        st.error(str(job['error']))
+        st.exception(job['error']) # Show full traceback in Streamlit debug area
 
-    return results
 
 # --- Session State Initialization ---
 if 'show_results' not in st.session_state:
     st.session_state.show_results = False
-if 'all_scenario_results' not in st.session_state:
-    st.session_state.all_scenario_results = []
+if 'result_store' not in st.session_state:
+    st.session_state.result_store = None
+if 'result_store_npz' not in st.session_state:
+    st.session_state.result_store_npz = None
+if 'dcf_simulation_results' not in st.session_state:
+    st.session_state.dcf_simulation_results = None
+if 'grid_summary_excel' not in st.session_state:
+    st.session_state.grid_summary_excel = None
 if 'last_inputs' not in st.session_state:
     st.session_state.last_inputs = {}
 
@@ -344,6 +629,19 @@ def load_default_inputs():
             st.warning(f"Could not load default inputs: {e}")
     return {}
 
+# --- Distribution Inputs (Monte Carlo simulation) ---
+def distribution_inputs(label, key_prefix, default_params, default_distribution="Normal"):
+    """
+    Renders a distribution selector and its parameter inputs; returns the (distribution, params) spec.
+    default_params maps every distribution of DISTRIBUTIONS to its default parameter values.
+    """
+    distribution = st.selectbox(f"{label} Distribution:", list(DISTRIBUTIONS.keys()),
+                                index=list(DISTRIBUTIONS.keys()).index(default_distribution), key=f"{key_prefix}_distribution_select")
+    params = []
+    for param_name, default_value in zip(DISTRIBUTIONS[distribution], default_params[distribution]):
+        params.append(st.number_input(f"{label} {param_name}:", value=float(default_value), key=f"{key_prefix}_{distribution}_{param_name}_input"))
+    return distribution, tuple(params)
+
 # --- Save Inputs ---
 def save_inputs(inputs):
     try:
@@ -450,85 +748,30 @@ with col_params3:
 
 st.markdown("---")
 st.header("Scenario Definitions")
-
-num_growth_groups = st.number_input("How many different growth rate scenarios?", min_value=1, value=int(default_inputs.get("num_growth_groups", 3)), step=1)
-growth_rates_main = []
-# Ensure initial load of main_growth_rates_values
-if "main_growth_rates_values" not in st.session_state or len(st.session_state.main_growth_rates_values) != num_growth_groups:
-    st.session_state.main_growth_rates_values = default_inputs.get("main_growth_rates_values", [15.0, 20.0, 25.0])
-    if len(st.session_state.main_growth_rates_values) < num_growth_groups:
-        st.session_state.main_growth_rates_values.extend([15.0] * (num_growth_groups - len(st.session_state.main_growth_rates_values)))
-    elif len(st.session_state.main_growth_rates_values) > num_growth_groups:
-        st.session_state.main_growth_rates_values = st.session_state.main_growth_rates_values[:num_growth_groups]
-
-
-for i in range(num_growth_groups):
-    growth_rates_main.append(
-        st.number_input(
-            f"Growth Rate Scenario Group {i+1} (%):",
-            min_value=-100.0,
-            max_value=1000.0,
-            value=st.session_state.main_growth_rates_values[i],
-            step=1.0,
-            format="%.0f",
-            key=f"growth_rate_main_{i}"
-        )
-    )
-    st.session_state.main_growth_rates_values[i] = growth_rates_main[i] # Update session state
-
-st.markdown("---")
-st.subheader("Discount Rates (WACC) for Each Growth Rate")
-
-# Initialize discount_rates_per_growth if not in session state or if growth rates changed
-if "discount_rates_per_growth" not in st.session_state:
-    st.session_state.discount_rates_per_growth = default_inputs.get("discount_rates_per_growth", {})
-
-# Clean up stale entries and add new ones based on current growth_rates_main
-current_growth_rate_keys = {str(gr) for gr in growth_rates_main}
-stale_keys = [k for k in st.session_state.discount_rates_per_growth if k not in current_growth_rate_keys]
-for key in stale_keys:
-    del st.session_state.discount_rates_per_growth[key]
-
-for i, growth_rate_val in enumerate(growth_rates_main):
-    growth_rate_str = str(growth_rate_val)
-    if growth_rate_str not in st.session_state.discount_rates_per_growth:
-        st.session_state.discount_rates_per_growth[growth_rate_str] = [3.0, 7.0, 12.0][:NUMBER_OF_DISCOUNT_RATES_PER_GROWTH] # Default initial WACCs
-
-    st.write(f"**Discount Rates (WACC) for Growth Rate: {growth_rate_val:.0f}%:**")
-    
-    num_waccs_for_this_growth = st.number_input(
-        f"How many WACC values for Growth {growth_rate_val:.0f}%?",
-        min_value=1,
-        max_value=5, # Limit for reasonable input
-        value=len(st.session_state.discount_rates_per_growth[growth_rate_str]),
-        step=1,
-        key=f"num_waccs_{i}"
-    )
-    
-    current_wacc_list = st.session_state.discount_rates_per_growth[growth_rate_str]
-    if len(current_wacc_list) < num_waccs_for_this_growth:
-        current_wacc_list.extend([7.0] * (num_waccs_for_this_growth - len(current_wacc_list)))
-    elif len(current_wacc_list) > num_waccs_for_this_growth:
-        current_wacc_list = current_wacc_list[:num_waccs_for_this_growth]
-    st.session_state.discount_rates_per_growth[growth_rate_str] = current_wacc_list
-
-
-    cols = st.columns(num_waccs_for_this_growth)
-    temp_wacc_inputs = []
-    for j in range(num_waccs_for_this_growth):
-        with cols[j]:
-            wacc_val = st.number_input(
-                f"WACC {j+1} (%):",
-                min_value=0.0,
-                max_value=100.0,
-                value=st.session_state.discount_rates_per_growth[growth_rate_str][j],
-                step=0.1,
-                format="%.0f",
-                key=f"wacc_input_growth_{i}_wacc_{j}"
-            )
-            temp_wacc_inputs.append(wacc_val)
-    
-    st.session_state.discount_rates_per_growth[growth_rate_str] = temp_wacc_inputs # Update for this growth rate
+st.markdown("Every growth rate of the first range is combined with every discount rate (WACC) of the second range.")
+
+col_growth_range, col_discount_range = st.columns(2)
+
+with col_growth_range:
+    st.subheader("Growth Rate Range (%)")
+    growth_rate_start = st.number_input("Start:", min_value=-100.0, max_value=1000.0, value=float(default_inputs.get("growth_rate_start", 6.0)), step=1.0, key="growth_rate_start_input")
+    growth_rate_stop = st.number_input("Stop:", min_value=-100.0, max_value=1000.0, value=float(default_inputs.get("growth_rate_stop", 12.0)), step=1.0, key="growth_rate_stop_input")
+    growth_rate_step = st.number_input("Step:", min_value=0.001, max_value=1000.0, value=float(default_inputs.get("growth_rate_step", 3.0)), step=0.1, format="%.3f", key="growth_rate_step_input")
+
+with col_discount_range:
+    st.subheader("Discount Rate (WACC) Range (%)")
+    discount_rate_start = st.number_input("Start:", min_value=0.0, max_value=100.0, value=float(default_inputs.get("discount_rate_start", 3.0)), step=1.0, key="discount_rate_start_input")
+    discount_rate_stop = st.number_input("Stop:", min_value=0.0, max_value=100.0, value=float(default_inputs.get("discount_rate_stop", 12.0)), step=1.0, key="discount_rate_stop_input")
+    discount_rate_step = st.number_input("Step:", min_value=0.001, max_value=100.0, value=float(default_inputs.get("discount_rate_step", 1.0)), step=0.1, format="%.3f", key="discount_rate_step_input")
+
+try:
+    growth_rates_grid = build_rate_range(growth_rate_start, growth_rate_stop, growth_rate_step)
+    discount_rates_grid = build_rate_range(discount_rate_start, discount_rate_stop, discount_rate_step)
+    range_error = None
+    st.caption(f"{growth_rates_grid.size} growth rates × {discount_rates_grid.size} discount rates = {growth_rates_grid.size * discount_rates_grid.size:,} scenarios")
+except ValueError as e:
+    range_error = str(e)
+    st.error(range_error)
 
 st.markdown("---")
 
@@ -548,152 +791,362 @@ with col_calc:
             "annual_loan_payment": annual_loan_payment,
             "loan_term_years": loan_term_years,
             "grace_period_years": grace_period_years,
-            "num_growth_groups": num_growth_groups,
-            "main_growth_rates_values": st.session_state.main_growth_rates_values,
-            "discount_rates_per_growth": st.session_state.discount_rates_per_growth # Save the dictionary
+            "growth_rate_start": growth_rate_start,
+            "growth_rate_stop": growth_rate_stop,
+            "growth_rate_step": growth_rate_step,
+            "discount_rate_start": discount_rate_start,
+            "discount_rate_stop": discount_rate_stop,
+            "discount_rate_step": discount_rate_step
         }
         save_inputs(current_inputs_to_save)
 
-        st.session_state.all_scenario_results = []
-        
-        # Iterate through each growth rate group
-        for growth_rate_val in growth_rates_main:
-            wacc_list_for_this_growth = st.session_state.discount_rates_per_growth.get(str(growth_rate_val), [])
-            
-            for discount_rate_val in wacc_list_for_this_growth:
-                # Adjust initial_dcf and initial_credit based on exchange rate for calculation
-                # Calculations are done in TL base if exchange rate is applied
-                calculated_initial_dcf = initial_dcf
-                calculated_initial_credit = initial_credit
-                calculated_annual_loan_payment = annual_loan_payment
-
-                if selected_currency != "TL" and exchange_rate > 0:
-                    calculated_initial_dcf *= exchange_rate
-                    calculated_initial_credit *= exchange_rate
-                    calculated_annual_loan_payment *= exchange_rate
-
-                scenario_data = calculate_dcf_and_credit(
-                    growth_rate=growth_rate_val / 100.0,       # Convert to decimal
-                    discount_rate=discount_rate_val / 100.0,   # Convert to decimal
-                    initial_dcf=calculated_initial_dcf,
-                    initial_credit=calculated_initial_credit,
-                    annual_loan_payment=calculated_annual_loan_payment,
-                    loan_term_years=loan_term_years,
-                    grace_period_years=grace_period_years,
-                    start_year=start_year,
-                    total_simulation_years=total_simulation_years
-                )
-                
-                st.session_state.all_scenario_results.append({
-                    "growth_rate": growth_rate_val,
-                    "discount_rate": discount_rate_val,
-                    "data": scenario_data,
-                    "initial_dcf": initial_dcf, # Keep original input for display/export
-                    "initial_credit": initial_credit, # Keep original input for display/export
-                    "annual_loan_payment": annual_loan_payment, # Keep original input for display/export
-                    "loan_term_years": loan_term_years,
-                    "grace_period_years": grace_period_years,
-                    "start_year": start_year,
-                    "total_simulation_years": total_simulation_years,
-                    "selected_currency": selected_currency,
-                    "exchange_rate": exchange_rate
-                })
-        
-        st.session_state.show_results = True
+        if range_error:
+            pass # Already reported under the range inputs
+        elif result_store_size(growth_rates_grid.size * discount_rates_grid.size, total_simulation_years) > MAX_RESULT_STORE_BYTES:
+            st.error(f"The results of {growth_rates_grid.size * discount_rates_grid.size:,} scenarios over {total_simulation_years} years "
+                     f"would exceed {MAX_RESULT_STORE_BYTES // 2**20} MB. Please use fewer points, larger steps or fewer years.")
+        else:
+            with st.spinner("Calculating scenarios..."):
+                st.session_state.result_store = calculate_result_store(growth_rates_grid, discount_rates_grid, current_inputs_to_save,
+                                                                       previous_store=st.session_state.result_store)
+            st.session_state.grid_summary_excel = None
+            st.session_state.result_store_npz = None
+            st.session_state.show_results = True
 
 with col_clear:
     if st.button("Clear Results", key="clear_btn"):
         st.session_state.show_results = False
-        st.session_state.all_scenario_results = []
+        st.session_state.result_store = None
+        st.session_state.grid_summary_excel = None
+        st.session_state.result_store_npz = None
         st.rerun()
 
+# --- Load Saved Results ---
+with st.expander("Load Saved Results (.npz)"):
+    saved_results_file = st.file_uploader("Results file saved from this page:", type=["npz"], key="result_store_uploader")
+    if saved_results_file is not None and st.button("Load Results", key="load_results_btn"):
+        try:
+            st.session_state.result_store = load_result_store(saved_results_file)
+            st.session_state.grid_summary_excel = None
+            st.session_state.result_store_npz = None
+            st.session_state.show_results = True
+        except Exception as e:
+            st.error(f"Could not load the results file: {e}")
+
 # --- Display Results (controlled by session_state) ---
-if st.session_state.show_results:
+if st.session_state.show_results and st.session_state.result_store is not None:
     st.header("Projection Results")
-    currency_symbol = CURRENCY_SYMBOLS.get(selected_currency, '')
-
-    for i, scenario_res in enumerate(st.session_state.all_scenario_results):
-        growth_r = scenario_res['growth_rate']
-        discount_r = scenario_res['discount_rate']
-        data = scenario_res['data']
-        
-        st.subheader(f"Scenario {i+1}: Growth Rate {growth_r:.0f}% / Discount Rate (WACC) {discount_r:.0f}%")
-
-        # Prepare data for display in DataFrame
-        years = sorted(list(data.keys()))
-        
-        display_data_dict = {}
-        for item in FINANCIAL_ITEMS_ORDER:
-            row_values = []
-            for year in years:
-                value = data[year].get(item, 0)
-                # Apply currency formatting and symbol for relevant fields
-                if item in ['Discounted Cash Flow (DCF)', 'DCF Moves Next Year', 'Total Credit',
-                            'Subtotal', 'Amount After Working Capital', 'Loan Refund Payment', 'Last Row Total']:
-                    row_values.append(f"{value:,.2f} {currency_symbol}")
-                else:
-                    row_values.append(f"{value:,.2f}") # For Working Capital (if not 0), or other numeric
-            display_data_dict[item] = row_values
-
-        pivoted_df = pd.DataFrame(display_data_dict).T
-        pivoted_df.columns = [str(year) for year in years]
-        pivoted_df.index.name = 'Financial Item'
-        
-        st.dataframe(pivoted_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True)
-        st.markdown("---")
-
-    st.subheader("Total Values for All Scenarios")
-    summary_data = []
-    for scenario_idx, scenario_res in enumerate(st.session_state.all_scenario_results):
-        growth_r = scenario_res['growth_rate']
-        discount_r = scenario_res['discount_rate']
-        data = scenario_res['data']
-        
-        last_year = max(data.keys())
-        last_row_total = data[last_year]['Last Row Total']
-        
-        summary_data.append({
-            "Scenario No": f"Scenario {scenario_idx+1}",
-            "Growth Rate (%)": f"{growth_r:.0f}%",
-            "Discount Rate (WACC) (%)": f"{discount_r:.0f}%",
-            f"Last Year ({last_year}) Total ({currency_symbol})": f"{last_row_total:,.2f}"
+    result_store = st.session_state.result_store
+    grid_inputs = result_store['inputs']
+    currency_symbol = CURRENCY_SYMBOLS.get(grid_inputs['selected_currency'], '')
+    last_year = int(result_store['years'][-1])
+    num_scenarios = result_store['values'].shape[0]
+    summary_df = result_store['summary'] # Built once per calculation, see attach_result_views
+    payback_years_grid = store_grid(result_store, summary_df['Payback Year'].to_numpy())
+
+    never_paid_back = int(np.isnan(payback_years_grid).sum())
+    st.write(f"**Scenarios:** {num_scenarios:,} — **Loan not covered within the projection:** {never_paid_back:,} scenario(s)")
+
+    # Scenarios reused from the previous calculation (unchanged input fingerprint)
+    reused_count = int(result_store['reused'].sum())
+    if reused_count:
+        st.caption(f"{reused_count:,} of {num_scenarios:,} scenarios were reused from the previous calculation; "
+                   f"{num_scenarios - reused_count:,} new or changed scenario(s) were recalculated.")
+        with st.expander("Reused Scenarios"):
+            reuse_df = summary_df.iloc[:MAX_SUMMARY_ROWS, :3].copy()
+            reuse_df['Status'] = np.where(result_store['reused'][:MAX_SUMMARY_ROWS], "Reused", "Recalculated")
+            if num_scenarios > MAX_SUMMARY_ROWS:
+                st.caption(f"Showing the first {MAX_SUMMARY_ROWS:,} of {num_scenarios:,} scenarios.")
+            st.dataframe(reuse_df, use_container_width=True, hide_index=True)
+
+    # Heatmaps: growth rates on the vertical axis, discount rates on the horizontal axis
+    growth_axis = result_store['growth_rates']
+    discount_axis = result_store['discount_rates']
+    if 'heatmaps' not in result_store['charts']: # Drawn once per calculation, reruns reuse the image
+        fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+        heatmap_specs = [
+            (store_grid(result_store, summary_df['Last Year Last Row Total'].to_numpy()), f"Last Year ({last_year}) Last Row Total ({currency_symbol})", 'RdYlGn'),
+            (payback_years_grid, "Payback Year (cumulative DCF covers the credit)", 'viridis_r')
+        ]
+        for ax, (values, title, cmap) in zip(axes, heatmap_specs):
+            image = ax.imshow(np.ma.masked_invalid(values), aspect='auto', origin='lower', cmap=cmap, interpolation='nearest')
+            fig.colorbar(image, ax=ax)
+            ax.set_title(title)
+            ax.set_xlabel("Discount Rate (WACC) (%)")
+            ax.set_ylabel("Growth Rate (%)")
+            x_ticks = np.unique(np.linspace(0, discount_axis.size - 1, min(discount_axis.size, 10)).astype(int))
+            y_ticks = np.unique(np.linspace(0, growth_axis.size - 1, min(growth_axis.size, 10)).astype(int))
+            ax.set_xticks(x_ticks, [f"{discount_axis[k]:g}" for k in x_ticks])
+            ax.set_yticks(y_ticks, [f"{growth_axis[k]:g}" for k in y_ticks])
+        plt.tight_layout()
+        result_store['charts']['heatmaps'] = figure_png(fig)
+    st.image(result_store['charts']['heatmaps'], use_container_width=True)
+
+    # --- Scenario summary, sorted on the server so only the top rows are rendered ---
+    st.subheader("Scenario Summary")
+    col_sort1, col_sort2 = st.columns(2)
+    with col_sort1:
+        summary_sort_column = st.selectbox("Sort By:", list(summary_df.columns), index=list(summary_df.columns).index('Fractional Breakeven Year'), key="summary_sort_select")
+    with col_sort2:
+        summary_sort_ascending = st.radio("Order:", ["Ascending", "Descending"], horizontal=True, key="summary_order_radio") == "Ascending"
+    summary_pages = max(1, -(-num_scenarios // MAX_SUMMARY_ROWS))
+    if summary_pages > 1:
+        summary_page = st.number_input(f"Page (of {summary_pages:,}):", min_value=1, max_value=summary_pages, value=1, step=1, key="summary_page_input")
+        st.caption(f"Showing scenarios {(summary_page - 1) * MAX_SUMMARY_ROWS + 1:,}-{min(summary_page * MAX_SUMMARY_ROWS, num_scenarios):,} "
+                   f"of {num_scenarios:,} in this order.")
+    else:
+        summary_page = 1
+    summary_order = store_summary_order(result_store, summary_sort_column, summary_sort_ascending)
+    st.dataframe(
+        summary_df.iloc[summary_order[(summary_page - 1) * MAX_SUMMARY_ROWS:summary_page * MAX_SUMMARY_ROWS]],
+        column_config={
+            'Growth Rate (%)': st.column_config.NumberColumn(format="%g%%"),
+            'Discount Rate (WACC) (%)': st.column_config.NumberColumn(format="%g%%"),
+            'Last Year Last Row Total': st.column_config.NumberColumn(f"Last Year ({last_year}) Last Row Total ({currency_symbol})", format="localized"),
+            'Payback Year': st.column_config.NumberColumn(format="%d"),
+            'Breakeven Year': st.column_config.NumberColumn(format="%d"),
+            'Fractional Breakeven Year': st.column_config.NumberColumn(format="%.2f")
+        },
+        use_container_width=True,
+        hide_index=True
+    )
+
+    # --- Breakeven growth frontier: minimum growth rate that pays the loan back, per discount rate ---
+    st.subheader("Breakeven Growth Frontier")
+    frontier_growth_rates = result_store['frontier']
+    st.markdown(f"Minimum growth rate at which the cumulative DCF covers the credit by {last_year}, for every discount rate (WACC) "
+                f"of the range. Growth rates on or above the curve pay the loan back within the projection.")
+
+    if 'frontier' not in result_store['charts']:
+        fig, ax = plt.subplots(figsize=(12, 5))
+        ax.plot(discount_axis, frontier_growth_rates, marker='o' if discount_axis.size <= 50 else None, label="Breakeven growth rate")
+        ax.fill_between(discount_axis, frontier_growth_rates, np.nanmax(np.append(frontier_growth_rates, growth_axis)),
+                        alpha=0.15, label="Loan covered")
+        ax.axhspan(growth_axis.min(), growth_axis.max(), color='grey', alpha=0.1, label="Calculated growth range")
+        ax.set_xlabel("Discount Rate (WACC) (%)")
+        ax.set_ylabel("Growth Rate (%)")
+        ax.set_title(f"Breakeven Growth Rate by Discount Rate (payback by {last_year})")
+        ax.legend()
+        plt.tight_layout()
+        result_store['charts']['frontier'] = figure_png(fig)
+    st.image(result_store['charts']['frontier'], use_container_width=True)
+
+    never_solvable = int(np.isnan(frontier_growth_rates).sum())
+    if never_solvable:
+        st.caption(f"For {never_solvable:,} discount rate(s) even a 1000% growth rate does not cover the credit.")
+    with st.expander("Breakeven Growth Rates"):
+        frontier_df = pd.DataFrame({
+            'Discount Rate (WACC) (%)': discount_axis,
+            'Breakeven Growth Rate (%)': frontier_growth_rates
         })
-    
-    if summary_data:
-        summary_df = pd.DataFrame(summary_data)
-        st.dataframe(summary_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True)
+        st.dataframe(
+            frontier_df,
+            column_config={
+                'Discount Rate (WACC) (%)': st.column_config.NumberColumn(format="%g%%"),
+                'Breakeven Growth Rate (%)': st.column_config.NumberColumn(format="%.4f%%")
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # --- Single scenario detail ---
+    st.subheader("Scenario Detail")
+    col_detail1, col_detail2 = st.columns(2)
+    with col_detail1:
+        detail_growth_rate = st.select_slider("Growth Rate (%):", options=growth_axis.tolist(), key="detail_growth_select")
+    with col_detail2:
+        detail_discount_rate = st.select_slider("Discount Rate (WACC) (%):", options=discount_axis.tolist(), key="detail_discount_select")
+
+    detail_scenario_idx = growth_axis.tolist().index(detail_growth_rate) * discount_axis.size + discount_axis.tolist().index(detail_discount_rate)
+    # Item x year slice of the results frame; only this scenario is formatted and rendered
+    detail_table = result_store['frame'].loc[detail_scenario_idx + 1].unstack('Year').reindex(FINANCIAL_ITEMS_ORDER)
+
+    display_data_dict = {}
+    for item, item_values in zip(detail_table.index, detail_table.to_numpy().tolist()):
+        # Apply currency formatting and symbol for relevant fields
+        if item in ['Discounted Cash Flow (DCF)', 'DCF Moves Next Year', 'Total Credit',
+                    'Subtotal', 'Amount After Working Capital', 'Loan Refund Payment', 'Last Row Total']:
+            display_data_dict[item] = [f"{value:,.2f} {currency_symbol}" for value in item_values]
+        else:
+            display_data_dict[item] = [f"{value:,.2f}" for value in item_values] # For Working Capital (if not 0), or other numeric
+
+    pivoted_df = pd.DataFrame.from_dict(display_data_dict, orient='index', columns=[str(year) for year in detail_table.columns])
+    pivoted_df.index.name = 'Financial Item'
+
+    detail_status = " (reused from the previous calculation)" if result_store['reused'][detail_scenario_idx] else ""
+    st.write(f"**Scenario {detail_scenario_idx + 1}: Growth Rate {detail_growth_rate:g}% / Discount Rate (WACC) {detail_discount_rate:g}%**{detail_status}")
+    st.dataframe(pivoted_df.style.set_properties(**{'text-align': 'right'}), use_container_width=True)
 
     st.markdown("---")
     st.subheader("Download Reports")
 
-    col_dl1, col_dl2 = st.columns(2)
-
-    with col_dl1:
-        # Generate Excel data only if results exist
-        if st.session_state.all_scenario_results:
-            excel_data = create_excel_report(st.session_state.all_scenario_results, CURRENCY_SYMBOLS.get(selected_currency, ''))
-            if excel_data: # Only show download button if data was successfully generated
-                st.download_button(
-                    label="Download All Scenarios as Excel",
-                    data=excel_data,
-                    file_name="financial_projections.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="download_excel_btn"
-                )
-            else:
-                st.warning("Excel report could not be generated.")
-
-    with col_dl2:
-        # Generate Word data only if results exist
-        if st.session_state.all_scenario_results:
-            word_data = create_word_report(st.session_state.all_scenario_results, CURRENCY_SYMBOLS.get(selected_currency, ''))
-            if word_data: # Only show download button if data was successfully generated
-                st.download_button(
-                    label="Download All Scenarios as Word",
-                    data=word_data,
-                    file_name="financial_projections.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key="download_word_btn"
-                )
+    # Large grids take a while to write, so the heatmap workbook is only built on request
+    if st.session_state.grid_summary_excel is None:
+        if st.button("Prepare Heatmap Data as Excel", key="prepare_grid_excel_btn"):
+            with st.spinner("Writing Excel file..."):
+                st.session_state.grid_summary_excel = create_grid_summary_excel_report(result_store, currency_symbol)
+    if st.session_state.grid_summary_excel is not None:
+        st.download_button(
+            label="Download Heatmap Data as Excel",
+            data=st.session_state.grid_summary_excel,
+            file_name="financial_projection_grid.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key="download_grid_excel_btn"
+        )
+
+    # The full result block, for reloading on this page or analysis elsewhere
+    if st.session_state.result_store_npz is None:
+        if st.button("Prepare Results File (.npz)", key="prepare_npz_btn"):
+            with st.spinner("Writing results file..."):
+                st.session_state.result_store_npz = save_result_store(result_store)
+    if st.session_state.result_store_npz is not None:
+        st.download_button(
+            label="Download Results File (.npz)",
+            data=st.session_state.result_store_npz,
+            file_name="financial_projection_results.npz",
+            mime="application/octet-stream",
+            key="download_npz_btn"
+        )
+
+    # Excel and Word reports are built by background workers; the page stays usable while they run
+    report_queue = get_report_job_queue()
+    long_format_rows = num_scenarios * len(result_store['years']) * len(FINANCIAL_ITEMS_ORDER)
+    report_specs = []
+    if long_format_rows > MAX_LONG_FORMAT_ROWS:
+        st.info(f"The long-format Excel report would need {long_format_rows:,} rows, more than an Excel sheet holds "
+                f"({MAX_LONG_FORMAT_ROWS:,}). Narrow the ranges or use the results file instead.")
+    else:
+        include_pivot_sheets = st.checkbox(
+            "Also add one sheet per scenario (pivot view) to the Excel report",
+            value=False,
+            disabled=num_scenarios > MAX_DETAILED_REPORT_SCENARIOS,
+            help=f"Available for up to {MAX_DETAILED_REPORT_SCENARIOS} scenarios.",
+            key="include_pivot_sheets_checkbox"
+        )
+        report_specs.append({
+            'fingerprint': report_fingerprint(result_store, range(num_scenarios), "excel", include_pivot_sheets=include_pivot_sheets),
+            'builder': create_excel_report,
+            'builder_kwargs': {'include_pivot_sheets': include_pivot_sheets},
+            'label': "All Scenarios as Excel",
+            'file_name': "financial_projections.xlsx",
+            'mime': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            'key': "excel"
+        })
+    if num_scenarios > MAX_DETAILED_REPORT_SCENARIOS:
+        st.info(f"The Word report is available for up to {MAX_DETAILED_REPORT_SCENARIOS} scenarios. "
+                f"Narrow the ranges to download it.")
+    else:
+        report_specs.append({
+            'fingerprint': report_fingerprint(result_store, range(num_scenarios), "word"),
+            'builder': create_word_report,
+            'builder_kwargs': {},
+            'label': "All Scenarios as Word",
+            'file_name': "financial_projections.docx",
+            'mime': "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            'key': "word"
+        })
+
+    for report_col, spec in zip(st.columns(2), report_specs):
+        with report_col:
+            job = report_queue.get(spec['fingerprint'])
+            if job is None or job['status'] == 'failed':
+                if st.button(f"Build {spec['label']}", key=f"build_{spec['key']}_report_btn"):
+                    report_queue.submit(spec['fingerprint'], spec['builder'], result_store, range(num_scenarios), currency_symbol,
+                                        **spec['builder_kwargs'])
+                    job = report_queue.get(spec['fingerprint'])
+            report_job_args = (spec['fingerprint'], spec['label'], spec['file_name'], spec['mime'], f"download_{spec['key']}_btn")
+            if job is not None and job['status'] in ('queued', 'running'):
+                st.fragment(show_report_job, run_every=REPORT_POLL_SECONDS)(*report_job_args, polling=True)
             else:
-                st.warning("Word report could not be generated.")
\ No newline at end of file
+                show_report_job(*report_job_args)
+
+    job_stats = report_queue.stats()
+    st.caption(f"Report workers (shared by all users): {job_stats['running']} running, {job_stats['queued']} queued, "
+               f"{job_stats['done']}/{job_stats['max_results']} finished files kept.")
+
+# --- Monte Carlo Payback Simulation ---
+st.markdown("---")
+st.header("Monte Carlo Payback Simulation")
+st.markdown("Draws a growth rate, a discount rate (WACC) and optionally an initial DCF for every path from the chosen "
+            "distributions, then runs the projection for all paths at once with the loan inputs above. "
+            "Paths are sharded across CPU cores with seeded, reproducible random streams.")
+
+col_sim1, col_sim2, col_sim3 = st.columns(3)
+with col_sim1:
+    growth_spec = distribution_inputs("Growth Rate (%)", "sim_growth",
+                                      {"Fixed": [9.0], "Normal": [9.0, 3.0], "Uniform": [6.0, 12.0], "Triangular": [6.0, 9.0, 12.0]})
+with col_sim2:
+    discount_spec = distribution_inputs("WACC (%)", "sim_discount",
+                                        {"Fixed": [7.0], "Normal": [7.0, 2.0], "Uniform": [3.0, 12.0], "Triangular": [3.0, 7.0, 12.0]},
+                                        default_distribution="Uniform")
+with col_sim3:
+    sample_initial_dcf = st.checkbox("Sample Initial DCF", value=False, key="sim_sample_dcf_checkbox")
+    if sample_initial_dcf:
+        initial_dcf_spec = distribution_inputs(f"Initial DCF ({CURRENCY_SYMBOLS.get(selected_currency, '')})", "sim_dcf",
+                                               {"Fixed": [initial_dcf], "Normal": [initial_dcf, initial_dcf * 0.1],
+                                                "Uniform": [initial_dcf * 0.8, initial_dcf * 1.2],
+                                                "Triangular": [initial_dcf * 0.8, initial_dcf, initial_dcf * 1.2]},
+                                               default_distribution="Triangular")
+    else:
+        initial_dcf_spec = ("Fixed", (initial_dcf,))
+    simulation_paths = st.number_input("Number of Paths:", min_value=1000, max_value=1000000, value=100000, step=10000, key="sim_paths_input")
+    simulation_seed = st.number_input("Random Seed:", min_value=0, value=42, step=1, key="sim_seed_input")
+
+if st.button("Run Simulation", key="run_dcf_simulation_btn"):
+    simulation_inputs = {
+        "start_year": start_year,
+        "total_simulation_years": total_simulation_years,
+        "selected_currency": selected_currency,
+        "exchange_rate": exchange_rate,
+        "initial_dcf": initial_dcf,
+        "initial_credit": initial_credit,
+        "annual_loan_payment": annual_loan_payment,
+        "loan_term_years": loan_term_years,
+        "grace_period_years": grace_period_years
+    }
+    _, calculated_initial_credit, calculated_annual_loan_payment = calculate_scaled_inputs(simulation_inputs)
+    # The sampled initial DCF is entered in the selected currency as well
+    dcf_scale = exchange_rate if selected_currency != "TL" and exchange_rate > 0 else 1.0
+    dcf_distribution, dcf_params = initial_dcf_spec
+    dcf_params = tuple(value * dcf_scale for value in dcf_params)
+    try:
+        with st.spinner("Running simulation..."):
+            st.session_state.dcf_simulation_results = simulate_dcf_payback(
+                growth_spec, discount_spec, (dcf_distribution, dcf_params),
+                calculated_initial_credit, calculated_annual_loan_payment, loan_term_years, grace_period_years,
+                start_year, total_simulation_years, n_paths=int(simulation_paths), seed=int(simulation_seed)
+            )
+            st.session_state.dcf_simulation_results['currency_symbol'] = CURRENCY_SYMBOLS.get(selected_currency, '')
+    except Exception as e:
+        st.error(f"Could not run the simulation: {e}")
+        st.session_state.dcf_simulation_results = None
+
+if st.session_state.dcf_simulation_results is not None:
+    simulation_results = st.session_state.dcf_simulation_results
+    simulation_years = simulation_results['YEAR']
+    st.write(f"**Probability that the loan is never covered within the projection:** {simulation_results['never_covered_probability']:.2%}")
+
+    fig, axes = plt.subplots(1, len(SIMULATION_METRICS) + 1, figsize=(20, 4.5))
+    for ax, metric in zip(axes, SIMULATION_METRICS):
+        low, median, high = simulation_results['bands'][metric]
+        ax.fill_between(simulation_years, low, high, alpha=0.3, label=f"P{PERCENTILES[0]}-P{PERCENTILES[-1]}")
+        ax.plot(simulation_years, median, marker='o', label=f"P{PERCENTILES[1]}")
+        ax.set_title(metric)
+        ax.set_xlabel("Year")
+        ax.set_ylabel(simulation_results['currency_symbol'])
+        ax.legend()
+    payback_share = simulation_results['payback_counts'] / simulation_results['paths']
+    axes[-1].bar(simulation_years, payback_share * 100)
+    axes[-1].set_title("Payback Year Distribution")
+    axes[-1].set_xlabel("Year")
+    axes[-1].set_ylabel("Share of Paths (%)")
+    plt.tight_layout()
+    st.pyplot(fig)
+    plt.close(fig)
+
+    bands_df = pd.DataFrame({'Year': simulation_years.astype(str)})
+    for metric in SIMULATION_METRICS:
+        for pct_idx, pct in enumerate(PERCENTILES):
+            bands_df[f"{metric} P{pct}"] = simulation_results['bands'][metric][pct_idx]
+    bands_df["Payback in Year (% of Paths)"] = payback_share * 100
+    st.dataframe(bands_df.style.format({col: "{:,.2f}" for col in bands_df.columns[1:]}), use_container_width=True, hide_index=True)
@@ -7,21 +7,34 @@ if not st.session_state.get('logged_in', False):
     st.stop() # Sayfanın geri kalan kodunu çalıştırmayı durdur
 import streamlit as st
 import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
 import math
 import json
 import os
 import io # In-memory dosya işlemleri için
-from openpyxl.utils import get_column_letter # Excel sütun genişliği için
-from openpyxl.styles import Alignment, Font, Border, Side, PatternFill, numbers # Excel hizalama, font, kenarlık, dolgu, SAYI FORMATLARI için
-from openpyxl import Workbook # Excel dosyası oluşturmak için
-from openpyxl.worksheet.table import Table, TableStyleInfo # Excel tablo için
+import xlsxwriter # Excel dosyası oluşturmak için (satırlar akış halinde yazılır)
 from docx import Document # Word dosyası oluşturmak için
 from docx.shared import Inches, Pt # Word için, Point (yazı boyutu)
 from docx.enum.text import WD_ALIGN_PARAGRAPH # Word metin hizalaması için
 
 # --- Constants and Settings ---
-NUMBER_OF_SCENARIOS = 9
+MAX_POINTS_PER_AXIS = 5000 # Growth and WACC range inputs
+MAX_RESULT_BYTES = 256 * 2**20 # Float64 (scenario, year) arrays kept per session
+MAX_SCENARIOS = 1000000 # Summary table, its CSV file and the NPV surface grow with the scenario count
+MAX_SUMMARY_ROWS = 1000 # Rows of the sorted summary sent to the browser
+MAX_DETAILED_REPORT_SCENARIOS = 50 # Excel and Word reports cover at most this many scenarios
+SCENARIO_LIST_COLUMNS = ['Growth (%)', 'WACC (%)'] # Required columns of an uploaded scenario list
+MAX_PROJECTION_YEARS = 500 # Explicit projection horizon
+MAX_DETAIL_YEAR_COLUMNS = 20 # Longer horizons are sampled or aggregated in the detail tables and the Word report
+TERMINAL_VALUE_METHODS = ["None", "Gordon Growth", "Exit Multiple"]
+YEAR_COLUMN_MODES = ["Sampled", "Aggregated"]
+MIN_SOLVED_RATE = -99.0 # Bracket (%) of the IRR and implied WACC root-finder
+MAX_SOLVED_RATE = 10000.0
+SOLVED_RATE_COLUMNS = ['IRR (%)', 'Implied WACC (%)'] # Summary columns filled by solve_discount_rates
 CURRENCIES = ["TL", "USD", "EUR", "GBP"]
+NUMBER_STYLES = ["TR/EU", "US"] # TR/EU: 1.234,56 - US: 1,234.56
+MAX_FORMATTED_FRAMES = 32 # Formatted display tables kept per calculation
 SAVE_FILE_NAME = "finans_inputs.json" # For loading default inputs
 CURRENCY_SYMBOLS = {
     "TL": "₺",
@@ -43,17 +56,43 @@ DETAILED_REPORT_ROW_ORDER = [
     'DISCOUNTED CASH FLOW',
     'CUMULATIVE DISCOUNTED CASH FLOW'
 ]
+# Running totals: aggregated year columns show their closing value instead of the sum
+CUMULATIVE_REPORT_ROWS = ['CUMULATIVE DISCOUNTED CASH FLOW']
 
 
 # --- Helper Functions ---
 
-def format_number_with_currency(number, currency_symbol, is_percentage=False, decimals=2):
+def format_number_column(values, currency_symbol='', is_percentage=False, decimals=2, number_style="TR/EU"):
+    """
+    Formats a whole column of numbers to strings at once, in the layout of format_number_with_currency.
+    "TR/EU" uses a dot for thousands and a comma for decimals, "US" a comma for thousands and a dot for decimals.
+    Currency values get thousand separators and the currency symbol; percentages get no thousand separators
+    and drop the decimals of whole numbers. NaN and infinite values become ''. Returns a list of strings.
+    """
+    values = np.asarray(values, dtype=float).ravel() + 0.0 # + 0.0 turns -0.0 into 0.0
+    finite = np.isfinite(values)
+    formatted = np.full(values.shape, '', dtype=object)
+    if is_percentage:
+        whole = finite & (values == np.trunc(values))
+        formatted[whole] = list(map("{:.0f}%".format, values[whole].tolist()))
+        fractional = finite & ~whole
+        formatted[fractional] = list(map(f"{{:.{decimals}f}}%".format, values[fractional].tolist()))
+    else:
+        formatted[finite] = list(map(f"{{:,.{decimals}f}} {currency_symbol}".format, values[finite].tolist()))
+    if number_style == "TR/EU" and values.size:
+        # One separator swap over the joined column instead of a split and join per value
+        joined = "\n".join(formatted.tolist())
+        return joined.replace(',', '\0').replace('.', ',').replace('\0', '.').split("\n")
+    return formatted.tolist()
+
+def format_number_with_currency(number, currency_symbol, is_percentage=False, decimals=2, number_style="TR/EU"):
     """
     Formats a number to a string with Turkish locale style (dot for thousands, comma for decimals)
-    and includes a currency symbol or percentage sign.
+    and includes a currency symbol or percentage sign. number_style="US" swaps the separators.
     
-    This function is primarily for display in Streamlit and Word, where human readability
-    with thousand separators is preferred.
+    This function is primarily for single values in Streamlit and Word, where human readability
+    with thousand separators is preferred. Tables format whole columns with format_number_column,
+    which gives the same strings.
     For Excel export, raw numbers are used with Excel's own number formatting.
     """
     if pd.isna(number) or number == '':
@@ -61,100 +100,291 @@ def format_number_with_currency(number, currency_symbol, is_percentage=False, de
     
     # Ensure 'number' is truly numeric before attempting operations
     try:
-        number = float(number)
+        number = float(number) + 0.0 # + 0.0 turns -0.0 into 0.0
     except (ValueError, TypeError):
         return str(number) # Return as string if not a valid number
+    if not math.isfinite(number):
+        return ''
     
     if is_percentage:
         # For percentages, show as integer percent if it's a whole number, otherwise show with decimals
         if number == int(number):
             return f"{int(number)}%" # e.g., 5%
-        else:
-            # Format with specified decimals, then replace dot with comma for decimals, add percentage sign
-            formatted_str = f"{number:.{decimals}f}".replace('.', ',')
-            return f"{formatted_str}%" # e.g., 5,25%
-    
-    # For currency values: format with 2 decimals, use dot for thousands, comma for decimals
-    # f"{number:,.{decimals}f}" uses locale-aware formatting, typically dot for thousands, comma for decimals.
-    # We need to manually swap for Turkish/EU style:
-    formatted_str = f"{number:,.{decimals}f}"
-    
-    # Manually swap comma and dot to match TR/EU format (thousands dot, comma decimal)
-    # Example: 1,234.56 -> 1.234,56
-    parts = formatted_str.split('.')
-    integer_part = parts[0].replace(',', '.') # Replace comma (from thousands in US style) with dot
-    decimal_part = parts[1] if len(parts) > 1 else "" # Get decimal part if exists
-
-    if decimal_part:
-        formatted_output = f"{integer_part},{decimal_part}"
+        formatted_str = f"{number:.{decimals}f}%" # e.g., 5.25%
     else:
-        formatted_output = integer_part # No decimal part, just integer
+        formatted_str = f"{number:,.{decimals}f} {currency_symbol}" # US style, e.g., 1,234.56 ₺
     
-    return f"{formatted_output} {currency_symbol}"
+    if number_style == "TR/EU":
+        # Swap the separators: 1,234.56 -> 1.234,56
+        formatted_str = formatted_str.replace(',', '\0').replace('.', ',').replace('\0', '.')
+    return formatted_str
+
+def figure_png(fig):
+    """Renders a matplotlib figure to PNG bytes (as st.pyplot does) and closes it."""
+    output = io.BytesIO()
+    fig.savefig(output, format='png', bbox_inches='tight', dpi=200)
+    plt.close(fig)
+    return output.getvalue()
 
-def calculate_npv(ebitda_base, growth_rate, wacc, projection_years):
+def cached_formatted_frame(npv_results, key, build_frame):
     """
-    Calculates Net Present Value for a single scenario.
-    NPV is then divided by the number of projection years.
+    Formatted display frame of the current results stored under key in npv_results['formatted_frames'];
+    build_frame() is only called on first use. Keeps the MAX_FORMATTED_FRAMES most recently built frames.
     """
-    cash_flows = []
-    
-    # Calculate cash flows for each projection year
-    for i in range(projection_years):
-        # Convert growth rate to decimal for calculation
-        current_ebitda = ebitda_base * ((1 + growth_rate / 100) ** i)
-        cash_flows.append(current_ebitda)
-
-    # Calculate Discounted Cash Flow (DCF) for each year
-    discounted_cash_flows = []
-    for i, cf in enumerate(cash_flows):
-        # Discount factor now uses 'i' directly, so first year (i=0) has discount factor of 1
-        # This makes the first year's DCF equal to its EBITDA.
-        discount_factor = (1 + wacc / 100) ** i
-        discounted_cf = cf / discount_factor if discount_factor != 0 else cf # Avoid division by zero
-        discounted_cash_flows.append(discounted_cf)
-
-    # Calculate Cumulative Discounted Cash Flow
-    cumulative_discounted_cash_flows = [sum(discounted_cash_flows[:i+1]) for i in range(len(discounted_cash_flows))]
-
-    # Net Present Value (NPV) is the sum of all discounted cash flows
-    npv = sum(discounted_cash_flows)
-    
-    # **NEW:** Divide NPV by the number of projection years as requested
+    formatted_frames = npv_results.setdefault('formatted_frames', {})
+    if key not in formatted_frames:
+        while len(formatted_frames) >= MAX_FORMATTED_FRAMES:
+            formatted_frames.pop(next(iter(formatted_frames)))
+        formatted_frames[key] = build_frame()
+    return formatted_frames[key]
+
+def calculate_npv_grid(ebitda_base, growth_rates, waccs, projection_years):
+    """
+    Calculates cash flows, discounted cash flows, their running total and NPV for many scenarios at once.
+    growth_rates and waccs (%) are broadcast against each other, e.g. growth[:, np.newaxis] and
+    wacc[np.newaxis, :] give a full (growth, WACC) grid.
+    Returns (cash_flows, discounted_cash_flows, cumulative_discounted_cash_flows, npv); the first three are
+    shaped like the broadcast scenarios plus a trailing year axis, npv like the scenarios.
+    Year i's cash flow is ebitda_base * (1 + growth)^i and its discount factor (1 + wacc)^i, so the first
+    year is not discounted. NPV is the sum of the discounted cash flows divided by the number of projection years.
+    """
+    growth_rates, waccs = np.broadcast_arrays(np.asarray(growth_rates, dtype=float), np.asarray(waccs, dtype=float))
+    year_index = np.arange(projection_years)
+
+    # Cash flows and discount factors for every year with array powers instead of per-year pow calls
+    cash_flows = ebitda_base * np.power(1 + growth_rates[..., np.newaxis] / 100, year_index)
+    discount_factors = np.power(1 + waccs[..., np.newaxis] / 100, year_index)
+    discounted_cash_flows = np.divide(cash_flows, discount_factors, out=cash_flows.copy(), where=discount_factors != 0) # Avoid division by zero
+
+    # Running total in one pass; its last year is the sum of all discounted cash flows
+    cumulative_discounted_cash_flows = np.cumsum(discounted_cash_flows, axis=-1)
+
+    # Divide NPV by the number of projection years as requested
     if projection_years > 0:
-        npv = npv / projection_years
+        npv = cumulative_discounted_cash_flows[..., -1] / projection_years
     else:
-        npv = 0 # Handle case where projection_years is zero
+        npv = np.zeros(growth_rates.shape) # Handle case where projection_years is zero
 
     return cash_flows, discounted_cash_flows, cumulative_discounted_cash_flows, npv
 
+def calculate_terminal_value(final_cash_flows, waccs, projection_years, method, terminal_growth_rate=0.0, exit_multiple=0.0):
+    """
+    Terminal value at the end of the last projection year and its present value, for every scenario.
+    'Gordon Growth': final cash flow * (1 + terminal growth) / (WACC - terminal growth), NaN where WACC
+    does not exceed the terminal growth rate. 'Exit Multiple': final cash flow (EBITDA) * exit_multiple.
+    The present value uses the last projection year's discount factor (1 + WACC)^(projection_years - 1).
+    Rates are in %. Returns (terminal_values, present_values), shaped like the scenarios.
+    """
+    final_cash_flows, waccs = np.broadcast_arrays(np.asarray(final_cash_flows, dtype=float), np.asarray(waccs, dtype=float))
+    if method == "Gordon Growth":
+        spread = waccs / 100 - terminal_growth_rate / 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terminal_values = np.where(spread > 0, final_cash_flows * (1 + terminal_growth_rate / 100) / spread, np.nan)
+    elif method == "Exit Multiple":
+        terminal_values = final_cash_flows * exit_multiple
+    else:
+        raise ValueError(f"Unknown terminal value method: {method}")
+    present_values = terminal_values / np.power(1 + waccs / 100, max(projection_years - 1, 0))
+    return terminal_values, present_values
+
+def geometric_present_value(ebitda_base, log_growth_factors, log_discount_factors, projection_years):
+    """
+    Sum of the discounted cash flows of calculate_npv_grid in closed form. The cash flows grow geometrically, so
+    the sum is ebitda_base * (1 + q + ... + q^(n-1)) with q = (1 + growth) / (1 + rate), evaluated as
+    expm1(n log q) / expm1(log q) to stay accurate near q = 1. Growth and discount rates are passed as
+    log(1 + rate) per scenario and broadcast against each other.
+    """
+    log_q = log_growth_factors - log_discount_factors
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        geometric_sum = np.where(log_q == 0, float(projection_years), np.expm1(projection_years * log_q) / np.expm1(log_q))
+    return ebitda_base * geometric_sum
+
+def solve_discount_rates(ebitda_base, growth_rates, target_present_values, projection_years,
+                         min_rate=MIN_SOLVED_RATE, max_rate=MAX_SOLVED_RATE, iterations=100):
+    """
+    For every scenario, the discount rate (%) at which the sum of the discounted cash flows equals
+    target_present_values (broadcast against growth_rates). All scenarios are bisected at once on
+    log(1 + rate) within [min_rate, max_rate]; NaN where the target is not bracketed by these rates.
+    """
+    growth_rates, target_present_values = np.broadcast_arrays(np.asarray(growth_rates, dtype=float),
+                                                              np.asarray(target_present_values, dtype=float))
+
+    log_growth_factors = np.log1p(growth_rates / 100)
+
+    def excess(log_discount_factors):
+        return np.sign(geometric_present_value(ebitda_base, log_growth_factors, log_discount_factors, projection_years) - target_present_values)
+
+    low = np.full(growth_rates.shape, np.log1p(min_rate / 100))
+    high = np.full(growth_rates.shape, np.log1p(max_rate / 100))
+    sign_at_low = excess(low)
+    bracketed = sign_at_low * excess(high) <= 0
+
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        same_sign = excess(middle) == sign_at_low
+        low = np.where(same_sign, middle, low)
+        high = np.where(same_sign, high, middle)
+        if np.all(high - low <= 1e-13):
+            break
+    return np.where(bracketed, np.expm1((low + high) / 2) * 100, np.nan)
+
+def collapse_year_columns(years, item_values, max_columns, mode="Sampled"):
+    """
+    Reduces the year columns of a detail table to at most max_columns when the horizon is longer.
+    item_values maps every item of DETAILED_REPORT_ROW_ORDER to its yearly values.
+    'Sampled' keeps max_columns evenly spaced years, always including the first and last year. 'Aggregated'
+    splits the years into max_columns groups of consecutive years whose sizes differ by at most one (as
+    np.array_split does): flows are summed, CUMULATIVE_REPORT_ROWS show their closing value.
+    Returns (column labels, {item: column values}).
+    """
+    num_years = len(years)
+    if num_years <= max_columns:
+        return [str(year) for year in years], {item: list(values) for item, values in item_values.items()}
+    if mode == "Sampled":
+        positions = np.unique(np.linspace(0, num_years - 1, max_columns).round().astype(int))
+        return ([str(years[pos]) for pos in positions.tolist()],
+                {item: np.asarray(values)[positions].tolist() for item, values in item_values.items()})
+    starts = np.arange(max_columns) * num_years // max_columns
+    ends = np.append(starts[1:], num_years) - 1
+    labels = [f"{years[start]}-{years[end]}" if end > start else str(years[start]) for start, end in zip(starts.tolist(), ends.tolist())]
+    columns = {}
+    for item, values in item_values.items():
+        values = np.asarray(values, dtype=float)
+        columns[item] = (values[ends] if item in CUMULATIVE_REPORT_ROWS else np.add.reduceat(values, starts)).tolist()
+    return labels, columns
+
+def build_rate_range(start, stop, step):
+    """
+    Returns the rates start, start + step, ... up to and including stop (within rounding) as a 1-D array.
+    Raises ValueError for a non-positive step, a stop below start or more than MAX_POINTS_PER_AXIS points.
+    """
+    if step <= 0:
+        raise ValueError("Step must be greater than zero.")
+    if stop < start:
+        raise ValueError("Stop must not be below start.")
+    num_points = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if num_points > MAX_POINTS_PER_AXIS:
+        raise ValueError(f"A range can have at most {MAX_POINTS_PER_AXIS} points ({num_points} requested).")
+    return np.round(start + step * np.arange(num_points), 10)
+
+def read_scenario_list(uploaded_file):
+    """
+    Reads an uploaded CSV or Excel scenario list with SCENARIO_LIST_COLUMNS, one scenario per row.
+    Returns (growth_rates, waccs) as 1-D arrays (%). Raises ValueError for missing columns or non-numeric values.
+    """
+    if uploaded_file.name.lower().endswith('.csv'):
+        scenario_df = pd.read_csv(uploaded_file)
+    else:
+        scenario_df = pd.read_excel(uploaded_file)
+    scenario_df.columns = [str(col).strip() for col in scenario_df.columns]
+    missing_columns = [col for col in SCENARIO_LIST_COLUMNS if col not in scenario_df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing column(s): {', '.join(missing_columns)}. Expected: {', '.join(SCENARIO_LIST_COLUMNS)}.")
+    scenario_values = scenario_df[SCENARIO_LIST_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    invalid_rows = scenario_values.isna().any(axis=1)
+    if invalid_rows.any():
+        raise ValueError(f"Row(s) {', '.join(str(row + 2) for row in np.flatnonzero(invalid_rows)[:10])} have non-numeric or empty values.")
+    if scenario_values.empty:
+        raise ValueError("The scenario list is empty.")
+    return scenario_values['Growth (%)'].to_numpy(dtype=float), scenario_values['WACC (%)'].to_numpy(dtype=float)
+
+def calculate_scenario_results(growth_rates, waccs, ebitda_base, start_year, projection_years, grid_shape=None,
+                               terminal_value_method="None", terminal_growth_rate=0.0, exit_multiple=0.0,
+                               initial_investment=None, target_npv=None):
+    """
+    Evaluates every scenario (one growth rate and one WACC (%) each) in a single calculate_npv_grid call.
+    Returns a dictionary with the scenario rates ('growth_rates', 'waccs'), the (scenario, year) arrays
+    'cash_flows', 'discounted_cash_flows' and 'cumulative_discounted_cash_flows', 'npv', the inputs, and
+    'grid_shape': (number of growth rates, number of WACCs) when the scenarios are a Cartesian grid in
+    growth-major order, otherwise None. 'summary_orders' caches sorted summary row orders (see summary_order),
+    'formatted_frames' the formatted display tables (see cached_formatted_frame) and 'charts' the PNG images
+    of the result charts, drawn on first display.
+    With a terminal value method, 'terminal_value', 'pv_terminal_value' and 'total_present_value' (sum of the
+    discounted cash flows plus the terminal value's present value) are added per scenario; NPV is unchanged.
+    With an initial_investment, 'irr' (%) is the rate at which the discounted cash flows repay the investment made
+    at the start of the first year; with a target_npv, 'implied_wacc' (%) is the WACC at which NPV equals it.
+    Both ignore the terminal value and are NaN where no rate in [MIN_SOLVED_RATE, MAX_SOLVED_RATE] solves them.
+    """
+    growth_rates = np.asarray(growth_rates, dtype=float)
+    waccs = np.asarray(waccs, dtype=float)
+    cash_flows, discounted_cash_flows, cumulative_discounted_cash_flows, npv = calculate_npv_grid(
+        ebitda_base, growth_rates, waccs, projection_years)
+    results = {
+        'growth_rates': growth_rates,
+        'waccs': waccs,
+        'cash_flows': cash_flows,
+        'discounted_cash_flows': discounted_cash_flows,
+        'cumulative_discounted_cash_flows': cumulative_discounted_cash_flows,
+        'npv': npv,
+        'ebitda_base': ebitda_base,
+        'start_year': start_year,
+        'projection_years': projection_years,
+        'grid_shape': grid_shape,
+        'terminal_value_method': terminal_value_method,
+        'terminal_growth_rate': terminal_growth_rate,
+        'exit_multiple': exit_multiple,
+        'initial_investment': initial_investment,
+        'target_npv': target_npv,
+        'summary_orders': {},
+        'formatted_frames': {},
+        'charts': {}
+    }
+    if terminal_value_method != "None":
+        results['terminal_value'], results['pv_terminal_value'] = calculate_terminal_value(
+            cash_flows[..., -1], waccs, projection_years, terminal_value_method, terminal_growth_rate, exit_multiple)
+        results['total_present_value'] = cumulative_discounted_cash_flows[..., -1] + results['pv_terminal_value']
+    if initial_investment is not None:
+        results['irr'] = solve_discount_rates(ebitda_base, growth_rates, initial_investment, projection_years)
+    if target_npv is not None:
+        # NPV is the sum of the discounted cash flows divided by the number of projection years
+        results['implied_wacc'] = solve_discount_rates(ebitda_base, growth_rates, target_npv * projection_years, projection_years)
+    return results
+
+def scenario_export_data(npv_results, scenario_indices):
+    """Per-scenario dictionaries of the given scenarios, in the layout used by the Excel and Word reports."""
+    return [{
+        'scenario_name': f"Scenario {scenario_idx + 1}",
+        'start_year': npv_results['start_year'],
+        'projection_years': npv_results['projection_years'],
+        'ebitda_base': npv_results['ebitda_base'],
+        'growth_rate': float(npv_results['growth_rates'][scenario_idx]),
+        'wacc': float(npv_results['waccs'][scenario_idx]),
+        'cash_flows': npv_results['cash_flows'][scenario_idx].tolist(),
+        'discounted_cash_flows': npv_results['discounted_cash_flows'][scenario_idx].tolist(),
+        'cumulative_discounted_cash_flows': npv_results['cumulative_discounted_cash_flows'][scenario_idx].tolist(),
+        'npv': float(npv_results['npv'][scenario_idx]),
+        'terminal_value_method': npv_results['terminal_value_method'],
+        'terminal_value': float(npv_results['terminal_value'][scenario_idx]) if 'terminal_value' in npv_results else None,
+        'pv_terminal_value': float(npv_results['pv_terminal_value'][scenario_idx]) if 'pv_terminal_value' in npv_results else None,
+        'total_present_value': float(npv_results['total_present_value'][scenario_idx]) if 'total_present_value' in npv_results else None,
+        'irr': float(npv_results['irr'][scenario_idx]) if 'irr' in npv_results else None,
+        'implied_wacc': float(npv_results['implied_wacc'][scenario_idx]) if 'implied_wacc' in npv_results else None
+    } for scenario_idx in scenario_indices]
+
+def summary_order(npv_results, summary_df, sort_column, ascending):
+    """Row positions of summary_df sorted by sort_column (scenario number for 'Scenario'), cached per sort."""
+    key = (sort_column, ascending)
+    if key not in npv_results['summary_orders']:
+        if sort_column == 'Scenario':
+            order = np.arange(len(summary_df)) if ascending else np.arange(len(summary_df))[::-1]
+        else:
+            order = summary_df[sort_column].reset_index(drop=True).sort_values(ascending=ascending, na_position='last', kind='stable').index.to_numpy()
+        npv_results['summary_orders'][key] = order
+    return npv_results['summary_orders'][key]
+
 def create_excel_report(all_scenario_data, currency_symbol):
     """
     Generates an Excel (.xlsx) report for all scenarios.
     Ensures numbers are written as actual numbers for summation and uses Excel's formatting.
+    Rows are streamed with xlsxwriter in constant_memory mode and column widths are derived from the
+    value arrays instead of scanning the cells, so long horizons keep every year without slowing down.
     """
-    wb = Workbook()
-    
-    # Summary Sheet
-    ws_summary = wb.active
-    ws_summary.title = "Summary"
-
-    # Define styles for summary sheet
-    header_font = Font(bold=True, size=11)
-    data_font = Font(size=10)
-    center_aligned = Alignment(horizontal='center', vertical='center')
-    right_aligned = Alignment(horizontal='right', vertical='center')
-    thin_border = Border(left=Side(style='thin'), 
-                         right=Side(style='thin'), 
-                         top=Side(style='thin'), 
-                         bottom=Side(style='thin'))
-    
+    output = io.BytesIO()
+    wb = xlsxwriter.Workbook(output, {'constant_memory': True, 'nan_inf_to_errors': True})
+
     # Excel number formats for percentages:
-    # To display % sign BEFORE the number, you would technically use custom format like "%\0"
-    # But this often requires writing the raw decimal (e.g., 0.05) and can be tricky with openpyxl.
-    # The standard '0%' and '0.00%' typically place the % sign AFTER the number based on locale.
-    # Forcing it to the front *and* maintaining numeric type for summation is complex without Excel VBA.
-    # We will stick to the standard '0%' and '0.00%' which are commonly understood and retain numeric value.
+    # The standard '0%' and '0.00%' place the % sign AFTER the number and retain the numeric value,
+    # so rates are written as decimals (e.g., 0.05 for 5%).
     excel_percentage_format_no_decimals = '0%' # For 5% (no decimals)
     excel_percentage_format_with_decimals = '0.00%' # For 5.25% (2 decimals)
     
@@ -162,217 +392,165 @@ def create_excel_report(all_scenario_data, currency_symbol):
     # Example: #,##0.00 "₺" will show 1.234.567,89 ₺ in Turkish Excel
     excel_currency_numeric_format = f'#,##0.00 "{currency_symbol}"'
 
+    # Define styles
+    header_format = wb.add_format({'bold': True, 'font_size': 11, 'align': 'center', 'valign': 'vcenter', 'border': 1})
+    title_format = wb.add_format({'bold': True, 'font_size': 11, 'align': 'center', 'valign': 'vcenter'})
+    label_format = wb.add_format({'bold': True, 'font_size': 11})
+    scenario_name_format = wb.add_format({'font_size': 10, 'align': 'center', 'valign': 'vcenter', 'border': 1})
+    item_name_format = wb.add_format({'font_size': 10, 'align': 'right', 'valign': 'vcenter', 'border': 1})
+    amount_format = wb.add_format({'font_size': 10, 'align': 'right', 'valign': 'vcenter', 'border': 1, 'num_format': excel_currency_numeric_format})
+    percentage_formats = {decimals: wb.add_format({'font_size': 10, 'align': 'right', 'valign': 'vcenter', 'border': 1, 'num_format': num_format})
+                          for decimals, num_format in [(0, excel_percentage_format_no_decimals), (2, excel_percentage_format_with_decimals)]}
+    info_currency_format = wb.add_format({'num_format': excel_currency_numeric_format})
+    info_percentage_formats = {0: wb.add_format({'num_format': excel_percentage_format_no_decimals}),
+                               2: wb.add_format({'num_format': excel_percentage_format_with_decimals})}
+    npv_format = wb.add_format({'bold': True, 'font_size': 11, 'num_format': excel_currency_numeric_format})
+
+    def percentage_decimals(rate):
+        return 0 if rate == int(rate) else 2
+
+    def currency_width(values):
+        # Widest formatted value of the given values: the one with the largest magnitude, shown negative
+        finite_values = np.abs(np.asarray(values, dtype=float))
+        finite_values = finite_values[np.isfinite(finite_values)]
+        return len(f"{-finite_values.max():,.2f} {currency_symbol}") if finite_values.size else 0
+
+    def percentage_width(values):
+        finite_values = np.abs(np.asarray(values, dtype=float))
+        finite_values = finite_values[np.isfinite(finite_values)]
+        return len(f"{-finite_values.max():.2f}%") if finite_values.size else 0
+
+    # Summary Sheet
+    ws_summary = wb.add_worksheet("Summary")
 
     # Summary table headers
     summary_headers = ['Scenario', 'Growth (%)', 'WACC (%)', 'NPV']
-    ws_summary.append(summary_headers)
-    for col_idx, header_text in enumerate(summary_headers, 1):
-        cell = ws_summary.cell(row=1, column=col_idx)
-        cell.font = header_font
-        cell.alignment = center_aligned
-        cell.border = thin_border
+    summary_keys = ['scenario_name', 'growth_rate', 'wacc', 'npv']
+    has_terminal_value = any(data.get('terminal_value_method', "None") != "None" for data in all_scenario_data)
+    if has_terminal_value:
+        summary_headers += ['PV of Terminal Value', 'Total Present Value']
+        summary_keys += ['pv_terminal_value', 'total_present_value']
+    for key, header in zip(['irr', 'implied_wacc'], SOLVED_RATE_COLUMNS):
+        if all_scenario_data and all_scenario_data[0].get(key) is not None:
+            summary_headers.append(header)
+            summary_keys.append(key)
+    ws_summary.write_row(0, 0, summary_headers, header_format)
     
-    # Populate summary table
-    for scenario_idx, data in enumerate(all_scenario_data):
-        # We are writing raw numbers to Excel for calculations
-        # And applying Excel's number format
-        row_values = [
-            f"Scenario {scenario_idx + 1}",
-            data['growth_rate'] / 100, # Convert to decimal for Excel's percentage format
-            data['wacc'] / 100,        # Convert to decimal for Excel's percentage format
-            data['npv']                # Write raw number
-        ]
-        ws_summary.append(row_values)
-        
-        # Apply formatting to summary data rows
-        for col_idx in range(1, len(summary_headers) + 1):
-            cell = ws_summary.cell(row=ws_summary.max_row, column=col_idx)
-            cell.font = data_font
-            cell.border = thin_border
-            if col_idx == 1: # Scenario name
-                cell.alignment = center_aligned
-            elif col_idx == 2: # Growth
-                cell.alignment = right_aligned
-                # Check if original growth rate was whole number
-                if data['growth_rate'] == int(data['growth_rate']):
-                    cell.number_format = excel_percentage_format_no_decimals
-                else:
-                    cell.number_format = excel_percentage_format_with_decimals
-            elif col_idx == 3: # WACC
-                cell.alignment = right_aligned
-                # Check if original wacc was whole number
-                if data['wacc'] == int(data['wacc']):
-                    cell.number_format = excel_percentage_format_no_decimals
-                else:
-                    cell.number_format = excel_percentage_format_with_decimals
-            elif col_idx == 4: # NPV
-                cell.alignment = right_aligned
-                cell.number_format = excel_currency_numeric_format # Apply custom currency format
-
-    # Adjust column widths for summary sheet
-    for col_idx in range(1, ws_summary.max_column + 1):
-        max_length = 0
-        for row_idx in range(1, ws_summary.max_row + 1):
-            cell = ws_summary.cell(row=row_idx, column=col_idx)
-            if cell.value is not None:
-                # To get the display length for width calculation,
-                # use the formatted string (similar to Streamlit/Word display)
-                # Need to handle potential IndexError for all_scenario_data if row_idx is 1 (header row)
-                if row_idx > 1: # For data rows
-                    if col_idx == 2: # Growth
-                        val_for_display = all_scenario_data[row_idx-2]['growth_rate'] # Get original value for correct formatting
-                        cell_value_str = format_number_with_currency(val_for_display, '', is_percentage=True)
-                    elif col_idx == 3: # WACC
-                        val_for_display = all_scenario_data[row_idx-2]['wacc'] # Get original value for correct formatting
-                        cell_value_str = format_number_with_currency(val_for_display, '', is_percentage=True)
-                    elif col_idx == 4: # NPV
-                        cell_value_str = format_number_with_currency(cell.value, currency_symbol)
-                    else: # Scenario name
-                        cell_value_str = str(cell.value)
-                else: # For header row
-                    cell_value_str = str(cell.value)
-
-                if len(cell_value_str) > max_length:
-                    max_length = len(cell_value_str)
-        column_letter = get_column_letter(col_idx)
-        # Reduce multiplier slightly for tighter fit, but keep padding
-        adjusted_width = (max_length + 2) * 1.1 
-        if adjusted_width > 0:
-            ws_summary.column_dimensions[column_letter].width = adjusted_width
-
-
-    # Individual Scenario Sheets (Years as columns, Items as rows)
-    for scenario_idx, scenario_data in enumerate(all_scenario_data):
-        ws = wb.create_sheet(title=f"Scenario {scenario_idx + 1}")
-        
-        # Scenario specific info above the table
-        ws.append([f"Scenario {scenario_idx + 1} Details"])
-        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=scenario_data['projection_years'] + 1)
-        ws['A1'].font = header_font
-        ws['A1'].alignment = center_aligned
-        ws.append([]) # Blank row
-
-        ws.append(["Starting EBITDA:", scenario_data['ebitda_base']])
-        ws.cell(row=ws.max_row, column=2).number_format = excel_currency_numeric_format
-        
-        ws.append(["Growth Rate (%):", scenario_data['growth_rate']]) # Write raw number (e.g., 10 for 10%)
-        # Apply integer percentage format if value is whole number, else decimal percentage
-        if scenario_data['growth_rate'] == int(scenario_data['growth_rate']):
-            ws.cell(row=ws.max_row, column=2).number_format = excel_percentage_format_no_decimals
-            ws.cell(row=ws.max_row, column=2).value = scenario_data['growth_rate'] / 100 # Write 0.10 for 10%
-        else:
-            ws.cell(row=ws.max_row, column=2).number_format = excel_percentage_format_with_decimals
-            ws.cell(row=ws.max_row, column=2).value = scenario_data['growth_rate'] / 100
-
-        ws.append(["WACC (%):", scenario_data['wacc']]) # Write raw number (e.g., 3 for 3%)
-        if scenario_data['wacc'] == int(scenario_data['wacc']):
-            ws.cell(row=ws.max_row, column=2).number_format = excel_percentage_format_no_decimals
-            ws.cell(row=ws.max_row, column=2).value = scenario_data['wacc'] / 100
+    # Populate summary table: raw numbers with Excel's number formats, rates as decimals
+    for row_idx, data in enumerate(all_scenario_data, 1):
+        ws_summary.write_string(row_idx, 0, data['scenario_name'], scenario_name_format)
+        for col_idx, key in enumerate(summary_keys[1:], 1):
+            value = data[key]
+            if key in ['growth_rate', 'wacc']:
+                ws_summary.write_number(row_idx, col_idx, value / 100, percentage_formats[percentage_decimals(value)])
+            elif key in ['irr', 'implied_wacc']:
+                # Unsolved IRR / implied WACC (NaN) is left empty
+                ws_summary.write(row_idx, col_idx, None if pd.isna(value) else value / 100, percentage_formats[2])
+            else:
+                # NaN (no Gordon growth value where WACC <= terminal growth) is left empty
+                ws_summary.write(row_idx, col_idx, None if pd.isna(value) else value, amount_format)
+
+    # Column widths from the value range of every column
+    for col_idx, (header, key) in enumerate(zip(summary_headers, summary_keys)):
+        column_values = [data[key] for data in all_scenario_data]
+        if key == 'scenario_name':
+            max_length = max([len(header)] + [len(value) for value in column_values])
+        elif key in ['growth_rate', 'wacc', 'irr', 'implied_wacc']:
+            max_length = max(len(header), percentage_width(column_values))
         else:
-            ws.cell(row=ws.max_row, column=2).number_format = excel_percentage_format_with_decimals
-            ws.cell(row=ws.max_row, column=2).value = scenario_data['wacc'] / 100
-        ws.append([]) # Blank row
+            max_length = max(len(header), currency_width(column_values))
+        ws_summary.set_column(col_idx, col_idx, (max_length + 2) * 1.1)
 
-        # Detailed table headers (Years)
+    # Individual Scenario Sheets (Years as columns, Items as rows)
+    for scenario_data in all_scenario_data:
+        ws = wb.add_worksheet(scenario_data['scenario_name'])
         years = [scenario_data['start_year'] + i for i in range(scenario_data['projection_years'])]
-        headers = ['Financial Items'] + years
-        ws.append(headers)
-        
-        for col_idx, header_text in enumerate(headers, 1):
-            cell = ws.cell(row=ws.max_row, column=col_idx)
-            cell.font = header_font
-            cell.alignment = center_aligned
-            cell.border = thin_border
-
-        # Prepare data for new table structure
-        # Use the specific order for rows
-        detailed_data = {}
-        detailed_data['EBITDA'] = scenario_data['cash_flows']
-        detailed_data['DISCOUNTED CASH FLOW'] = scenario_data['discounted_cash_flows']
-        detailed_data['CUMULATIVE DISCOUNTED CASH FLOW'] = scenario_data['cumulative_discounted_cash_flows']
         
-        for item_key in DETAILED_REPORT_ROW_ORDER: # Iterate in predefined order
-            row_cells_values = [FINANCIAL_ITEMS_EN_DISPLAY.get(item_key, item_key)] # First cell is item name
-            for year_data in detailed_data[item_key]:
-                row_cells_values.append(year_data) # Write raw number
-            ws.append(row_cells_values)
-
-            # Apply formatting to data rows
-            current_row_idx = ws.max_row
-            ws.cell(row=current_row_idx, column=1).font = data_font # Financial Item name
-            ws.cell(row=current_row_idx, column=1).alignment = right_aligned
-            ws.cell(row=current_row_idx, column=1).border = thin_border
-
-
-            for col_idx in range(2, len(headers) + 1): # Start from year columns
-                cell = ws.cell(row=current_row_idx, column=col_idx)
-                cell.font = data_font
-                cell.alignment = right_aligned # Ensure all numeric cells are right-aligned
-                cell.border = thin_border
-                cell.number_format = excel_currency_numeric_format # All financial values
-                
-        ws.append([]) # Blank row
-        ws.append(["Net Present Value (NPV):", scenario_data['npv']]) # Write raw NPV
-        ws.cell(row=ws.max_row, column=2).number_format = excel_currency_numeric_format
-        ws.cell(row=ws.max_row, column=1).font = header_font
-        ws.cell(row=ws.max_row, column=2).font = header_font
-
-        # Adjust column widths for detail sheet
-        for col_idx in range(1, ws.max_column + 1):
-            max_length = 0
-            for row_idx in range(1, ws.max_row + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                if cell.value is not None:
-                    # Use formatted string for length calculation (as per Streamlit/Word display)
-                    if col_idx == 1: # Financial item names column
-                         cell_value_str = str(cell.value)
-                    else: # Formatted financial values or year headers
-                        val = cell.value # Get the raw value
-                        # Check if this cell corresponds to Growth Rate or WACC (based on row_idx and header content)
-                        if isinstance(val, (int, float)):
-                            # These magic numbers (row_idx 3 and 4) come from the fixed layout above the table
-                            if row_idx == 3: # Row for Growth Rate
-                                val_for_display = scenario_data['growth_rate']
-                                cell_value_str = format_number_with_currency(val_for_display, '', is_percentage=True)
-                            elif row_idx == 4: # Row for WACC
-                                val_for_display = scenario_data['wacc']
-                                cell_value_str = format_number_with_currency(val_for_display, '', is_percentage=True)
-                            else: # Other financial values
-                                cell_value_str = format_number_with_currency(val, currency_symbol)
-                        else: # Otherwise, it's likely a year header (string)
-                            cell_value_str = str(val)
-                        
-                    if len(cell_value_str) > max_length:
-                        max_length = len(cell_value_str)
-            column_letter = get_column_letter(col_idx)
-            # Reduce multiplier slightly for tighter fit
-            adjusted_width = (max_length + 2) * 1.1
-            if adjusted_width > 0:
-                ws.column_dimensions[column_letter].width = adjusted_width
-
-    output = io.BytesIO()
-    wb.save(output)
+        # Scenario specific info above the table
+        ws.merge_range(0, 0, 0, len(years), f"{scenario_data['scenario_name']} Details", title_format)
+        ws.write_string(2, 0, "Starting EBITDA:")
+        ws.write_number(2, 1, scenario_data['ebitda_base'], info_currency_format)
+        ws.write_string(3, 0, "Growth Rate (%):")
+        ws.write_number(3, 1, scenario_data['growth_rate'] / 100, info_percentage_formats[percentage_decimals(scenario_data['growth_rate'])]) # 0.10 for 10%
+        ws.write_string(4, 0, "WACC (%):")
+        ws.write_number(4, 1, scenario_data['wacc'] / 100, info_percentage_formats[percentage_decimals(scenario_data['wacc'])])
+
+        # Detailed table: years as headers, one row per financial item in the predefined order
+        ws.write_string(6, 0, 'Financial Items', header_format)
+        ws.write_row(6, 1, years, header_format)
+        detailed_data = {
+            'EBITDA': scenario_data['cash_flows'],
+            'DISCOUNTED CASH FLOW': scenario_data['discounted_cash_flows'],
+            'CUMULATIVE DISCOUNTED CASH FLOW': scenario_data['cumulative_discounted_cash_flows']
+        }
+        row_idx = 7
+        for item_key in DETAILED_REPORT_ROW_ORDER:
+            ws.write_string(row_idx, 0, FINANCIAL_ITEMS_EN_DISPLAY.get(item_key, item_key), item_name_format)
+            ws.write_row(row_idx, 1, detailed_data[item_key], amount_format) # Raw numbers
+            row_idx += 1
+
+        # Results below the table (a blank row in between)
+        row_idx += 1
+        ws.write_string(row_idx, 0, "Net Present Value (NPV):", label_format)
+        ws.write_number(row_idx, 1, scenario_data['npv'], npv_format)
+        result_labels = ["Net Present Value (NPV):"]
+        result_amounts = [scenario_data['npv'], scenario_data['ebitda_base']]
+        if scenario_data.get('terminal_value_method', "None") != "None":
+            for label, key in [(f"Terminal Value ({scenario_data['terminal_value_method']}):", 'terminal_value'),
+                               ("PV of Terminal Value:", 'pv_terminal_value'),
+                               ("Total Present Value:", 'total_present_value')]:
+                row_idx += 1
+                ws.write_string(row_idx, 0, label, label_format)
+                ws.write(row_idx, 1, None if pd.isna(scenario_data[key]) else scenario_data[key], info_currency_format)
+                result_labels.append(label)
+                result_amounts.append(scenario_data[key])
+        for label, key in [("IRR:", 'irr'), ("Implied WACC:", 'implied_wacc')]:
+            if scenario_data.get(key) is not None:
+                row_idx += 1
+                ws.write_string(row_idx, 0, label, label_format)
+                ws.write(row_idx, 1, None if pd.isna(scenario_data[key]) else scenario_data[key] / 100, info_percentage_formats[2])
+                result_labels.append(label)
+
+        # Column widths: labels in the first column, each year's widest value in the others
+        value_grid = np.abs(np.array([detailed_data[item_key] for item_key in DETAILED_REPORT_ROW_ORDER], dtype=float))
+        year_widths = [max(len(str(year)), len(f"{-value:,.2f} {currency_symbol}")) for year, value in zip(years, value_grid.max(axis=0).tolist())]
+        label_width = max(len(text) for text in ["Starting EBITDA:", "Growth Rate (%):", "WACC (%):", "Financial Items"]
+                          + [FINANCIAL_ITEMS_EN_DISPLAY.get(item_key, item_key) for item_key in DETAILED_REPORT_ROW_ORDER] + result_labels)
+        ws.set_column(0, 0, (label_width + 2) * 1.1)
+        ws.set_column(1, 1, (max(year_widths[0], currency_width(result_amounts)) + 2) * 1.1)
+        for col_idx, width in enumerate(year_widths[1:], 2):
+            ws.set_column(col_idx, col_idx, (width + 2) * 1.1)
+
+    wb.close()
     output.seek(0)
     return output.getvalue()
 
 
-def create_word_report(all_scenario_data, currency_symbol):
+def create_word_report(all_scenario_data, currency_symbol, year_column_mode="Sampled", number_style="TR/EU"):
     """
     Generates a Word (.docx) report for all scenarios.
-    Uses format_number_with_currency for all numeric displays.
+    Uses format_number_with_currency for single values and format_number_column for table rows, in number_style.
+    Horizons longer than MAX_DETAIL_YEAR_COLUMNS are reduced with collapse_year_columns(year_column_mode).
     """
     document = Document()
     document.add_heading('Financial Projections Report', level=1)
     
     for scenario_idx, scenario_data in enumerate(all_scenario_data):
-        document.add_heading(f'Scenario {scenario_idx + 1}', level=2)
-        document.add_paragraph(f"Starting EBITDA: {format_number_with_currency(scenario_data['ebitda_base'], currency_symbol)}")
-        document.add_paragraph(f"Growth Rate: {format_number_with_currency(scenario_data['growth_rate'], '', is_percentage=True, decimals=0 if scenario_data['growth_rate'] == int(scenario_data['growth_rate']) else 2)}")
-        document.add_paragraph(f"WACC: {format_number_with_currency(scenario_data['wacc'], '', is_percentage=True, decimals=0 if scenario_data['wacc'] == int(scenario_data['wacc']) else 2)}")
+        document.add_heading(scenario_data['scenario_name'], level=2)
+        document.add_paragraph(f"Starting EBITDA: {format_number_with_currency(scenario_data['ebitda_base'], currency_symbol, number_style=number_style)}")
+        document.add_paragraph(f"Growth Rate: {format_number_with_currency(scenario_data['growth_rate'], '', is_percentage=True, decimals=0 if scenario_data['growth_rate'] == int(scenario_data['growth_rate']) else 2, number_style=number_style)}")
+        document.add_paragraph(f"WACC: {format_number_with_currency(scenario_data['wacc'], '', is_percentage=True, decimals=0 if scenario_data['wacc'] == int(scenario_data['wacc']) else 2, number_style=number_style)}")
         
-        # Add table with years as columns and financial items as rows
+        # Prepare data for new table structure
+        detailed_data = {}
+        detailed_data['EBITDA'] = scenario_data['cash_flows']
+        detailed_data['DISCOUNTED CASH FLOW'] = scenario_data['discounted_cash_flows']
+        detailed_data['CUMULATIVE DISCOUNTED CASH FLOW'] = scenario_data['cumulative_discounted_cash_flows']
+
+        # Add table with years (or sampled/aggregated year columns) as columns and financial items as rows
         years = [scenario_data['start_year'] + i for i in range(scenario_data['projection_years'])]
-        headers = ['Financial Items'] + years
+        year_columns, detailed_data = collapse_year_columns(years, detailed_data, MAX_DETAIL_YEAR_COLUMNS, year_column_mode)
+        headers = ['Financial Items'] + year_columns
         
         table = document.add_table(rows=1, cols=len(headers))
         table.style = 'Table Grid'
@@ -385,20 +563,14 @@ def create_word_report(all_scenario_data, currency_symbol):
             hdr_cells[i].paragraphs[0].runs[0].font.bold = True
             hdr_cells[i].paragraphs[0].runs[0].font.size = Pt(10)
 
-        # Prepare data for new table structure
-        detailed_data = {}
-        detailed_data['EBITDA'] = scenario_data['cash_flows']
-        detailed_data['DISCOUNTED CASH FLOW'] = scenario_data['discounted_cash_flows']
-        detailed_data['CUMULATIVE DISCOUNTED CASH FLOW'] = scenario_data['cumulative_discounted_cash_flows']
-
         # Data Rows
         for item_key in DETAILED_REPORT_ROW_ORDER: # Iterate in predefined order
             row_cells = table.add_row().cells
             row_cells[0].text = FINANCIAL_ITEMS_EN_DISPLAY.get(item_key, item_key) # First cell is item name
             row_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
-            for i, year_data in enumerate(detailed_data[item_key]):
-                row_cells[i+1].text = format_number_with_currency(year_data, currency_symbol)
+            for i, year_text in enumerate(format_number_column(detailed_data[item_key], currency_symbol, number_style=number_style)):
+                row_cells[i+1].text = year_text
                 row_cells[i+1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
             
             for cell in row_cells: # Set font size for all cells
@@ -407,7 +579,14 @@ def create_word_report(all_scenario_data, currency_symbol):
                         run.font.size = Pt(9)
         
         document.add_paragraph("\n") # Add blank line after table
-        document.add_paragraph(f"Net Present Value (NPV): {format_number_with_currency(scenario_data['npv'], currency_symbol)}")
+        document.add_paragraph(f"Net Present Value (NPV): {format_number_with_currency(scenario_data['npv'], currency_symbol, number_style=number_style)}")
+        if scenario_data.get('terminal_value_method', "None") != "None":
+            document.add_paragraph(f"Terminal Value ({scenario_data['terminal_value_method']}): {format_number_with_currency(scenario_data['terminal_value'], currency_symbol, number_style=number_style)}")
+            document.add_paragraph(f"PV of Terminal Value: {format_number_with_currency(scenario_data['pv_terminal_value'], currency_symbol, number_style=number_style)}")
+            document.add_paragraph(f"Total Present Value: {format_number_with_currency(scenario_data['total_present_value'], currency_symbol, number_style=number_style)}")
+        for label, key in [("IRR", 'irr'), ("Implied WACC", 'implied_wacc')]:
+            if scenario_data.get(key) is not None:
+                document.add_paragraph(f"{label}: {format_number_with_currency(scenario_data[key], '', is_percentage=True, number_style=number_style) or 'n/a'}")
         document.add_paragraph("\n") # Add blank line before next scenario
 
     output = io.BytesIO()
@@ -423,8 +602,10 @@ st.title("Financial Projection Wizard")
 st.markdown("Enter financial parameters and analyze different growth and WACC scenarios.")
 
 # --- Session State Initialization ---
-if 'all_scenario_data_for_export' not in st.session_state:
-    st.session_state.all_scenario_data_for_export = []
+if 'npv_results' not in st.session_state:
+    st.session_state.npv_results = None # Arrays of the last calculation, see calculate_scenario_results
+if 'report_files' not in st.session_state:
+    st.session_state.report_files = None # Excel and Word bytes of the prepared reports
 if 'npv_summary_df' not in st.session_state:
     st.session_state.npv_summary_df = pd.DataFrame() # Store DataFrame for summary table
 
@@ -459,11 +640,14 @@ with col1:
     start_year = st.number_input("Start Year:", min_value=1900, value=start_year_val, step=1, key="start_year_input", format="%d")
 
     projection_years_val = int(default_inputs['projection_years']) if default_inputs and 'projection_years' in default_inputs and str(default_inputs['projection_years']).isdigit() else 10
-    projection_years = st.number_input("Number of Projection Years:", min_value=1, value=projection_years_val, step=1, key="projection_years_input", format="%d")
+    projection_years = st.number_input("Number of Projection Years:", min_value=1, max_value=MAX_PROJECTION_YEARS, value=min(projection_years_val, MAX_PROJECTION_YEARS), step=1, key="projection_years_input", format="%d")
 
 with col2:
     selected_currency_val = default_inputs['selected_currency'] if default_inputs and 'selected_currency' in default_inputs else "TL"
     selected_currency = st.selectbox("Currency:", options=CURRENCIES, index=CURRENCIES.index(selected_currency_val) if selected_currency_val in CURRENCIES else 0, key="currency_select")
+    number_style_val = default_inputs['number_style'] if default_inputs and default_inputs.get('number_style') in NUMBER_STYLES else "TR/EU"
+    number_style = st.selectbox("Number Format:", options=NUMBER_STYLES, index=NUMBER_STYLES.index(number_style_val), key="number_style_select",
+                                help="TR/EU: 1.234,56 - US: 1,234.56 (tables, detail values and the Word report)")
     
     try:
         ebitda_base_val = float(default_inputs['single_ebitda']) if default_inputs and 'single_ebitda' in default_inputs else 25070432.0
@@ -479,31 +663,97 @@ with col2:
 
 st.header("Scenario Inputs (Growth Rate % and WACC %)")
 
-growth_vars = []
-wacc_vars = []
+scenario_input_mode = st.radio("Define Scenarios By:", ["Growth and WACC Ranges", "Uploaded Scenario List"], horizontal=True, key="scenario_input_mode_radio")
 
-# Dynamically create input fields for 9 scenarios
-for i in range(NUMBER_OF_SCENARIOS):
-    col = st.columns(1)[0] # Use a single column for each row of inputs
-    with col:
-        st.markdown(f"**Scenario {i+1}:**")
-        
-        try:
-            default_growth = float(default_inputs['growth_vars'][i]) if default_inputs and 'growth_vars' in default_inputs and i < len(default_inputs['growth_vars']) else (10.0 if i % 3 == 0 else (20.0 if i % 3 == 1 else 30.0))
-        except (ValueError, TypeError):
-            default_growth = (10.0 if i % 3 == 0 else (20.0 if i % 3 == 1 else 30.0)) # Fallback if json value is invalid
-        growth_vars.append(
-            st.number_input(f"Growth Rate {i+1} (%):", min_value=-50.0, max_value=100.0, value=default_growth, step=0.1, format="%.1f", key=f"growth_input_{i}")
-        )
-        
+def default_float(key, fallback):
+    try:
+        return float(default_inputs[key]) if default_inputs and key in default_inputs else fallback
+    except (ValueError, TypeError):
+        return fallback # Fallback if json value is invalid
+
+scenario_growth_rates = None
+scenario_waccs = None
+scenario_grid_shape = None
+scenario_input_error = None
+
+if scenario_input_mode == "Growth and WACC Ranges":
+    st.markdown("Every growth rate of the first range is combined with every WACC of the second range.")
+    col_growth_range, col_wacc_range = st.columns(2)
+    with col_growth_range:
+        st.subheader("Growth Rate Range (%)")
+        growth_start = st.number_input("Start:", min_value=-50.0, max_value=100.0, value=default_float('growth_start', 10.0), step=0.1, format="%.1f", key="growth_start_input")
+        growth_stop = st.number_input("Stop:", min_value=-50.0, max_value=100.0, value=default_float('growth_stop', 30.0), step=0.1, format="%.1f", key="growth_stop_input")
+        growth_step = st.number_input("Step:", min_value=0.001, max_value=150.0, value=default_float('growth_step', 10.0), step=0.1, format="%.3f", key="growth_step_input")
+    with col_wacc_range:
+        st.subheader("WACC Range (%)")
+        wacc_start = st.number_input("Start:", min_value=0.1, max_value=50.0, value=default_float('wacc_start', 3.0), step=0.1, format="%.1f", key="wacc_start_input")
+        wacc_stop = st.number_input("Stop:", min_value=0.1, max_value=50.0, value=default_float('wacc_stop', 12.0), step=0.1, format="%.1f", key="wacc_stop_input")
+        wacc_step = st.number_input("Step:", min_value=0.001, max_value=50.0, value=default_float('wacc_step', 1.0), step=0.1, format="%.3f", key="wacc_step_input")
+    try:
+        growth_axis = build_rate_range(growth_start, growth_stop, growth_step)
+        wacc_axis = build_rate_range(wacc_start, wacc_stop, wacc_step)
+        scenario_growth_rates = np.repeat(growth_axis, wacc_axis.size)
+        scenario_waccs = np.tile(wacc_axis, growth_axis.size)
+        scenario_grid_shape = (growth_axis.size, wacc_axis.size)
+        st.caption(f"{growth_axis.size} growth rates × {wacc_axis.size} WACCs = {scenario_growth_rates.size:,} scenarios")
+    except ValueError as e:
+        scenario_input_error = str(e)
+        st.error(scenario_input_error)
+else:
+    st.markdown(f"Upload a CSV or Excel file with the columns {', '.join(SCENARIO_LIST_COLUMNS)}, one scenario per row.")
+    scenario_list_file = st.file_uploader("Scenario list:", type=["csv", "xlsx"], key="scenario_list_uploader")
+    combine_scenario_list = st.checkbox("Combine every listed growth rate with every listed WACC (Cartesian product)", value=False, key="combine_scenario_list_checkbox")
+    if scenario_list_file is None:
+        scenario_input_error = "Please upload a scenario list."
+    else:
         try:
-            default_wacc = float(default_inputs['wacc_vars'][i]) if default_inputs and 'wacc_vars' in default_inputs and i < len(default_inputs['wacc_vars']) else (3.0 if i < 3 else (7.0 if i < 6 else 12.0))
-        except (ValueError, TypeError):
-            default_wacc = (3.0 if i < 3 else (7.0 if i % 3 == 1 else 12.0)) # Fallback if json value is invalid
-        wacc_vars.append(
-            st.number_input(f"WACC {i+1} (%):", min_value=0.1, max_value=50.0, value=default_wacc, step=0.1, format="%.1f", key=f"wacc_input_{i}")
-        )
-        st.markdown("---")
+            listed_growth_rates, listed_waccs = read_scenario_list(scenario_list_file)
+            if combine_scenario_list:
+                growth_axis = np.unique(listed_growth_rates)
+                wacc_axis = np.unique(listed_waccs)
+                scenario_growth_rates = np.repeat(growth_axis, wacc_axis.size)
+                scenario_waccs = np.tile(wacc_axis, growth_axis.size)
+                scenario_grid_shape = (growth_axis.size, wacc_axis.size)
+            else:
+                scenario_growth_rates = listed_growth_rates
+                scenario_waccs = listed_waccs
+            st.caption(f"{scenario_growth_rates.size:,} scenarios")
+        except Exception as e:
+            scenario_input_error = f"Could not read the scenario list: {e}"
+            st.error(scenario_input_error)
+
+# --- Terminal Value ---
+st.header("Terminal Value")
+col_tv1, col_tv2 = st.columns(2)
+with col_tv1:
+    terminal_value_method_val = default_inputs['terminal_value_method'] if default_inputs and default_inputs.get('terminal_value_method') in TERMINAL_VALUE_METHODS else "None"
+    terminal_value_method = st.radio("Terminal Value Method:", TERMINAL_VALUE_METHODS, index=TERMINAL_VALUE_METHODS.index(terminal_value_method_val), horizontal=True, key="terminal_value_method_radio")
+with col_tv2:
+    terminal_growth_rate = 0.0
+    exit_multiple = 0.0
+    if terminal_value_method == "Gordon Growth":
+        terminal_growth_rate = st.number_input("Terminal Growth Rate (%):", min_value=-50.0, max_value=49.9, value=default_float('terminal_growth_rate', 2.0), step=0.1, format="%.2f", key="terminal_growth_input")
+        st.caption("Terminal value = last year's EBITDA × (1 + terminal growth) / (WACC − terminal growth); scenarios with WACC ≤ terminal growth get no terminal value.")
+    elif terminal_value_method == "Exit Multiple":
+        exit_multiple = st.number_input("Exit Multiple (× last year's EBITDA):", min_value=0.0, value=default_float('exit_multiple', 8.0), step=0.5, format="%.2f", key="exit_multiple_input")
+if terminal_value_method != "None":
+    st.caption("The terminal value is discounted like the last projection year. NPV is unchanged; the summary adds the terminal value's "
+               "present value and the total present value (sum of discounted cash flows plus the terminal value's present value).")
+
+# --- IRR and Implied WACC ---
+st.header("IRR and Implied WACC")
+solve_rates = st.checkbox("Solve IRR and implied WACC for every scenario", value=bool(default_inputs.get('solve_rates', False)) if default_inputs else False, key="solve_rates_checkbox")
+initial_investment = None
+target_npv = None
+if solve_rates:
+    col_solve1, col_solve2 = st.columns(2)
+    with col_solve1:
+        initial_investment = st.number_input("Initial Investment:", min_value=0.0, value=default_float('initial_investment', ebitda_base * 5), step=1000.0, format="%.2f", key="initial_investment_input",
+                                             help="Paid at the start of the first projection year. IRR is the rate at which the discounted cash flows repay it.")
+    with col_solve2:
+        target_npv = st.number_input("Target NPV:", value=default_float('target_npv', ebitda_base), step=1000.0, format="%.2f", key="target_npv_input",
+                                     help="Implied WACC is the WACC at which the scenario's NPV equals this target.")
+    st.caption(f"Both rates ignore the terminal value. Scenarios without a solution between {MIN_SOLVED_RATE:g}% and {MAX_SOLVED_RATE:g}% are left empty.")
 
 # --- Actions (Calculate, Save/Load Defaults) ---
 st.header("Actions")
@@ -518,10 +768,27 @@ with col_actions2:
             'start_year': str(start_year),
             'projection_years': str(projection_years),
             'selected_currency': selected_currency,
+            'number_style': number_style,
             'single_ebitda': str(ebitda_base),
-            'growth_vars': [str(g) for g in growth_vars],
-            'wacc_vars': [str(w) for w in wacc_vars]
+            'terminal_value_method': terminal_value_method,
+            'terminal_growth_rate': str(terminal_growth_rate),
+            'exit_multiple': str(exit_multiple),
+            'solve_rates': solve_rates
         }
+        if solve_rates:
+            current_inputs.update({
+                'initial_investment': str(initial_investment),
+                'target_npv': str(target_npv)
+            })
+        if scenario_input_mode == "Growth and WACC Ranges":
+            current_inputs.update({
+                'growth_start': str(growth_start),
+                'growth_stop': str(growth_stop),
+                'growth_step': str(growth_step),
+                'wacc_start': str(wacc_start),
+                'wacc_stop': str(wacc_stop),
+                'wacc_step': str(wacc_step)
+            })
         save_default_inputs(current_inputs)
 
 with col_actions3:
@@ -531,132 +798,206 @@ with col_actions3:
 
 # --- Calculation Logic ---
 if calculate_button:
-    st.session_state.all_scenario_data_for_export = []
-    summary_data = []
-    
-    for i in range(NUMBER_OF_SCENARIOS):
-        growth = growth_vars[i]
-        wacc = wacc_vars[i]
-        
-        cash_flows, discounted_cash_flows, cumulative_discounted_cash_flows, npv = calculate_npv(
-            ebitda_base, growth, wacc, projection_years
+    if scenario_input_error:
+        st.error(scenario_input_error)
+    elif scenario_growth_rates.size > MAX_SCENARIOS:
+        st.error(f"{scenario_growth_rates.size:,} scenarios exceed the limit of {MAX_SCENARIOS:,}. Please use fewer scenarios or larger steps.")
+    elif scenario_growth_rates.size * projection_years * 3 * 8 > MAX_RESULT_BYTES:
+        st.error(f"The results of {scenario_growth_rates.size:,} scenarios over {projection_years} years would exceed "
+                 f"{MAX_RESULT_BYTES // 2**20} MB. Please use fewer scenarios, larger steps or fewer years.")
+    else:
+        # All scenarios in one call of the array engine
+        st.session_state.npv_results = calculate_scenario_results(
+            scenario_growth_rates, scenario_waccs, ebitda_base, start_year, projection_years, grid_shape=scenario_grid_shape,
+            terminal_value_method=terminal_value_method, terminal_growth_rate=terminal_growth_rate, exit_multiple=exit_multiple,
+            initial_investment=initial_investment, target_npv=target_npv
         )
-        
-        scenario_info = {
-            'scenario_name': f"Scenario {i+1}",
-            'start_year': start_year,
-            'projection_years': projection_years,
-            'ebitda_base': ebitda_base,
-            'growth_rate': growth,
-            'wacc': wacc,
-            'cash_flows': cash_flows,
-            'discounted_cash_flows': discounted_cash_flows,
-            'cumulative_discounted_cash_flows': cumulative_discounted_cash_flows,
-            'npv': npv
-        }
-        st.session_state.all_scenario_data_for_export.append(scenario_info)
-        
-        summary_data.append({
-            'Scenario': f"Scenario {i+1}",
-            'Growth (%)': growth,
-            'WACC (%)': wacc,
-            'NPV': npv
+        st.session_state.npv_summary_df = pd.DataFrame({
+            'Scenario': "Scenario " + pd.Series(np.arange(1, scenario_growth_rates.size + 1)).astype(str),
+            'Growth (%)': scenario_growth_rates,
+            'WACC (%)': scenario_waccs,
+            'NPV': st.session_state.npv_results['npv']
         })
-    
-    st.session_state.npv_summary_df = pd.DataFrame(summary_data)
+        if terminal_value_method != "None":
+            st.session_state.npv_summary_df['PV of Terminal Value'] = st.session_state.npv_results['pv_terminal_value']
+            st.session_state.npv_summary_df['Total Present Value'] = st.session_state.npv_results['total_present_value']
+        if solve_rates:
+            st.session_state.npv_summary_df['IRR (%)'] = st.session_state.npv_results['irr']
+            st.session_state.npv_summary_df['Implied WACC (%)'] = st.session_state.npv_results['implied_wacc']
+        st.session_state.report_files = None
 
 
 # --- Display Results ---
-if not st.session_state.npv_summary_df.empty:
+if not st.session_state.npv_summary_df.empty and st.session_state.npv_results is not None:
+    npv_results = st.session_state.npv_results
+    npv_summary_df = st.session_state.npv_summary_df
+    num_scenarios = len(npv_summary_df)
+    currency_symbol = CURRENCY_SYMBOLS.get(selected_currency, '')
+
     st.header("Summary of Scenarios")
-    
-    # Format the summary DataFrame for display in Streamlit
-    npv_summary_df_display = st.session_state.npv_summary_df.copy()
-    # Use 0 decimals if value is integer, else 2 for percentages
-    npv_summary_df_display['Growth (%)'] = npv_summary_df_display['Growth (%)'].apply(lambda x: format_number_with_currency(x, '', is_percentage=True, decimals=0 if x == int(x) else 2))
-    npv_summary_df_display['WACC (%)'] = npv_summary_df_display['WACC (%)'].apply(lambda x: format_number_with_currency(x, '', is_percentage=True, decimals=0 if x == int(x) else 2))
-    npv_summary_df_display['NPV'] = npv_summary_df_display['NPV'].apply(lambda x: format_number_with_currency(x, CURRENCY_SYMBOLS.get(selected_currency, '')))
-    
-    # Apply styling separately for numeric columns and text columns
-    st.dataframe(npv_summary_df_display.style.set_properties(
-        subset=['Growth (%)', 'WACC (%)', 'NPV'],
-        **{'text-align': 'right'}
-    ).set_properties(
-        subset=['Scenario'], # Scenario column is left aligned
-        **{'text-align': 'left'}
-    ), use_container_width=True)
+    col_sort1, col_sort2 = st.columns(2)
+    with col_sort1:
+        summary_sort_column = st.selectbox("Sort By:", list(npv_summary_df.columns), index=list(npv_summary_df.columns).index('NPV'), key="summary_sort_select")
+    with col_sort2:
+        summary_sort_ascending = st.radio("Order:", ["Ascending", "Descending"], index=1, horizontal=True, key="summary_order_radio") == "Ascending"
+    sorted_positions = summary_order(npv_results, npv_summary_df, summary_sort_column, summary_sort_ascending)
+
+    summary_pages = max(1, -(-num_scenarios // MAX_SUMMARY_ROWS))
+    if summary_pages > 1:
+        summary_page = st.number_input(f"Page (of {summary_pages:,}):", min_value=1, max_value=summary_pages, value=1, step=1, key="summary_page_input")
+        st.caption(f"Showing scenarios {(summary_page - 1) * MAX_SUMMARY_ROWS + 1:,}-{min(summary_page * MAX_SUMMARY_ROWS, num_scenarios):,} "
+                   f"of {num_scenarios:,} in this order.")
+    else:
+        summary_page = 1
+
+    def build_summary_page():
+        # Format only the visible page of the summary, one column at a time
+        summary_page_df = npv_summary_df.iloc[sorted_positions[(summary_page - 1) * MAX_SUMMARY_ROWS:summary_page * MAX_SUMMARY_ROWS]]
+        display_df = pd.DataFrame({'Scenario': summary_page_df['Scenario'].to_numpy()})
+        for col in summary_page_df.columns[1:]:
+            if col.endswith('(%)'): # Growth, WACC and the solved rates; empty where no rate solves the scenario
+                display_df[col] = format_number_column(summary_page_df[col].to_numpy(), is_percentage=True, number_style=number_style)
+            else: # NPV and, with a terminal value, its present value and the total present value
+                display_df[col] = format_number_column(summary_page_df[col].to_numpy(), currency_symbol, number_style=number_style)
+        return display_df
+
+    npv_summary_df_display = cached_formatted_frame(
+        npv_results, ('summary', summary_sort_column, summary_sort_ascending, summary_page, currency_symbol, number_style), build_summary_page)
+    # Numeric columns right aligned, the scenario column left aligned
+    st.dataframe(npv_summary_df_display, column_config={
+        col: st.column_config.TextColumn(col, alignment='left' if col == 'Scenario' else 'right') for col in npv_summary_df_display.columns
+    }, use_container_width=True, hide_index=True)
+
+    # --- NPV surface: growth and WACC on the horizontal axes ---
+    st.subheader("NPV Surface")
+    chart_key = ('surface', currency_symbol)
+    if chart_key not in npv_results['charts']: # Drawn once per calculation, reruns reuse the image
+        fig = plt.figure(figsize=(14, 6))
+        ax_surface = fig.add_subplot(1, 2, 1, projection='3d')
+        ax_map = fig.add_subplot(1, 2, 2)
+        if npv_results['grid_shape'] is not None and min(npv_results['grid_shape']) > 1:
+            npv_grid = npv_results['npv'].reshape(npv_results['grid_shape'])
+            growth_grid = npv_results['growth_rates'].reshape(npv_results['grid_shape'])
+            wacc_grid = npv_results['waccs'].reshape(npv_results['grid_shape'])
+            ax_surface.plot_surface(wacc_grid, growth_grid, npv_grid, cmap='viridis', rcount=50, ccount=50) # Sampled to at most 50 x 50 facets
+            image = ax_map.pcolormesh(wacc_grid, growth_grid, npv_grid, cmap='viridis', shading='nearest')
+        else:
+            # A scenario list without a grid: one point per scenario
+            ax_surface.scatter(npv_results['waccs'], npv_results['growth_rates'], npv_results['npv'], c=npv_results['npv'], cmap='viridis')
+            image = ax_map.scatter(npv_results['waccs'], npv_results['growth_rates'], c=npv_results['npv'], cmap='viridis')
+        ax_surface.set_xlabel("WACC (%)")
+        ax_surface.set_ylabel("Growth (%)")
+        ax_surface.set_zlabel(f"NPV ({currency_symbol})")
+        ax_map.set_xlabel("WACC (%)")
+        ax_map.set_ylabel("Growth (%)")
+        ax_map.set_title("NPV by Growth and WACC")
+        fig.colorbar(image, ax=ax_map, label=f"NPV ({currency_symbol})")
+        plt.tight_layout()
+        npv_results['charts'][chart_key] = figure_png(fig)
+    st.image(npv_results['charts'][chart_key], use_container_width=True)
 
     st.markdown("---")
 
     st.header("Detailed Scenario Projections")
-    tabs = st.tabs([f"Scenario {i+1}" for i in range(NUMBER_OF_SCENARIOS)])
+    detail_scenario_no = st.number_input(f"Scenario No (1-{num_scenarios:,}):", min_value=1, max_value=num_scenarios, value=int(sorted_positions[0]) + 1, step=1, key="detail_scenario_input")
+    scenario_data = scenario_export_data(npv_results, [detail_scenario_no - 1])[0]
+    st.subheader(f"{scenario_data['scenario_name']} Details")
+    st.write(f"**Starting EBITDA:** {format_number_with_currency(scenario_data['ebitda_base'], currency_symbol, number_style=number_style)}")
+    st.write(f"**Growth Rate:** {format_number_with_currency(scenario_data['growth_rate'], '', is_percentage=True, decimals=0 if scenario_data['growth_rate'] == int(scenario_data['growth_rate']) else 2, number_style=number_style)}")
+    st.write(f"**WACC:** {format_number_with_currency(scenario_data['wacc'], '', is_percentage=True, decimals=0 if scenario_data['wacc'] == int(scenario_data['wacc']) else 2, number_style=number_style)}")
+    st.write(f"**Net Present Value (NPV):** {format_number_with_currency(scenario_data['npv'], currency_symbol, number_style=number_style)}")
+    if scenario_data['terminal_value_method'] != "None":
+        st.write(f"**Terminal Value ({scenario_data['terminal_value_method']}):** {format_number_with_currency(scenario_data['terminal_value'], currency_symbol, number_style=number_style) or 'n/a (WACC ≤ terminal growth)'}")
+        st.write(f"**PV of Terminal Value:** {format_number_with_currency(scenario_data['pv_terminal_value'], currency_symbol, number_style=number_style) or 'n/a'}")
+        st.write(f"**Total Present Value:** {format_number_with_currency(scenario_data['total_present_value'], currency_symbol, number_style=number_style) or 'n/a'}")
+    if scenario_data['irr'] is not None:
+        st.write(f"**IRR:** {format_number_with_currency(scenario_data['irr'], '', is_percentage=True, number_style=number_style) or 'n/a (no solution in range)'}")
+    if scenario_data['implied_wacc'] is not None:
+        st.write(f"**Implied WACC (NPV = {format_number_with_currency(npv_results['target_npv'], currency_symbol, number_style=number_style)}):** {format_number_with_currency(scenario_data['implied_wacc'], '', is_percentage=True, number_style=number_style) or 'n/a (no solution in range)'}")
     
-    for i, tab in enumerate(tabs):
-        with tab:
-            if i < len(st.session_state.all_scenario_data_for_export):
-                scenario_data = st.session_state.all_scenario_data_for_export[i]
-                st.subheader(f"{scenario_data['scenario_name']} Details")
-                st.write(f"**Starting EBITDA:** {format_number_with_currency(scenario_data['ebitda_base'], CURRENCY_SYMBOLS.get(selected_currency, ''))}")
-                st.write(f"**Growth Rate:** {format_number_with_currency(scenario_data['growth_rate'], '', is_percentage=True, decimals=0 if scenario_data['growth_rate'] == int(scenario_data['growth_rate']) else 2)}")
-                st.write(f"**WACC:** {format_number_with_currency(scenario_data['wacc'], '', is_percentage=True, decimals=0 if scenario_data['wacc'] == int(scenario_data['wacc']) else 2)}")
-                st.write(f"**Net Present Value (NPV):** {format_number_with_currency(scenario_data['npv'], CURRENCY_SYMBOLS.get(selected_currency, ''))}")
-                
-                # Prepare data for new table structure for Streamlit display
-                years = [scenario_data['start_year'] + yr_idx for yr_idx in range(scenario_data['projection_years'])]
-                
-                # Create a dictionary where keys are financial items and values are lists of yearly data
-                detailed_df_data_raw = {
-                    'EBITDA': scenario_data['cash_flows'],
-                    'DISCOUNTED CASH FLOW': scenario_data['discounted_cash_flows'],
-                    'CUMULATIVE DISCOUNTED CASH FLOW': scenario_data['cumulative_discounted_cash_flows']
-                }
-                
-                # Create a list of dictionaries for DataFrame creation
-                df_rows = []
-                for item_key in DETAILED_REPORT_ROW_ORDER:
-                    row_dict = {'Financial Items': FINANCIAL_ITEMS_EN_DISPLAY.get(item_key, item_key)}
-                    for yr_idx, year_val in enumerate(years):
-                        row_dict[str(year_val)] = detailed_df_data_raw[item_key][yr_idx]
-                    df_rows.append(row_dict)
-                
-                detailed_df = pd.DataFrame(df_rows)
-                
-                # Format the values for display in Streamlit DataFrame
-                for col_name in detailed_df.columns:
-                    if col_name != 'Financial Items':
-                        detailed_df[col_name] = detailed_df[col_name].apply(lambda x: format_number_with_currency(x, CURRENCY_SYMBOLS.get(selected_currency, '')))
-
-                # Apply styling separately for numeric columns and text columns
-                st.dataframe(detailed_df.style.set_properties(
-                    subset=pd.IndexSlice[:, detailed_df.columns[1:]], # All columns except the first one ('Financial Items')
-                    **{'text-align': 'right'}
-                ).set_properties(
-                    subset=pd.IndexSlice[:, detailed_df.columns[0]], # Only the first column ('Financial Items')
-                    **{'text-align': 'left'}
-                ), use_container_width=True)
+    # Prepare data for new table structure for Streamlit display
+    years = [scenario_data['start_year'] + yr_idx for yr_idx in range(scenario_data['projection_years'])]
+    
+    # Create a dictionary where keys are financial items and values are lists of yearly data
+    detailed_df_data_raw = {
+        'EBITDA': scenario_data['cash_flows'],
+        'DISCOUNTED CASH FLOW': scenario_data['discounted_cash_flows'],
+        'CUMULATIVE DISCOUNTED CASH FLOW': scenario_data['cumulative_discounted_cash_flows']
+    }
+
+    # Long horizons are shown as sampled or aggregated year columns
+    year_column_mode = YEAR_COLUMN_MODES[0]
+    if len(years) > MAX_DETAIL_YEAR_COLUMNS:
+        year_column_mode = st.radio(f"{len(years)} projection years, shown as:", YEAR_COLUMN_MODES, horizontal=True, key="year_column_mode_radio",
+                                    help=f"Sampled: {MAX_DETAIL_YEAR_COLUMNS} evenly spaced years. Aggregated: {MAX_DETAIL_YEAR_COLUMNS} year groups; "
+                                         f"flows are summed, the cumulative row shows each group's closing value. The Excel report keeps every year.")
+
+    def build_detail_table():
+        year_columns, detailed_values = collapse_year_columns(years, detailed_df_data_raw, MAX_DETAIL_YEAR_COLUMNS, year_column_mode)
+        # All values of the table formatted in one call, then laid out as (financial item, year column)
+        value_grid = np.array([detailed_values[item_key] for item_key in DETAILED_REPORT_ROW_ORDER], dtype=float)
+        formatted_grid = np.array(format_number_column(value_grid, currency_symbol, number_style=number_style), dtype=object).reshape(value_grid.shape)
+        detailed_df = pd.DataFrame(formatted_grid, columns=year_columns)
+        detailed_df.insert(0, 'Financial Items', [FINANCIAL_ITEMS_EN_DISPLAY.get(item_key, item_key) for item_key in DETAILED_REPORT_ROW_ORDER])
+        return detailed_df
+
+    detailed_df = cached_formatted_frame(
+        npv_results, ('detail', detail_scenario_no, year_column_mode, currency_symbol, number_style), build_detail_table)
+    # Year columns right aligned, the financial items column left aligned
+    st.dataframe(detailed_df, column_config={
+        col: st.column_config.TextColumn(col, alignment='left' if col == 'Financial Items' else 'right') for col in detailed_df.columns
+    }, use_container_width=True)
 
     st.markdown("---")
 
     # --- Download Buttons ---
     st.subheader("Download Results")
-    col_dl1, col_dl2 = st.columns(2)
-
-    with col_dl1:
-        excel_data = create_excel_report(st.session_state.all_scenario_data_for_export, CURRENCY_SYMBOLS.get(selected_currency, ''))
+    if 'summary_csv' not in npv_results: # Written on request, once per calculation, in scenario order
+        if st.button("Prepare Summary CSV", key="prepare_summary_csv_btn"):
+            with st.spinner("Writing CSV..."):
+                npv_results['summary_csv'] = npv_summary_df.to_csv(index=False).encode('utf-8')
+    if 'summary_csv' in npv_results:
         st.download_button(
-            label="Download All Scenarios as Excel",
-            data=excel_data,
-            file_name="financial_projections.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            key="download_excel_btn"
+            label="Download Summary of All Scenarios as CSV",
+            data=npv_results['summary_csv'],
+            file_name="npv_summary.csv",
+            mime="text/csv",
+            key="download_summary_csv_btn"
         )
 
-    with col_dl2:
-        word_data = create_word_report(st.session_state.all_scenario_data_for_export, CURRENCY_SYMBOLS.get(selected_currency, ''))
-        st.download_button(
-            label="Download All Scenarios as Word",
-            data=word_data,
-            file_name="financial_projections.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            key="download_word_btn"
-        )
\ No newline at end of file
+    # Excel and Word reports hold one detailed section per scenario: the first scenarios in the current order
+    report_positions = sorted_positions[:MAX_DETAILED_REPORT_SCENARIOS]
+    report_key = (summary_sort_column, summary_sort_ascending, selected_currency, year_column_mode, number_style)
+    if num_scenarios > MAX_DETAILED_REPORT_SCENARIOS:
+        st.caption(f"The Excel and Word reports include the first {MAX_DETAILED_REPORT_SCENARIOS} scenarios in the current order; "
+                   f"the CSV file includes all {num_scenarios:,}.")
+    if st.session_state.report_files is None or st.session_state.report_files['key'] != report_key:
+        if st.button("Prepare Excel and Word Reports", key="prepare_reports_btn"):
+            with st.spinner("Writing reports..."):
+                all_scenario_data_for_export = scenario_export_data(npv_results, report_positions)
+                st.session_state.report_files = {
+                    'key': report_key,
+                    'excel': create_excel_report(all_scenario_data_for_export, currency_symbol),
+                    'word': create_word_report(all_scenario_data_for_export, currency_symbol, year_column_mode=year_column_mode, number_style=number_style)
+                }
+
+    if st.session_state.report_files is not None and st.session_state.report_files['key'] == report_key:
+        col_dl1, col_dl2 = st.columns(2)
+
+        with col_dl1:
+            st.download_button(
+                label="Download Scenarios as Excel",
+                data=st.session_state.report_files['excel'],
+                file_name="financial_projections.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key="download_excel_btn"
+            )
+
+        with col_dl2:
+            st.download_button(
+                label="Download Scenarios as Word",
+                data=st.session_state.report_files['word'],
+                file_name="financial_projections.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                key="download_word_btn"
+            )
@@ -0,0 +1,77 @@
+# report_jobs.py - Background worker pool for report exports
+# Kept outside pages/ so one pool and its finished files can be shared by every session through st.cache_resource.
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReportJobQueue:
+    """
+    Runs report builders on a pool of worker threads, so the Streamlit script thread is not blocked.
+    Jobs are keyed by a fingerprint of their inputs: submitting a fingerprint that is queued, running or
+    finished returns the existing job instead of building the file again. Finished files are kept for
+    download; beyond max_results, the least recently used finished jobs are dropped.
+    """
+
+    def __init__(self, max_workers=2, max_results=16):
+        self.max_workers = max_workers
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs = OrderedDict() # fingerprint -> job dictionary, least recently used first
+        self._lock = threading.Lock()
+
+    def submit(self, fingerprint, builder, *args, **kwargs):
+        """
+        Queues builder(*args, progress_callback=..., **kwargs) under fingerprint unless that job already
+        exists (failed jobs are retried). builder must not call Streamlit; it reports progress as a
+        fraction between 0 and 1 through progress_callback and returns the file as bytes.
+        """
+        with self._lock:
+            job = self._jobs.get(fingerprint)
+            if job is not None and job['status'] != 'failed':
+                self._jobs.move_to_end(fingerprint)
+                return
+            job = {'status': 'queued', 'progress': 0.0, 'result': None, 'error': None,
+                   'submitted_at': time.monotonic(), 'finished_at': None}
+            self._jobs[fingerprint] = job
+        self._executor.submit(self._run, fingerprint, job, builder, args, kwargs)
+
+    def _run(self, fingerprint, job, builder, args, kwargs):
+        def report_progress(fraction):
+            job['progress'] = min(max(float(fraction), 0.0), 1.0)
+
+        job['status'] = 'running'
+        try:
+            result = builder(*args, progress_callback=report_progress, **kwargs)
+        except Exception as e:
+            job.update(status='failed', error=e, finished_at=time.monotonic())
+        else:
+            job.update(status='done', result=result, progress=1.0, finished_at=time.monotonic())
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """Drops the least recently used finished jobs beyond max_results. Must be called with the lock held."""
+        finished = [key for key, job in self._jobs.items() if job['status'] in ('done', 'failed')]
+        for key in finished[:max(0, len(finished) - self.max_results)]:
+            del self._jobs[key]
+
+    def get(self, fingerprint):
+        """Returns a snapshot of the job (status, progress, result, error, timings), or None when unknown."""
+        with self._lock:
+            job = self._jobs.get(fingerprint)
+            if job is None:
+                return None
+            self._jobs.move_to_end(fingerprint)
+            return dict(job)
+
+    def stats(self):
+        """Returns a dictionary with the number of queued, running, done and failed jobs."""
+        with self._lock:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            counts['max_workers'] = self.max_workers
+            counts['max_results'] = self.max_results
+            return counts
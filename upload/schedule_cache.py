@@ -0,0 +1,61 @@
+# schedule_cache.py - Bounded LRU cache with expiry for loan repayment schedules
+# Kept outside pages/ so one instance can be shared by every session through st.cache_resource.
+import time
+import threading
+from collections import OrderedDict
+
+
+class ScheduleCache:
+    """
+    Thread-safe least-recently-used cache. Holds at most max_entries values; a value older than
+    ttl_seconds counts as a miss and is dropped. Hit and miss counts are kept for reporting.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key -> (stored_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for key, or None when it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Stores value under key, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry and resets the hit and miss counts."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns a dictionary with the hit and miss counts, hit rate and current number of entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds
+            }